@@ -1,13 +1,57 @@
+import json
+from functools import lru_cache, partial
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from app.models.request import ChatRequest
 from app.models.response import ChatResponse
+from app.core.config import settings
 from app.core.security import get_current_user
+from app.services.answer_cache import answer_cache
+from app.services.context_packer import ContextPacker
 from app.services.rag_pipeline import RAGPipeline
 from app.services.vector_store import vector_store
 from loguru import logger
 
 router = APIRouter()
-rag_pipeline = RAGPipeline()
+
+@lru_cache(maxsize=1)
+def get_rag_pipeline() -> RAGPipeline:
+    """Builds the shared RAG chain (and its Gemini client) on first use or during warm-up."""
+    # More candidates than fit in the prompt are retrieved; the packer merges and trims them
+    return RAGPipeline(
+        retriever=partial(vector_store.aretrieve, k=settings.CONTEXT_CANDIDATES),
+        packer=ContextPacker(token_budget=settings.CONTEXT_TOKEN_BUDGET, mmr_lambda=settings.CONTEXT_MMR_LAMBDA),
+    )
+
+async def _lookup_cached_answer(user_id: str, request: ChatRequest):
+    """
+    Returns (cached entry or None, question embedding, cacheable). Answers are cached
+    per document, so the cache is only used for a single document the user owns; otherwise
+    `cacheable` is False and the new answer must not be stored. The embedding is only
+    computed when the semantic tier is on, and is reused when the new answer is cached.
+    """
+    if not settings.ANSWER_CACHE_ENABLED or request.document_id is None:
+        # Multi-document answers are not cached: the document set varies per request
+        return None, None, False
+    if not await vector_store.catalog.aget(user_id, request.document_id):
+        return None, None, False
+    question_embedding = None
+    if answer_cache.semantic_threshold is not None:
+        question_embedding = await vector_store.aembed_query(request.question)
+    entry = answer_cache.get(request.document_id, request.question, question_embedding)
+    return entry, question_embedding, True
+
+async def _resolve_document_ids(user_id: str, request: ChatRequest):
+    """
+    Returns None for a single-document chat, otherwise the ids of the user's
+    documents the request covers. Raises 404 when it covers none.
+    """
+    if request.document_id is not None:
+        return None
+    document_ids = await vector_store.catalog.aowned_ids(user_id, request.document_ids)
+    if not document_ids:
+        raise HTTPException(status_code=404, detail="No documents found.")
+    return document_ids
 
 @router.post("/chat", response_model=ChatResponse)
 async def chat_with_doc(
@@ -15,31 +59,47 @@ async def chat_with_doc(
     current_user: dict = Depends(get_current_user),
 ):
     """
-    Handles chat requests for a specific document.
-    The user must be authenticated.
+    Handles chat requests for a specific document, or across several (or all) of
+    the user's documents. The user must be authenticated.
     """
     user_id = current_user.get("sub") # 'sub' is the standard JWT claim for subject (user ID)
-    logger.info(f"Received chat request from user {user_id} for doc {request.document_id}")
-    logger.info(f"Document ID type: {type(request.document_id)}, value: '{request.document_id}'")
+    document_ids = await _resolve_document_ids(user_id, request)
+    if document_ids is None:
+        logger.info(f"Received chat request from user {user_id} for doc {request.document_id}")
+        logger.info(f"Document ID type: {type(request.document_id)}, value: '{request.document_id}'")
+    else:
+        logger.info(f"Received chat request from user {user_id} across {len(document_ids)} documents")
     logger.info(f"Question: '{request.question}'")
 
     try:
-        # Get the retriever for the specific user and document
-        retriever = vector_store.get_retriever(
-            user_id=user_id, document_id=request.document_id
-        )
-
-        # Get the RAG chain
-        chain = rag_pipeline.get_chain(retriever)
+        cached, question_embedding, cacheable = await _lookup_cached_answer(user_id, request)
+        if cached is not None:
+            logger.info(f"Serving cached answer for user {user_id}")
+            return ChatResponse(
+                question=request.question,
+                answer=cached["answer"],
+                document_id=request.document_id,
+                cached=True,
+            )
 
-        # Invoke the chain with the user's question
-        result = await chain.ainvoke(request.question)
+        # Invoke the prebuilt chain with the user's question and document; the embedding
+        # computed for the cache lookup is reused for retrieval
+        result = await get_rag_pipeline().chain.ainvoke({
+            "question": request.question,
+            "user_id": user_id,
+            "document_id": request.document_id,
+            "document_ids": document_ids,
+            "query_embedding": question_embedding,
+        })
+        if cacheable:
+            answer_cache.put(request.document_id, request.question, result, question_embedding)
 
         logger.info(f"Successfully generated response for user {user_id}")
         return ChatResponse(
             question=request.question,
             answer=result,
             document_id=request.document_id,
+            document_ids=document_ids,
         )
     except Exception as e:
         # Log the full, detailed error for debugging purposes on the server.
@@ -47,3 +107,73 @@ async def chat_with_doc(
         # Return a generic, user-friendly error to the client without exposing internal details.
         raise HTTPException(status_code=500, detail="An internal error occurred while processing your chat request.")
 
+
+
+def _sse(event: str, data) -> str:
+    """Formats one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _source_metadata(doc) -> dict:
+    metadata = doc.metadata
+    return {
+        "document_id": metadata.get("document_id"),
+        "page": metadata.get("page"),
+        "similarity_score": metadata.get("similarity_score"),
+    }
+
+@router.post("/chat/stream")
+async def stream_chat_with_doc(
+    request: ChatRequest,
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Streaming variant of /chat using server-sent events.
+    Emits a `sources` event with the retrieved chunks' metadata, then `token` events
+    as the LLM generates the answer, and finally `done` (or `error`).
+    A cached answer is sent as a single `token` event.
+    """
+    user_id = current_user.get("sub")
+    document_ids = await _resolve_document_ids(user_id, request)
+    logger.info(
+        f"Received streaming chat request from user {user_id} for "
+        + (f"doc {request.document_id}" if document_ids is None else f"{len(document_ids)} documents")
+    )
+
+    async def event_stream():
+        try:
+            rag_pipeline = get_rag_pipeline()
+            cached, question_embedding, cacheable = await _lookup_cached_answer(user_id, request)
+            if cached is not None:
+                logger.info(f"Serving cached answer for user {user_id}")
+                yield _sse("sources", cached["sources"])
+                yield _sse("token", {"text": cached["answer"]})
+                yield _sse("done", {"document_id": request.document_id, "cached": True})
+                return
+
+            docs = await rag_pipeline.retriever(
+                request.question, user_id=user_id, document_id=request.document_id, document_ids=document_ids,
+                query_embedding=question_embedding,
+            )
+            sources = [_source_metadata(doc) for doc in docs]
+            yield _sse("sources", sources)
+
+            answer = []
+            async for token in rag_pipeline.astream_answer(request.question, docs):
+                answer.append(token)
+                yield _sse("token", {"text": token})
+
+            # Only complete answers are cached; a disconnect cancels the generator before this
+            if cacheable:
+                answer_cache.put(request.document_id, request.question, "".join(answer), question_embedding, sources)
+            yield _sse("done", {"document_id": request.document_id, "document_ids": document_ids, "cached": False})
+            logger.info(f"Successfully streamed response for user {user_id}")
+        except Exception as e:
+            # Headers are already sent, so the failure is reported in-band
+            logger.error(f"Error streaming chat response for user {user_id}: {e}")
+            yield _sse("error", {"detail": "An internal error occurred while processing your chat request."})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,126 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException, Response, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from app.models.response import DocumentInfo, DocumentListResponse, SummaryResponse, UploadResponse
+from app.core.security import get_current_user
+from app.services.ingestion import DocumentBusyError, ingestion_pipeline
+from app.services.pdf_loader import PDFLoader
+from app.services.summarizer import start_document_summary, summary_store
+from app.services.vector_store import vector_store
+from loguru import logger
+
+router = APIRouter()
+
+@router.get("/documents", response_model=DocumentListResponse)
+async def list_documents(current_user: dict = Depends(get_current_user)):
+    """
+    Lists the documents the authenticated user has uploaded, newest first.
+    Served from the document catalog, so it never reads the chunk collection.
+    """
+    user_id = current_user.get("sub")
+    documents = await vector_store.catalog.alist_for_user(user_id)
+    logger.info(f"Listing {len(documents)} documents for user {user_id}")
+    return DocumentListResponse(documents=[DocumentInfo(**doc) for doc in documents])
+
+@router.put("/documents/{document_id}", response_model=UploadResponse, status_code=status.HTTP_202_ACCEPTED)
+async def update_document(
+    document_id: str,
+    file: UploadFile,
+    response: Response,
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Replaces one of the user's documents with a revised PDF, keeping its document_id.
+    The file is queued like an upload; the job only embeds chunks whose text changed
+    and retires the chunks that are gone. Uploading the current version again is a no-op.
+    Returns 409 while an earlier update of the document is still queued or running.
+    """
+    user_id = current_user.get("sub")
+    if not file.filename.endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Invalid file type. Only PDFs are allowed.")
+    existing = await vector_store.catalog.aget(user_id, document_id)
+    if not existing:
+        raise HTTPException(status_code=404, detail="Document not found.")
+
+    try:
+        temp_file_path, content_hash = await run_in_threadpool(PDFLoader.spool_to_disk, file.file)
+        if content_hash == existing.get("content_hash"):
+            os.remove(temp_file_path)
+            response.status_code = status.HTTP_200_OK
+            logger.info(f"Update of document {document_id} from user {user_id} is identical to the current version")
+            return UploadResponse(
+                message="Document is unchanged.",
+                filename=file.filename,
+                document_id=document_id,
+                status="completed",
+                reused_chunks=existing["chunk_count"],
+            )
+
+        try:
+            job = await ingestion_pipeline.asubmit(
+                user_id=user_id, filename=file.filename, file_path=temp_file_path,
+                content_hash=content_hash, document_id=document_id,
+            )
+        except DocumentBusyError as e:
+            os.remove(temp_file_path)
+            raise HTTPException(status_code=409, detail=str(e))
+        logger.info(f"Queued update of document {document_id} for user {user_id} as job {job['job_id']}")
+        return UploadResponse(
+            message="New version accepted for processing.",
+            filename=file.filename,
+            document_id=document_id,
+            job_id=job["job_id"],
+            status=job["status"],
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error during update of document {document_id} for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/documents/{document_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_document(document_id: str, current_user: dict = Depends(get_current_user)):
+    """
+    Deletes one of the user's documents. It disappears from the catalog and from
+    retrieval immediately; its chunks are purged by the background compactor.
+    """
+    user_id = current_user.get("sub")
+    if not await vector_store.adelete_document(user_id, document_id):
+        raise HTTPException(status_code=404, detail="Document not found.")
+    logger.info(f"Deleted document {document_id} for user {user_id}")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@router.post("/documents/{document_id}/summary", response_model=SummaryResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_document_summary(
+    document_id: str,
+    response: Response,
+    refresh: bool = False,
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Starts summarizing one of the user's documents in the background and returns
+    immediately; poll GET on the same path for progress. An existing completed summary
+    is returned as is unless `refresh` is set.
+    """
+    user_id = current_user.get("sub")
+    if not await vector_store.catalog.aget(user_id, document_id):
+        raise HTTPException(status_code=404, detail="Document not found.")
+
+    existing = await summary_store.get(document_id)
+    if existing and existing["status"] == "completed" and not refresh:
+        response.status_code = status.HTTP_200_OK
+        return SummaryResponse(**existing)
+
+    logger.info(f"Starting summary of document {document_id} for user {user_id}")
+    record = await start_document_summary(user_id, document_id)
+    return SummaryResponse(**record)
+
+@router.get("/documents/{document_id}/summary", response_model=SummaryResponse)
+async def get_document_summary(document_id: str, current_user: dict = Depends(get_current_user)):
+    """
+    Returns the status, progress and (once completed) the text of a document's summary.
+    """
+    record = await summary_store.get(document_id)
+    if record is None or record["user_id"] != current_user.get("sub"):
+        raise HTTPException(status_code=404, detail="Summary not found.")
+    return SummaryResponse(**record)
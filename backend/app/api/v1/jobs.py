@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Depends, HTTPException
+from app.models.response import JobStatusResponse
+from app.core.security import get_current_user
+from app.services.ingestion import ingestion_pipeline
+
+router = APIRouter()
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(job_id: str, current_user: dict = Depends(get_current_user)):
+    """
+    Returns the status and per-stage progress of an ingestion job.
+    Users can only see their own jobs.
+    """
+    job = await ingestion_pipeline.jobs.aget(job_id)
+    if job is None or job["user_id"] != current_user.get("sub"):
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return JobStatusResponse(**job)
@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends, HTTPException
+from app.models.request import SearchRequest
+from app.models.response import SearchHit, SearchResponse, SearchResult
+from app.core.security import get_current_user
+from app.services.vector_store import vector_store
+from loguru import logger
+
+router = APIRouter()
+
+def _to_hit(doc) -> SearchHit:
+    metadata = doc.metadata
+    return SearchHit(
+        document_id=metadata.get("document_id"),
+        page=metadata.get("page"),
+        text=doc.page_content,
+        rrf_score=metadata.get("rrf_score"),
+        similarity_score=metadata.get("similarity_score"),
+        bm25_score=metadata.get("bm25_score"),
+    )
+
+@router.post("/search", response_model=SearchResponse)
+async def search_documents(
+    request: SearchRequest,
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Returns the top `k` chunks for each query across one, several or all of the
+    user's documents, without calling the LLM. All queries are embedded in one batch
+    and the winning chunks of every query are fetched in a single round trip.
+    """
+    user_id = current_user.get("sub")
+    requested = [request.document_id] if request.document_id is not None else request.document_ids
+    document_ids = await vector_store.catalog.aowned_ids(user_id, requested)
+    if not document_ids:
+        raise HTTPException(status_code=404, detail="No documents found.")
+    logger.info(f"Searching {len(request.queries)} queries across {len(document_ids)} documents for user {user_id}")
+
+    try:
+        rankings = await vector_store.aretrieve_across(request.queries, user_id, document_ids, k=request.k)
+    except Exception as e:
+        logger.error(f"Error searching documents for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="An internal error occurred while searching your documents.")
+    return SearchResponse(
+        document_ids=document_ids,
+        results=[
+            SearchResult(query=query, hits=[_to_hit(doc) for doc in docs])
+            for query, docs in zip(request.queries, rankings)
+        ],
+    )
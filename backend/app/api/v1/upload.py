@@ -1,23 +1,28 @@
-import uuid
-from fastapi import APIRouter, Depends, HTTPException, UploadFile
+import os
+from fastapi import APIRouter, Depends, HTTPException, Response, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
 from app.models.response import UploadResponse
 from app.core.security import get_current_user
+from app.services.ingestion import DuplicateUploadError, ingestion_pipeline
 from app.services.pdf_loader import PDFLoader
 from app.services.vector_store import vector_store
 from loguru import logger
 
 router = APIRouter()
-pdf_loader = PDFLoader()
 
-@router.post("/upload", response_model=UploadResponse)
+@router.post("/upload", response_model=UploadResponse, status_code=status.HTTP_202_ACCEPTED)
 async def upload_pdf(
     file: UploadFile,
+    response: Response,
     current_user: dict = Depends(get_current_user),
 ):
     """
     Handles PDF file uploads.
-    The user must be authenticated. The endpoint processes the PDF and stores
-    it in the vector database.
+    The user must be authenticated. The file is queued for ingestion
+    (parse -> split -> embed -> store) and the endpoint returns immediately with
+    the document_id and a job_id that can be polled at /api/v1/jobs/{job_id}.
+    Re-uploading a file the user already has (or is still having ingested) returns
+    the existing document without creating a job.
     """
     user_id = current_user.get("sub")
     logger.info(f"Received upload request from user: {user_id}")
@@ -26,33 +31,53 @@ async def upload_pdf(
         raise HTTPException(status_code=400, detail="Invalid file type. Only PDFs are allowed.")
 
     try:
-        # --- FIX: GENERATE A UNIQUE DOCUMENT ID ---
-        document_id = str(uuid.uuid4())
-        logger.info(f"Generated document_id: '{document_id}' (type: {type(document_id)})")
-        # ----------------------------------------
+        temp_file_path, content_hash = await run_in_threadpool(PDFLoader.spool_to_disk, file.file)
+        logger.info(f"Temporarily saved PDF to {temp_file_path}")
 
-        # Process the PDF to get document chunks
-        documents = pdf_loader.load_and_split_documents(file=file)
-        logger.info(f"Processed {len(documents)} document chunks")
+        # The user already has this exact file: point them at the existing embedding set
+        existing = await vector_store.catalog.afind_by_hash(content_hash, user_id=user_id)
+        if existing:
+            os.remove(temp_file_path)
+            response.status_code = status.HTTP_200_OK
+            logger.info(f"Upload from user {user_id} is identical to document {existing['document_id']}, skipping ingestion")
+            return UploadResponse(
+                message="Identical file already processed.",
+                filename=file.filename,
+                document_id=existing["document_id"],
+                status="completed",
+                reused_chunks=existing["chunk_count"],
+            )
 
-        # Add the processed documents to the vector store
-        vector_store.add_documents(
-            documents=documents,
-            user_id=user_id,
-            document_id=document_id # <-- Pass the generated ID
-        )
+        try:
+            job = await ingestion_pipeline.asubmit(
+                user_id=user_id, filename=file.filename, file_path=temp_file_path, content_hash=content_hash
+            )
+        except DuplicateUploadError as e:
+            # The same file is already being ingested for this user: point at that job
+            os.remove(temp_file_path)
+            if e.job is None:
+                raise HTTPException(status_code=409, detail="An identical upload just finished processing; retry the upload.")
+            logger.info(f"Upload from user {user_id} is identical to queued document {e.job['document_id']}, skipping ingestion")
+            return UploadResponse(
+                message="Identical file already being processed.",
+                filename=file.filename,
+                document_id=e.job["document_id"],
+                job_id=e.job["job_id"],
+                status=e.job["status"],
+            )
 
-        logger.success(f"Successfully processed and stored document {document_id} for user {user_id}")
-        
-        response = UploadResponse(
-            message="File uploaded and processed successfully.",
+        upload_response = UploadResponse(
+            message="File accepted for processing.",
             filename=file.filename,  # Include the original filename
-            document_id=document_id
+            document_id=job["document_id"],
+            job_id=job["job_id"],
+            status=job["status"],
         )
-        logger.info(f"Returning response with document_id: '{response.document_id}'")
-        return response
+        logger.info(f"Returning response with document_id: '{upload_response.document_id}', job_id: '{upload_response.job_id}'")
+        return upload_response
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error during file upload for user {user_id}: {e}")
         # Propagate the specific error message for better debugging
         raise HTTPException(status_code=500, detail=str(e))
-
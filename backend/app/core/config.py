@@ -11,6 +11,12 @@ class Settings(BaseSettings):
     """
     # MongoDB
     MONGO_CONNECTION_STRING: str
+    # Connection pool tuning, applied to both the sync and the async client
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 10
+    MONGO_MAX_IDLE_TIME_MS: int = 60000
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = 10000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 10000
 
     # Google Gemini (for the Chat LLM)
     GOOGLE_API_KEY: str
@@ -20,6 +26,123 @@ class Settings(BaseSettings):
     SUPABASE_KEY: str
     SUPABASE_JWT_SECRET: str
     SUPABASE_ANON_KEY: str
+    # Optional JWKS endpoint (e.g. <SUPABASE_URL>/auth/v1/.well-known/jwks.json) for
+    # projects issuing RS256/ES256 tokens; keys are cached for JWKS_CACHE_SECONDS
+    SUPABASE_JWKS_URL: str = ""
+    JWKS_CACHE_SECONDS: float = 3600
+    # Verified tokens are cached until they expire, or for at most the TTL
+    AUTH_TOKEN_CACHE_ENABLED: bool = True
+    AUTH_TOKEN_CACHE_MAX_ENTRIES: int = 10000
+    AUTH_TOKEN_CACHE_TTL_SECONDS: float = 300
+
+    # Startup: heavy resources (embedding model, Gemini client) load lazily on first use.
+    # With warm-up on they are loaded in the background right after startup, and /readyz
+    # reports 503 until that finishes. Database indexes are always created in the
+    # background before the process reports ready.
+    WARMUP_ON_STARTUP: bool = True
+
+    # Requests slower than this are logged with their per-stage timings
+    SLOW_REQUEST_SECONDS: float = 2.0
+
+    # Ingestion
+    INGESTION_WORKERS: int = 2
+    # Each worker touches its queued and running jobs every heartbeat; jobs left untouched
+    # for JOB_STALE_SECONDS (their worker crashed or was stopped) are marked failed
+    JOB_HEARTBEAT_SECONDS: float = 30
+    JOB_STALE_SECONDS: float = 300
+    # PDF text extraction engine: "pypdf" or "pymupdf"
+    PDF_ENGINE: str = "pypdf"
+    # Processes used to extract page ranges of a single PDF in parallel (1 disables the pool)
+    PDF_PARSE_WORKERS: int = 1
+    PDF_SHARD_PAGES: int = 32
+    EMBEDDING_BATCH_SIZE: int = 64
+    # How PDFs are cut into chunks: "legacy" (1000 characters), "tokens" (sized to the
+    # embedding model's 256-token window), "structured" (token-sized, following headings
+    # and tables) or "adaptive" (structured, chunk size growing with the page count).
+    # See benchmarks/chunking_profiles.py for a comparison.
+    CHUNKING_PROFILE: str = "legacy"
+
+    # Document updates and deletes: replaced or deleted chunks are tombstoned and purged
+    # by a background task once they are older than the grace period, so queries already
+    # in flight can still read them
+    TOMBSTONE_GRACE_SECONDS: float = 300
+    COMPACTION_INTERVAL_SECONDS: float = 300
+    COMPACTION_BATCH_SIZE: int = 1000
+    # How often each worker checks for documents changed by other workers and drops
+    # their cached indexes and answers
+    DOCUMENT_CHANGE_POLL_SECONDS: float = 5.0
+
+    # Embedding cache (in-memory LRU in front of a local SQLite file)
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = os.path.join(os.path.dirname(__file__), '../../.cache/embeddings.sqlite3')
+    EMBEDDING_CACHE_MEMORY_ITEMS: int = 10000
+    EMBEDDING_CACHE_MAX_ROWS: int = 1_000_000
+    # Workers share the file; a write waits this long for another writer before it is skipped
+    EMBEDDING_CACHE_BUSY_TIMEOUT_SECONDS: float = 5.0
+
+    # Shared embedding inference process for multi-worker deployments. When set, API
+    # workers send texts to the process listening on this Unix socket
+    # (python -m app.services.embedding_server) instead of each loading the model.
+    EMBEDDING_SERVER_ADDRESS: str = ""
+    # Shared secret authenticating workers to the server. If unset, the server generates one
+    # into an owner-only file next to the socket (<address>.key) and workers read it from there
+    EMBEDDING_SERVER_AUTHKEY: str = ""
+    # Texts from concurrent requests combined into one forward pass on the server
+    EMBEDDING_SERVER_MAX_BATCH_SIZE: int = 128
+    # How long a worker waits for the server socket to appear at startup
+    EMBEDDING_SERVER_CONNECT_TIMEOUT: float = 60.0
+
+    # Micro-batching of concurrent query embeddings
+    EMBEDDING_BATCH_MAX_SIZE: int = 32
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = 5.0
+    EMBEDDING_BATCH_THREADS: int = 1
+
+    # Answer cache (exact question match plus optional semantic match)
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_MAX_ENTRIES: int = 5000
+    ANSWER_CACHE_TTL_SECONDS: float = 3600
+    ANSWER_CACHE_SEMANTIC_ENABLED: bool = True
+    ANSWER_CACHE_SEMANTIC_THRESHOLD: float = 0.95
+
+    # Context packing: chunks retrieved per question, then merged, diversified (MMR)
+    # and packed into an estimated token budget for the prompt
+    CONTEXT_CANDIDATES: int = 8
+    CONTEXT_TOKEN_BUDGET: int = 1000
+    CONTEXT_MMR_LAMBDA: float = 0.7
+
+    # Document summarization (map-reduce over chunks)
+    SUMMARY_MODEL: str = "gemini-1.5-flash-latest"
+    # Concurrent map/combine calls and the requests-per-minute cap shared by all summaries
+    SUMMARY_MAX_CONCURRENCY: int = 8
+    SUMMARY_REQUESTS_PER_MINUTE: float = 60
+    # Estimated input tokens packed into one combine call of the tree reduce
+    SUMMARY_REDUCE_TOKEN_BUDGET: int = 6000
+
+    # Vector index
+    # Documents with fewer chunks than this use exact flat search, larger ones use IVF.
+    VECTOR_INDEX_FLAT_THRESHOLD: int = 20000
+    VECTOR_INDEX_NPROBE: int = 8
+    # Upper bound on memory used by cached per-document embedding matrices. Like the lexical
+    # index cache, this is per API worker: the machine holds up to WEB_CONCURRENCY times it
+    VECTOR_INDEX_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    # Flat indexes can hold compressed codes instead of float32: "none", "int8" or "binary".
+    # Quantized searches rescore RESCORE_FACTOR * k candidates with the stored float32 embeddings;
+    # binary codes are coarse and usually want a larger factor (around 10).
+    VECTOR_INDEX_QUANTIZATION: str = "none"
+    VECTOR_INDEX_RESCORE_FACTOR: int = 4
+    # How chunk embeddings are stored in Mongo: "float32" (packed BSON vector) or "list" (legacy doubles)
+    EMBEDDING_STORAGE_FORMAT: str = "float32"
+
+    # Retrieval: "vector" for cosine only, "hybrid" to fuse BM25 and cosine rankings
+    RETRIEVAL_MODE: str = "hybrid"
+    # Candidates taken from each ranking before reciprocal rank fusion
+    HYBRID_CANDIDATES: int = 20
+    RRF_K: int = 60
+    BM25_K1: float = 1.2
+    BM25_B: float = 0.75
+    LEXICAL_INDEX_CACHE_MAX_BYTES: int = 128 * 1024 * 1024
+    # Threads loading uncached document indexes from GridFS for a multi-document query
+    SHARD_LOAD_WORKERS: int = 8
 
     model_config = {
         'env_file': '.env',
@@ -0,0 +1,152 @@
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from loguru import logger
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+
+# Seconds, from sub-millisecond index scans up to slow LLM generations and large PDFs
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+STAGE_SECONDS = Histogram(
+    "chat_with_pdf_stage_seconds",
+    "Time spent in one stage of the ingestion or question-answering pipeline.",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "chat_with_pdf_http_request_seconds",
+    "HTTP request latency, until the last byte of the response is sent.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+EMBEDDING_BATCH_SIZE = Histogram(
+    "chat_with_pdf_embedding_batch_size",
+    "Texts per embedding call.",
+    ["kind"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+EMBEDDED_TEXTS = Counter(
+    "chat_with_pdf_embedded_texts",
+    "Texts embedded; rate() of this gives items per second.",
+    ["kind"],
+)
+CACHE_LOOKUPS = Counter(
+    "chat_with_pdf_cache_lookups",
+    "Lookups in the answer, embedding and verified-token caches, by result; "
+    "the hit rate is the non-miss share.",
+    ["cache", "result"],
+)
+
+# Ids accepted from the X-Request-ID header; anything else is replaced so it cannot break log lines
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+_request_id: ContextVar[str] = ContextVar("request_id", default=None)
+# Seconds per stage for the current request or ingestion job
+_stages: ContextVar[dict] = ContextVar("stages", default=None)
+
+
+def current_request_id() -> str:
+    return _request_id.get()
+
+
+@contextmanager
+def request_context(request_id: str = None):
+    """
+    Binds a request id (a new one if None) and an empty stage timing record to the
+    current context, and adds the id to every log line written inside it.
+    """
+    request_id = request_id or uuid.uuid4().hex
+    id_token = _request_id.set(request_id)
+    stages_token = _stages.set({})
+    try:
+        with logger.contextualize(request_id=request_id):
+            yield request_id
+    finally:
+        _stages.reset(stages_token)
+        _request_id.reset(id_token)
+
+
+def observe_stage(stage: str, seconds: float):
+    """Records a stage duration in the histogram and in the current request's timings."""
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    stages = _stages.get()
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def stage_timings() -> dict:
+    return dict(_stages.get() or {})
+
+
+def format_stages(stages: dict) -> str:
+    """Formats stage timings slowest first, e.g. 'llm_total=1830ms, similarity=12ms'."""
+    ordered = sorted(stages.items(), key=lambda item: item[1], reverse=True)
+    return ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in ordered)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """
+    Returns the Prometheus text exposition and its content type. With several workers,
+    PROMETHEUS_MULTIPROC_DIR must point at a directory shared by them, and the
+    metrics of all workers are aggregated.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware that runs each HTTP request in a request_context, using the
+    client's X-Request-ID when it is valid, echoes the id in the response headers,
+    records the request latency per route, and logs the stage breakdown of requests
+    slower than `slow_request_seconds`.
+    """
+    def __init__(self, app, slow_request_seconds: float = 2.0):
+        self.app = app
+        self.slow_request_seconds = slow_request_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")
+        status = 500
+        started = time.perf_counter()
+        with request_context(incoming if _REQUEST_ID_PATTERN.match(incoming) else None) as request_id:
+            async def send_with_request_id(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-request-id", request_id.encode("latin-1")))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_request_id)
+            finally:
+                elapsed = time.perf_counter() - started
+                # Route templates (not raw paths) keep the label set small
+                route = getattr(scope.get("route"), "path", "unmatched")
+                REQUEST_SECONDS.labels(scope["method"], route, str(status)).observe(elapsed)
+                if elapsed >= self.slow_request_seconds:
+                    logger.warning(
+                        f"Slow request {scope['method']} {route} ({status}) took {elapsed:.2f}s: "
+                        f"{format_stages(stage_timings()) or 'no stages recorded'}"
+                    )
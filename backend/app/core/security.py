@@ -1,48 +1,177 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+import httpx
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from supabase import create_client, Client
 from jose import jwt, JWTError
 from loguru import logger
 from .config import settings
+from .metrics import CACHE_LOOKUPS
 
 # This scheme expects the token to be sent in the Authorization header
 # as 'Bearer <token>'
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-# Initialize Supabase client
-supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+# Algorithms accepted for tokens signed with a key from the JWKS endpoint
+ASYMMETRIC_ALGORITHMS = ("RS256", "ES256")
+
+@lru_cache(maxsize=1)
+def get_supabase_client() -> Client:
+    """Returns the shared Supabase client, created on first use rather than at import."""
+    return create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of tokens whose signature and claims have already been verified,
+    keyed by a SHA-256 digest of the token so raw tokens are never held in memory.
+    An entry is served until the token's own `exp` or `ttl_seconds` after it was
+    verified, whichever comes first.
+    """
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str):
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                CACHE_LOOKUPS.labels("token", "miss").inc()
+                return None
+            payload, expires_at = entry
+            if time.time() >= expires_at:
+                del self._entries[key]
+                CACHE_LOOKUPS.labels("token", "miss").inc()
+                return None
+            self._entries.move_to_end(key)
+            CACHE_LOOKUPS.labels("token", "hit").inc()
+            return payload
+
+    def put(self, token: str, payload: dict):
+        expires_at = time.time() + self.ttl_seconds
+        if "exp" in payload:
+            expires_at = min(expires_at, float(payload["exp"]))
+        key = self.key(token)
+        with self._lock:
+            self._entries[key] = (payload, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class JWKSCache:
+    """
+    Public signing keys from a JWKS endpoint, cached by key id for `ttl_seconds`.
+    An unknown key id triggers a refetch (at most once per `min_refresh_seconds`),
+    so rotated keys are picked up without hitting the endpoint for every bad token.
+    """
+    def __init__(self, url: str, ttl_seconds: float = 3600, min_refresh_seconds: float = 30):
+        self.url = url
+        self.ttl_seconds = ttl_seconds
+        self.min_refresh_seconds = min_refresh_seconds
+        self._keys = {}
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get_key(self, kid: str) -> dict:
+        if kid in self._keys and time.monotonic() - self._fetched_at < self.ttl_seconds:
+            return self._keys[kid]
+        async with self._lock:
+            # Another request may have refreshed the keys while this one waited
+            stale = time.monotonic() - self._fetched_at >= self.ttl_seconds
+            if stale or (kid not in self._keys and time.monotonic() - self._fetched_at >= self.min_refresh_seconds):
+                await self._refresh()
+        key = self._keys.get(kid)
+        if key is None:
+            raise JWTError(f"Unknown signing key id: {kid}")
+        return key
+
+    async def _refresh(self):
+        async with httpx.AsyncClient(timeout=5.0) as client:
+            response = await client.get(self.url)
+            response.raise_for_status()
+        self._keys = {key["kid"]: key for key in response.json().get("keys", []) if "kid" in key}
+        self._fetched_at = time.monotonic()
+        logger.info(f"Fetched {len(self._keys)} signing keys from {self.url}")
+
+
+token_cache = VerifiedTokenCache(
+    max_entries=settings.AUTH_TOKEN_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.AUTH_TOKEN_CACHE_TTL_SECONDS,
+)
+jwks_cache = JWKSCache(settings.SUPABASE_JWKS_URL, ttl_seconds=settings.JWKS_CACHE_SECONDS) if settings.SUPABASE_JWKS_URL else None
+
+
+async def verify_token(token: str) -> dict:
+    """
+    Verifies a JWT's signature, expiry and audience and returns its payload.
+    Tokens signed with an asymmetric algorithm are checked against the JWKS keys;
+    HS256 tokens against the project's JWT secret.
+    """
+    header = jwt.get_unverified_header(token)
+    algorithm = header.get("alg")
+    if algorithm in ASYMMETRIC_ALGORITHMS:
+        if jwks_cache is None:
+            raise JWTError(f"{algorithm} token received but SUPABASE_JWKS_URL is not configured")
+        key = await jwks_cache.get_key(header.get("kid"))
+        return jwt.decode(token, key, algorithms=[algorithm], audience="authenticated")
+    return jwt.decode(
+        token,
+        settings.SUPABASE_JWT_SECRET,
+        algorithms=["HS256"],
+        audience="authenticated",
+    )
 
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
     """
     Decodes and validates the JWT token from the Authorization header.
     Returns the user data payload if the token is valid.
+    Tokens verified before are served from the cache until they expire.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    if settings.AUTH_TOKEN_CACHE_ENABLED:
+        payload = token_cache.get(token)
+        if payload is not None:
+            return payload
     try:
-        payload = jwt.decode(
-            token,
-            settings.SUPABASE_JWT_SECRET,
-            algorithms=["HS256"],
-            audience="authenticated",
-        )
+        payload = await verify_token(token)
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
-        
+
         # The payload itself contains the user data from Supabase token
         # You can add a check here to see if the user exists in your DB if needed
         # For now, we trust the valid token from Supabase
-        logger.info(f"Successfully validated token for user_id: {user_id}")
+        logger.debug(f"Successfully validated token for user_id: {user_id}")
+        if settings.AUTH_TOKEN_CACHE_ENABLED:
+            token_cache.put(token, payload)
         return payload
 
+    except HTTPException:
+        raise
     except JWTError as e:
         logger.error(f"JWT Error: {e}")
         raise credentials_exception
     except Exception as e:
         logger.error(f"An unexpected error occurred during token validation: {e}")
         raise credentials_exception
-
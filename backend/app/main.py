@@ -1,14 +1,51 @@
+import asyncio
 import contextlib
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.v1 import upload, chat
+from fastapi.responses import JSONResponse
+from app.api.v1 import upload, chat, documents, jobs, search
+from app.core.config import settings
 from app.core.logger import setup_logging
+from app.core.metrics import RequestContextMiddleware, render_metrics
+from app.core.security import get_supabase_client
+from app.services.compaction import compactor
+from app.services.ingestion import ingestion_pipeline
+from app.services.summarizer import summary_store
+from app.services.vector_store import vector_store
+from app.services.warmup import warmup_state
+from loguru import logger
+
+def ensure_indexes():
+    vector_store.ensure_indexes()
+    ingestion_pipeline.jobs.ensure_indexes()
+    summary_store.ensure_indexes()
 
 @contextlib.asynccontextmanager
 async def lifespan(app: FastAPI):
     """Handles application startup and shutdown events."""
     setup_logging()
+    # Index creation and the catalog backfill scan whole collections on a large
+    # deployment, so they run on a worker thread as the first startup step; /healthz
+    # is served right away and /readyz stays 503 until every step has finished
+    steps = {"mongo_indexes": ensure_indexes}
+    if settings.WARMUP_ON_STARTUP:
+        steps.update({
+            "embedding_model": vector_store.warm_up,
+            "rag_pipeline": chat.get_rag_pipeline,
+            "supabase": get_supabase_client,
+        })
+    warmup_task = asyncio.create_task(warmup_state.run(steps))
+    # Picks up document changes made by other workers and purges tombstoned chunks
+    maintenance_task = asyncio.create_task(compactor.run_forever())
+    # Keeps this worker's ingestion jobs alive and fails those orphaned by dead workers
+    jobs_task = asyncio.create_task(ingestion_pipeline.run_maintenance())
     yield
+    maintenance_task.cancel()
+    jobs_task.cancel()
+    if not warmup_task.done():
+        warmup_task.cancel()
+    ingestion_pipeline.shutdown()
+    await vector_store.aclose()
 
 app = FastAPI(title="Chat with PDF API", lifespan=lifespan)
 
@@ -27,15 +64,49 @@ app.add_middleware(
     allow_credentials=True,      # Allow cookies
     allow_methods=["*"],         # Allow all methods (GET, POST, etc.)
     allow_headers=["*"],         # Allow all headers
+    expose_headers=["X-Request-ID"],
 )
+# Added last so it wraps everything else, CORS included
+app.add_middleware(RequestContextMiddleware, slow_request_seconds=settings.SLOW_REQUEST_SECONDS)
 # --------------------------------
 
 # Include API routers
 app.include_router(upload.router, prefix="/api/v1", tags=["PDF Management"])
 app.include_router(chat.router, prefix="/api/v1", tags=["Chat"])
+app.include_router(documents.router, prefix="/api/v1", tags=["PDF Management"])
+app.include_router(jobs.router, prefix="/api/v1", tags=["PDF Management"])
+app.include_router(search.router, prefix="/api/v1", tags=["Search"])
 
 @app.get("/", tags=["Health Check"])
 def read_root():
     """Health check endpoint."""
     return {"status": "ok"}
 
+@app.get("/healthz", tags=["Health Check"])
+def liveness():
+    """Liveness probe: the process is up and serving. Touches no dependencies."""
+    return {"status": "ok"}
+
+@app.get("/readyz", tags=["Health Check"])
+async def readiness():
+    """
+    Readiness probe: 200 once warm-up has finished and MongoDB answers a ping,
+    503 otherwise, so load balancers only route traffic to warmed-up workers.
+    """
+    body = {"warmup": warmup_state.to_dict(), "mongo": "unknown"}
+    if not warmup_state.ready:
+        return JSONResponse(status_code=503, content={"status": "not ready", **body})
+    try:
+        await vector_store.aping()
+        body["mongo"] = "ok"
+    except Exception as e:
+        logger.warning(f"Readiness check could not reach MongoDB: {e}")
+        body["mongo"] = "unreachable"
+        return JSONResponse(status_code=503, content={"status": "not ready", **body})
+    return {"status": "ready", **body}
+
+@app.get("/metrics", tags=["Health Check"])
+def metrics():
+    """Prometheus metrics: per-stage and per-route latency histograms, embedding batch sizes."""
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
@@ -1,4 +1,5 @@
-from pydantic import BaseModel, Field, EmailStr
+from typing import List, Optional
+from pydantic import BaseModel, Field, EmailStr, model_validator
 
 class UserCreate(BaseModel):
     """
@@ -9,10 +10,32 @@ class UserCreate(BaseModel):
     email: EmailStr = Field(..., description="The user's email address.")
     password: str = Field(..., min_length=8, description="The user's password (at least 8 characters).")
 
-class ChatRequest(BaseModel):
+class DocumentScope(BaseModel):
+    """
+    The documents a request searches: exactly one of a single document, a list of
+    documents, or all of the user's documents.
+    """
+    document_id: Optional[str] = Field(None, description="The unique identifier for the processed document.")
+    document_ids: Optional[List[str]] = Field(None, min_length=1, max_length=1000, description="Several of the user's documents to search together.")
+    all_documents: bool = Field(False, description="Search across all of the user's documents.")
+
+    @model_validator(mode="after")
+    def check_single_scope(self):
+        scopes = (self.document_id is not None) + (self.document_ids is not None) + self.all_documents
+        if scopes != 1:
+            raise ValueError("Provide exactly one of 'document_id', 'document_ids' or 'all_documents'.")
+        return self
+
+class ChatRequest(DocumentScope):
     """
     Schema for a chat message request.
-    Requires a question and the ID of the document to chat with.
+    Requires a question and the document(s) to chat with.
     """
-    document_id: str = Field(..., description="The unique identifier for the processed document.")
     question: str = Field(..., min_length=1, description="The question being asked by the user.")
+
+class SearchRequest(DocumentScope):
+    """
+    Schema for a batch search request: ranked chunks for each query, without an LLM call.
+    """
+    queries: List[str] = Field(..., min_length=1, max_length=32, description="The search queries, answered independently.")
+    k: int = Field(10, ge=1, le=50, description="Number of chunks returned per query.")
@@ -1,5 +1,6 @@
+from datetime import datetime
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 class TokenResponse(BaseModel):
     """
@@ -17,11 +18,14 @@ class UserResponse(BaseModel):
 
 class UploadResponse(BaseModel):
     """
-    Schema for the response after a successful file upload and processing.
+    Schema for the response after a file upload has been accepted for processing.
     """
     message: str = "File uploaded successfully."
     filename: str = Field(..., description="The original name of the uploaded file.")
     document_id: str = Field(..., description="The unique identifier assigned to the processed document.")
+    job_id: Optional[str] = Field(None, description="The ingestion job to poll for processing status.")
+    status: Optional[str] = Field(None, description="The ingestion job status at the time of the response.")
+    reused_chunks: Optional[int] = Field(None, description="Chunks whose stored embeddings were reused instead of recomputed.")
 
 class ChatResponse(BaseModel):
     """
@@ -29,4 +33,85 @@ class ChatResponse(BaseModel):
     """
     question: str = Field(..., description="The original question asked by the user.")
     answer: str = Field(..., description="The generated answer to the user's question.")
-    document_id: str = Field(..., description="The ID of the document the chat is based on.")
+    document_id: Optional[str] = Field(None, description="The ID of the document the chat is based on.")
+    document_ids: Optional[List[str]] = Field(None, description="The documents searched, for multi-document chats.")
+    cached: bool = Field(False, description="Whether the answer was served from the answer cache.")
+
+class SearchHit(BaseModel):
+    """
+    Schema for one retrieved chunk.
+    """
+    document_id: str
+    page: Optional[int] = None
+    text: str
+    rrf_score: Optional[float] = Field(None, description="Fused rank score, in hybrid retrieval mode.")
+    similarity_score: Optional[float] = Field(None, description="Cosine similarity to the query, when among the vector candidates.")
+    bm25_score: Optional[float] = Field(None, description="BM25 keyword score, when among the keyword candidates.")
+
+class SearchResult(BaseModel):
+    """
+    Schema for the ranked chunks of one query.
+    """
+    query: str
+    hits: List[SearchHit]
+
+class SearchResponse(BaseModel):
+    """
+    Schema for the response from the batch search endpoint.
+    """
+    document_ids: List[str] = Field(..., description="The documents searched.")
+    results: List[SearchResult]
+
+
+class DocumentInfo(BaseModel):
+    """
+    Schema describing one document in the user's catalog.
+    """
+    document_id: str = Field(..., description="The unique identifier of the document.")
+    filename: str = Field(..., description="The original name of the uploaded file.")
+    chunk_count: int = Field(..., description="The number of chunks stored for the document.")
+    created_at: Optional[datetime] = Field(None, description="When the document was first uploaded.")
+
+class DocumentListResponse(BaseModel):
+    """
+    Schema for the list of documents owned by the current user.
+    """
+    documents: List[DocumentInfo]
+
+class SummaryResponse(BaseModel):
+    """
+    Schema for the status and result of a document summary.
+    """
+    document_id: str
+    status: str = Field(..., description="One of 'running', 'completed' or 'failed'.")
+    summary: Optional[str] = Field(None, description="The summary, once completed.")
+    progress: float = Field(..., description="Fraction of the summary completed, from 0 to 1.")
+    chunk_count: Optional[int] = None
+    cached_chunks: int = Field(0, description="Chunks whose summaries were reused from the cache.")
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+class JobStage(BaseModel):
+    """
+    Schema for the progress of a single ingestion stage.
+    """
+    status: str = Field(..., description="One of 'pending', 'running', 'completed' or 'failed'.")
+    progress: float = Field(..., description="Fraction of the stage completed, from 0 to 1.")
+
+class JobStatusResponse(BaseModel):
+    """
+    Schema for the status of a background ingestion job.
+    """
+    job_id: str
+    document_id: str
+    filename: str
+    operation: str = Field("create", description="'create' for a new document, 'update' for a new version of one.")
+    status: str = Field(..., description="One of 'queued', 'running', 'completed' or 'failed'.")
+    stages: Dict[str, JobStage] = Field(..., description="Per-stage progress: parse, split, embed and store.")
+    chunk_count: Optional[int] = None
+    reused_chunks: int = Field(0, description="Chunks whose stored embeddings were reused instead of recomputed.")
+    removed_chunks: int = Field(0, description="Chunks of the previous version no longer in the document, for updates.")
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
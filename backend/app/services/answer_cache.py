@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from app.core.config import settings
+from app.core.metrics import CACHE_LOOKUPS
+from app.services.embedding_cache import normalize_text
+from app.services.vector_store import vector_store
+from loguru import logger
+
+
+def normalize_question(question: str) -> str:
+    """Lowercases, collapses whitespace and drops trailing punctuation."""
+    return normalize_text(question).lower().rstrip("?!. ")
+
+
+class AnswerCache:
+    """
+    Caches generated answers per document. The exact tier is keyed by
+    (document_id, normalized question); the optional semantic tier matches a new
+    question's embedding against the cached questions of the same document and
+    returns the best answer at or above `semantic_threshold` cosine similarity.
+    Entries expire after `ttl_seconds`, the least recently used are evicted beyond
+    `max_entries`, and all entries of a document are dropped when its chunks change.
+    """
+    def __init__(self, max_entries: int, ttl_seconds: float, semantic_threshold: float = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = semantic_threshold
+        self._entries = OrderedDict()
+        # Stacked question embeddings per document for the semantic tier, rebuilt on change
+        self._matrices = {}
+        self._lock = threading.Lock()
+
+    def get(self, document_id: str, question: str, question_embedding=None):
+        """Returns the cached entry for a question, or None on a miss."""
+        key = (document_id, normalize_question(question))
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                CACHE_LOOKUPS.labels("answer", "exact_hit").inc()
+                return entry
+
+            if question_embedding is not None and self.semantic_threshold is not None:
+                entry = self._semantic_match(document_id, question_embedding)
+                if entry is not None:
+                    CACHE_LOOKUPS.labels("answer", "semantic_hit").inc()
+                    return entry
+
+            CACHE_LOOKUPS.labels("answer", "miss").inc()
+            return None
+
+    def put(self, document_id: str, question: str, answer: str, question_embedding=None, sources=None):
+        key = (document_id, normalize_question(question))
+        entry = {
+            "answer": answer,
+            "sources": sources or [],
+            "embedding": None if question_embedding is None else np.asarray(question_embedding, dtype=np.float32),
+            "expires_at": time.monotonic() + self.ttl_seconds,
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._matrices.pop(document_id, None)
+            while len(self._entries) > self.max_entries:
+                (evicted_document_id, _), _ = self._entries.popitem(last=False)
+                self._matrices.pop(evicted_document_id, None)
+
+    def invalidate(self, document_id: str):
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == document_id]
+            for key in stale:
+                del self._entries[key]
+            self._matrices.pop(document_id, None)
+        if stale:
+            logger.info(f"Invalidated {len(stale)} cached answers for document {document_id}")
+
+    def _live_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry["expires_at"] < time.monotonic():
+            del self._entries[key]
+            self._matrices.pop(key[0], None)
+            return None
+        return entry
+
+    def _semantic_match(self, document_id: str, question_embedding):
+        if document_id not in self._matrices:
+            keys = [
+                key for key, entry in self._entries.items()
+                if key[0] == document_id and entry["embedding"] is not None
+            ]
+            matrix = np.vstack([self._entries[key]["embedding"] for key in keys]) if keys else None
+            expires_at = np.array([self._entries[key]["expires_at"] for key in keys])
+            self._matrices[document_id] = (keys, matrix, expires_at)
+
+        keys, matrix, expires_at = self._matrices[document_id]
+        if matrix is None:
+            return None
+        # Expired entries are evicted here so they can neither win the argmax nor shadow a live runner-up
+        expired = expires_at < time.monotonic()
+        if expired.any():
+            for index in np.flatnonzero(expired):
+                del self._entries[keys[index]]
+            self._matrices.pop(document_id, None)
+            live = ~expired
+            keys = [key for key, keep in zip(keys, live) if keep]
+            if not keys:
+                return None
+            matrix = matrix[live]
+        scores = matrix @ np.asarray(question_embedding, dtype=np.float32)
+        best = int(np.argmax(scores))
+        if scores[best] < self.semantic_threshold:
+            return None
+        self._entries.move_to_end(keys[best])
+        return self._entries[keys[best]]
+
+answer_cache = AnswerCache(
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+    semantic_threshold=settings.ANSWER_CACHE_SEMANTIC_THRESHOLD if settings.ANSWER_CACHE_SEMANTIC_ENABLED else None,
+)
+# Any change to a document's chunks makes its cached answers stale
+vector_store.add_document_listener(answer_cache.invalidate, in_memory=True)
@@ -0,0 +1,289 @@
+import re
+from functools import lru_cache
+import pymupdf
+from langchain.docstore.document import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from loguru import logger
+
+# Tokenizer of the embedding model (EMBEDDING_MODEL_NAME in embedding_server); named here
+# so the chunker, which also runs in parse worker processes, does not need the app settings
+TOKENIZER_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# all-MiniLM-L6-v2 truncates its input after 256 word pieces, [CLS] and [SEP] included;
+# token-sized chunks stay below this so no chunk text is silently dropped from its embedding
+MODEL_MAX_TOKENS = 256
+MAX_CHUNK_TOKENS = MODEL_MAX_TOKENS - 16
+
+# Block kinds in a page's layout
+HEADING, TABLE, TEXT = "heading", "table", "text"
+
+# A text block whose largest font is this much bigger than the page's body text is a heading
+HEADING_FONT_RATIO = 1.15
+HEADING_MAX_CHARS = 200
+# PyMuPDF span flag for bold text
+BOLD_FLAG = 16
+# Text lines this close vertically are one table row
+ROW_TOLERANCE = 3
+
+# Numbered ("2.1 Scope", "IV. Terms") or labelled ("Appendix B") headings in extracted text
+_NUMBERED_HEADING = re.compile(r"^(?:(?:\d+\.)*\d+\.?|[IVXLC]+\.|chapter|section|appendix)\s+\S", re.IGNORECASE)
+# Table rows in extracted text: cells separated by tabs, pipes or runs of spaces
+_CELL_SEPARATOR = re.compile(r"\t|\s\|\s|\s{2,}")
+
+
+@lru_cache(maxsize=1)
+def token_length():
+    """
+    Returns a function counting a text's tokens with the embedding model's tokenizer,
+    or an estimate (about 4 characters per token) when the tokenizer cannot be loaded.
+    """
+    try:
+        # Imported here: transformers is slow to import and only needed by token-sized profiles
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(TOKENIZER_NAME)
+    except Exception as e:
+        logger.warning(f"Could not load the {TOKENIZER_NAME} tokenizer, estimating chunk tokens from length: {e}")
+        return lambda text: len(text) // 4 + 1
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
+
+class ChunkingProfile:
+    """
+    How documents are cut into chunks: the chunk size and overlap, in characters or in
+    embedding-model tokens, and whether chunks follow the page layout (headings start
+    new chunks, tables are kept whole) or are cut from the running text alone.
+    `sizes` makes the chunk size depend on the document's page count, as a tuple of
+    (max pages, chunk size) steps; larger documents get larger chunks so their chunk
+    count (and embedding and scan time) grows more slowly than their length.
+    """
+    def __init__(self, name: str, chunk_size: int, chunk_overlap: int, unit: str = "tokens", structured: bool = False, sizes: tuple = ()):
+        self.name = name
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.unit = unit
+        self.structured = structured
+        self.sizes = sizes
+
+    def size_for(self, total_pages: int = None) -> int:
+        if total_pages is not None:
+            for max_pages, size in self.sizes:
+                if total_pages <= max_pages:
+                    return size
+        return self.chunk_size
+
+    def length(self, text: str) -> int:
+        return token_length()(text) if self.unit == "tokens" else len(text)
+
+    @lru_cache(maxsize=8)
+    def splitter(self, chunk_size: int) -> RecursiveCharacterTextSplitter:
+        overlap = self.chunk_overlap * chunk_size // self.chunk_size
+        if self.unit == "tokens":
+            return RecursiveCharacterTextSplitter(
+                chunk_size=chunk_size, chunk_overlap=overlap, length_function=token_length(), add_start_index=True,
+            )
+        return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=overlap, add_start_index=True)
+
+
+PROFILES = {
+    # The original splitter: 1000 characters with 100 overlap, cut from the page text
+    "legacy": ChunkingProfile("legacy", chunk_size=1000, chunk_overlap=100, unit="chars"),
+    # Sized to fill the embedding model's input window
+    "tokens": ChunkingProfile("tokens", chunk_size=MAX_CHUNK_TOKENS, chunk_overlap=32),
+    # Token-sized, cut at headings and around tables
+    "structured": ChunkingProfile("structured", chunk_size=MAX_CHUNK_TOKENS, chunk_overlap=32, structured=True),
+    # Structured, with smaller chunks for short documents and full-window chunks for long ones
+    "adaptive": ChunkingProfile(
+        "adaptive", chunk_size=MAX_CHUNK_TOKENS, chunk_overlap=32, structured=True,
+        sizes=((20, 128), (200, 192)),
+    ),
+}
+
+
+def get_profile(name: str) -> ChunkingProfile:
+    if name not in PROFILES:
+        raise ValueError(f"Unknown chunking profile '{name}'. Expected one of {tuple(PROFILES)}.")
+    return PROFILES[name]
+
+
+def layout_page(page: pymupdf.Page) -> tuple[str, list]:
+    """
+    Extracts a PyMuPDF page as layout blocks in reading order. Headings are told apart
+    from body text by font size (or bold short lines). Tables are areas of clustered
+    vector lines whose text forms at least two rows of two or more cells; this finds
+    ruled tables at a fraction of the cost of PyMuPDF's table finder, which also
+    analyses the text around every table for a header.
+    Returns the page text (blocks joined by blank lines) and [kind, start, end] offsets
+    of each block in it.
+    """
+    drawings = page.get_drawings()
+    regions = [rect for rect in page.cluster_drawings(drawings=drawings) if rect.width > 0 and rect.height > 0] if drawings else []
+    table_lines = {i: [] for i in range(len(regions))}
+    prose, sizes = [], []
+    for block in page.get_text("dict", sort=True)["blocks"]:
+        if block["type"] != 0:
+            continue
+        lines = []
+        for line in block["lines"]:
+            text = " ".join("".join(span["text"] for span in line["spans"]).split())
+            if not text:
+                continue
+            x0, y0, x1, y1 = line["bbox"]
+            center = pymupdf.Point((x0 + x1) / 2, (y0 + y1) / 2)
+            region = next((i for i, rect in enumerate(regions) if center in rect), None)
+            if region is not None:
+                table_lines[region].append((line["bbox"][1], line["bbox"][0], text, line["spans"]))
+            else:
+                lines.append((text, line["spans"]))
+        if lines:
+            prose.append((block["bbox"][1], block["bbox"][0], lines))
+
+    items = []
+    for i, lines in table_lines.items():
+        rows = []
+        for y, x, text, spans in sorted(lines):
+            if rows and y - rows[-1][0] <= ROW_TOLERANCE:
+                rows[-1][1].append(text)
+            else:
+                rows.append((y, [text]))
+        if len(rows) >= 2 and max(len(cells) for _, cells in rows) >= 2:
+            items.append((regions[i].y0, regions[i].x0, TABLE, "\n".join(" | ".join(cells) for _, cells in rows)))
+        else:
+            # Lines in a figure or a box rather than a table
+            prose.extend((y, x, [(text, spans)]) for y, x, text, spans in lines)
+
+    for _, _, lines in prose:
+        sizes.extend((span["size"], len(span["text"])) for _, spans in lines for span in spans if span["text"].strip())
+    if sizes:
+        # The body font is the size covering the most characters on the page
+        weights = {}
+        for size, chars in sizes:
+            weights[round(size, 1)] = weights.get(round(size, 1), 0) + chars
+        body = max(weights, key=weights.get)
+        for y, x, lines in prose:
+            spans = [span for _, line_spans in lines for span in line_spans if span["text"].strip()]
+            text = "\n".join(text for text, _ in lines)
+            size = max(span["size"] for span in spans)
+            bold = all(span["flags"] & BOLD_FLAG for span in spans)
+            heading = len(text) <= HEADING_MAX_CHARS and (size >= body * HEADING_FONT_RATIO or (bold and len(lines) == 1))
+            items.append((y, x, HEADING if heading else TEXT, text))
+
+    items.sort(key=lambda item: (item[0], item[1]))
+    return _join_blocks([(kind, text) for _, _, kind, text in items])
+
+
+def _join_blocks(blocks: list[tuple[str, str]]) -> tuple[str, list]:
+    parts, offsets, position = [], [], 0
+    for kind, text in blocks:
+        if parts:
+            parts.append("\n\n")
+            position += 2
+        parts.append(text)
+        offsets.append([kind, position, position + len(text)])
+        position += len(text)
+    return "".join(parts), offsets
+
+
+def _is_heading_line(line: str) -> bool:
+    if not line or len(line) > 80 or line[-1] in ".,;:":
+        return False
+    if _NUMBERED_HEADING.match(line):
+        return len(line.split()) <= 10
+    letters = [c for c in line if c.isalpha()]
+    return len(letters) >= 3 and all(c.isupper() for c in letters)
+
+
+def text_blocks(text: str) -> list:
+    """
+    Layout blocks guessed from plain extracted text, for engines without layout
+    information: numbered or all-caps short lines are headings, runs of two or more
+    lines with three or more separated cells are tables, blank lines end paragraphs.
+    Returns [kind, start, end] offsets into `text`.
+    """
+    blocks = []
+    position = 0
+    for line in text.splitlines(keepends=True):
+        start, stripped = position, line.strip()
+        position += len(line)
+        if not stripped:
+            continue
+        start += len(line) - len(line.lstrip())
+        end = start + len(stripped)
+        if _is_heading_line(stripped):
+            kind = HEADING
+        elif len(_CELL_SEPARATOR.split(stripped)) >= 3:
+            kind = TABLE
+        else:
+            kind = TEXT
+        previous = blocks[-1] if blocks else None
+        # Consecutive lines of a paragraph or table belong to the same block
+        if previous and kind != HEADING and previous[0] == kind and text.count("\n", previous[2], start) <= 1:
+            previous[2] = end
+        else:
+            blocks.append([kind, start, end])
+    # A single row is not a table
+    for block in blocks:
+        if block[0] == TABLE and "\n" not in text[block[1]:block[2]]:
+            block[0] = TEXT
+    return blocks
+
+
+class Chunker:
+    """
+    Splits page Documents into chunks with a ChunkingProfile. Chunks never cross a page
+    and are contiguous slices of the page text, with `start_index` offsets, so the
+    context packer can merge neighbours. Structured profiles pack whole layout blocks
+    (from the page's "blocks" metadata, or guessed from its text) up to the chunk size,
+    start a new chunk at every heading, keep tables apart from the prose around them,
+    and record the heading a chunk falls under as its "section".
+    """
+    def __init__(self, profile: ChunkingProfile):
+        self.profile = profile
+
+    def split_page(self, page: Document, section: str = None) -> tuple[list[Document], str]:
+        """Splits one page; `section` is the heading in effect where the previous page ended."""
+        metadata = {key: value for key, value in page.metadata.items() if key != "blocks"}
+        size = self.profile.size_for(metadata.get("total_pages"))
+        splitter = self.profile.splitter(size)
+        if not self.profile.structured:
+            return splitter.split_documents([Document(page_content=page.page_content, metadata=metadata)]), section
+
+        text = page.page_content
+        blocks = page.metadata.get("blocks") or text_blocks(text)
+        chunks = []
+        pending = None
+
+        def emit(start: int, end: int):
+            if text[start:end].strip():
+                chunk_metadata = {**metadata, "start_index": start}
+                if section:
+                    chunk_metadata["section"] = section
+                chunks.append(Document(page_content=text[start:end], metadata=chunk_metadata))
+
+        def emit_split(start: int, end: int):
+            if self.profile.length(text[start:end]) <= size:
+                emit(start, end)
+                return
+            for piece in splitter.create_documents([text[start:end]]):
+                piece_start = start + piece.metadata["start_index"]
+                emit(piece_start, piece_start + len(piece.page_content))
+
+        for kind, start, end in blocks:
+            if kind in (HEADING, TABLE) and pending:
+                emit(*pending)
+                pending = None
+            if kind == HEADING:
+                section = " ".join(text[start:end].split())
+            if kind == TABLE:
+                emit_split(start, end)
+                continue
+            span = (pending[0] if pending else start, end)
+            if self.profile.length(text[span[0]:span[1]]) <= size:
+                pending = span
+            else:
+                # The block does not fit next to what is pending: split both together, so a
+                # heading stays at the top of its section's first chunk
+                emit_split(*span)
+                pending = None
+        if pending:
+            emit(*pending)
+        return chunks, section
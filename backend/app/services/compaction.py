@@ -0,0 +1,54 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from fastapi.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.services.vector_store import vector_store
+from loguru import logger
+
+
+class DocumentCompactor:
+    """
+    Background maintenance run by every API worker. Every `poll_seconds` it drops cached
+    indexes and answers of documents other workers have updated or deleted; every
+    `interval_seconds` it purges chunks tombstoned more than `grace_seconds` ago, so
+    the chunk collection only holds live data plus a short backlog.
+    Purging is idempotent, so workers compacting at the same time do no harm.
+    """
+    def __init__(self, store, poll_seconds: float, interval_seconds: float, grace_seconds: float, batch_size: int):
+        self.store = store
+        self.poll_seconds = poll_seconds
+        self.interval_seconds = interval_seconds
+        self.grace_seconds = grace_seconds
+        self.batch_size = batch_size
+        self.purged = 0
+        self._last_compaction = time.monotonic()
+
+    async def run_forever(self):
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                await run_in_threadpool(self.store.apply_remote_changes)
+                if time.monotonic() - self._last_compaction >= self.interval_seconds:
+                    await run_in_threadpool(self.compact)
+            except Exception as e:
+                logger.error(f"Document maintenance failed: {e}")
+
+    def compact(self) -> int:
+        """Purges chunks whose grace period has passed. Returns the number removed."""
+        self._last_compaction = time.monotonic()
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.grace_seconds)
+        purged = self.store.purge_tombstones(cutoff, batch_size=self.batch_size)
+        self.purged += purged
+        if purged:
+            logger.info(f"Compaction purged {purged} tombstoned chunks")
+        return purged
+
+
+compactor = DocumentCompactor(
+    vector_store,
+    poll_seconds=settings.DOCUMENT_CHANGE_POLL_SECONDS,
+    interval_seconds=settings.COMPACTION_INTERVAL_SECONDS,
+    grace_seconds=settings.TOMBSTONE_GRACE_SECONDS,
+    batch_size=settings.COMPACTION_BATCH_SIZE,
+)
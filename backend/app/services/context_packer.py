@@ -0,0 +1,140 @@
+from langchain.docstore.document import Document
+from app.services.lexical_index import tokenize
+from app.services.llm import estimate_tokens
+
+# Shortest suffix/prefix match treated as splitter overlap rather than coincidence
+MIN_OVERLAP_CHARS = 20
+
+
+def _overlap(first: str, second: str, max_chars: int) -> int:
+    """Length of the longest suffix of `first` that is also a prefix of `second`."""
+    for size in range(min(len(first), len(second), max_chars), MIN_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:size]):
+            return size
+    return 0
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ContextBlock:
+    """A run of one or more retrieved chunks from the same page, merged into one passage."""
+    def __init__(self, doc: Document, rank: int):
+        self.text = doc.page_content
+        self.metadata = doc.metadata
+        self.rank = rank
+        self.start = doc.metadata.get("start_index")
+        self.end = self.start + len(self.text) if self.start is not None else None
+        self.terms = frozenset(tokenize(self.text))
+
+    @property
+    def page_key(self):
+        return (self.metadata.get("document_id"), self.metadata.get("page"))
+
+    def merge(self, other: "ContextBlock", max_overlap: int) -> bool:
+        """
+        Merges a chunk from the same page into this block if the two are adjacent, using
+        start offsets when both have them and the splitter's overlap otherwise.
+        Returns False (leaving the block unchanged) when they are not adjacent.
+        """
+        if self.start is not None and other.start is not None:
+            if other.start <= self.end and other.end >= self.start:
+                first, second = (self, other) if self.start <= other.start else (other, self)
+                text = first.text + second.text[max(first.end - second.start, 0):] if second.end > first.end else first.text
+                self.text, self.start, self.end = text, first.start, max(first.end, second.end)
+            else:
+                return False
+        else:
+            forward = _overlap(self.text, other.text, max_overlap)
+            backward = _overlap(other.text, self.text, max_overlap)
+            if forward >= backward and forward:
+                self.text = self.text + other.text[forward:]
+            elif backward:
+                self.text = other.text + self.text[backward:]
+            else:
+                return False
+        self.rank = min(self.rank, other.rank)
+        self.terms = self.terms | other.terms
+        return True
+
+
+class ContextPacker:
+    """
+    Turns ranked retrieved chunks into the prompt context:
+
+    1. adjacent chunks from the same page are merged, dropping the text the splitter
+       repeats between them;
+    2. passages are picked by maximal marginal relevance (rank-based relevance against
+       word overlap with what is already picked), skipping near duplicates;
+    3. passages are packed into `token_budget` estimated tokens, truncating only a
+       first passage that is too long on its own.
+    """
+    def __init__(self, token_budget: int = 1000, mmr_lambda: float = 0.7, duplicate_threshold: float = 0.9, max_overlap: int = 200):
+        self.token_budget = token_budget
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
+        self.max_overlap = max_overlap
+
+    def pack(self, docs: list[Document]) -> list[Document]:
+        blocks = self._merge_adjacent(docs)
+        selected, used = [], 0
+        for block in self._mmr_order(blocks):
+            tokens = estimate_tokens(block.text)
+            if used + tokens > self.token_budget:
+                if selected:
+                    continue
+                # The best passage alone exceeds the budget: keep its beginning
+                block.text = block.text[:self.token_budget * 4]
+                tokens = estimate_tokens(block.text)
+            selected.append(block)
+            used += tokens
+        return [Document(page_content=block.text, metadata=block.metadata) for block in selected]
+
+    def _merge_adjacent(self, docs: list[Document]) -> list[ContextBlock]:
+        """
+        Merges adjacent chunks of each page into blocks. A page's chunks are taken in
+        offset order (those without offsets last) and swept until a sweep merges nothing,
+        so a chunk bridging two others joins all three whatever order they ranked in.
+        """
+        pages = {}
+        for rank, doc in enumerate(docs):
+            block = ContextBlock(doc, rank)
+            pages.setdefault(block.page_key, []).append(block)
+        blocks = []
+        for page_blocks in pages.values():
+            page_blocks.sort(key=lambda block: (block.start is None, block.start or 0, block.rank))
+            merged = self._sweep(page_blocks)
+            while len(merged) < len(page_blocks):
+                page_blocks, merged = merged, self._sweep(merged)
+            blocks.extend(merged)
+        return blocks
+
+    def _sweep(self, blocks: list[ContextBlock]) -> list[ContextBlock]:
+        merged = []
+        for block in blocks:
+            if not any(existing.merge(block, self.max_overlap) for existing in merged):
+                merged.append(block)
+        return merged
+
+    def _mmr_order(self, blocks: list[ContextBlock]) -> list[ContextBlock]:
+        remaining = sorted(blocks, key=lambda block: block.rank)
+        n = max(len(remaining), 1)
+        ordered = []
+        while remaining:
+            best, best_score = None, None
+            for block in remaining:
+                redundancy = max((_jaccard(block.terms, picked.terms) for picked in ordered), default=0.0)
+                if redundancy >= self.duplicate_threshold:
+                    continue
+                relevance = 1 - block.rank / n
+                score = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * redundancy
+                if best_score is None or score > best_score:
+                    best, best_score = block, score
+            if best is None:
+                break
+            ordered.append(best)
+            remaining.remove(best)
+        return ordered
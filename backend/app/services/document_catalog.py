@@ -0,0 +1,136 @@
+import os
+from datetime import datetime, timezone
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from loguru import logger
+
+# Marks, in the "migrations" collection, that documents stored before the catalog existed were registered
+CATALOG_BACKFILL = "document_catalog_backfill"
+
+class DocumentCatalog:
+    """
+    Keeps one small record per uploaded document so questions like "which documents
+    does this user have" never have to touch the chunk collection.
+    Lookups have async variants over `async_db` for use from request handlers.
+    """
+    def __init__(self, db, async_db=None):
+        self.collection = db.get_collection("documents")
+        self.async_collection = async_db.get_collection("documents") if async_db is not None else None
+
+    def ensure_indexes(self):
+        self.collection.create_index(
+            [("user_id", ASCENDING), ("document_id", ASCENDING)], unique=True
+        )
+        self.collection.create_index([("user_id", ASCENDING), ("created_at", DESCENDING)])
+        self.collection.create_index([("content_hash", ASCENDING)])
+
+    def backfill(self, chunks, live_filter: dict, batch_size: int = 1000) -> int:
+        """
+        Registers the documents whose chunks were stored before the catalog existed, from
+        the distinct (user_id, document_id) pairs of live chunks. Records that already
+        exist are left untouched. Runs once per database; later calls return 0 at once.
+        Returns the number of documents registered.
+        """
+        migrations = self.collection.database.get_collection("migrations")
+        if migrations.find_one({"_id": CATALOG_BACKFILL}):
+            return 0
+        pipeline = [
+            {"$match": live_filter},
+            {"$group": {
+                "_id": {"user_id": "$metadata.user_id", "document_id": "$metadata.document_id"},
+                "chunk_count": {"$sum": 1},
+                "first_chunk": {"$min": "$_id"},
+                "source": {"$first": "$metadata.source"},
+            }},
+        ]
+        registered, updates = 0, []
+        for row in chunks.aggregate(pipeline, allowDiskUse=True):
+            user_id, document_id = row["_id"].get("user_id"), row["_id"].get("document_id")
+            if not user_id or not document_id:
+                continue
+            updates.append(UpdateOne(
+                {"user_id": user_id, "document_id": document_id},
+                {"$setOnInsert": {
+                    # Only the spooled temp file's path was kept; the upload's name is lost
+                    "filename": os.path.basename(row.get("source") or "") or "document.pdf",
+                    "chunk_count": row["chunk_count"],
+                    "content_hash": None,
+                    "created_at": row["first_chunk"].generation_time,
+                }},
+                upsert=True,
+            ))
+            if len(updates) == batch_size:
+                registered += self.collection.bulk_write(updates, ordered=False).upserted_count
+                updates = []
+        if updates:
+            registered += self.collection.bulk_write(updates, ordered=False).upserted_count
+        migrations.update_one(
+            {"_id": CATALOG_BACKFILL},
+            {"$set": {"completed_at": datetime.now(timezone.utc), "registered": registered}},
+            upsert=True,
+        )
+        logger.info(f"Catalog backfill registered {registered} documents stored before the catalog existed")
+        return registered
+
+    def register(self, user_id: str, document_id: str, filename: str, chunk_count: int, content_hash: str = None, upsert: bool = True) -> bool:
+        """
+        Records (or refreshes) a document in the user's catalog. With `upsert=False` only an
+        existing record is refreshed; returns False if there was none (e.g. it was deleted).
+        """
+        result = self.collection.update_one(
+            {"user_id": user_id, "document_id": document_id},
+            {
+                "$set": {"filename": filename, "chunk_count": chunk_count, "content_hash": content_hash},
+                "$setOnInsert": {"created_at": datetime.now(timezone.utc)},
+            },
+            upsert=upsert,
+        )
+        if result.matched_count == 0 and result.upserted_id is None:
+            return False
+        logger.info(f"Registered document {document_id} ({chunk_count} chunks) for user {user_id}")
+        return True
+
+    async def aremove(self, user_id: str, document_id: str) -> bool:
+        """Removes a document from the user's catalog. Returns False if it was not there."""
+        result = await self.async_collection.delete_one({"user_id": user_id, "document_id": document_id})
+        return result.deleted_count > 0
+
+    def get(self, user_id: str, document_id: str):
+        return self.collection.find_one({"user_id": user_id, "document_id": document_id}, {"_id": 0})
+
+    async def aget(self, user_id: str, document_id: str):
+        return await self.async_collection.find_one({"user_id": user_id, "document_id": document_id}, {"_id": 0})
+
+    def find_by_hash(self, content_hash: str, user_id: str = None):
+        """
+        Finds a stored document with identical file content, restricted to one user's
+        catalog when `user_id` is given, otherwise across all users.
+        """
+        return self.collection.find_one(self._hash_query(content_hash, user_id), {"_id": 0})
+
+    async def afind_by_hash(self, content_hash: str, user_id: str = None):
+        return await self.async_collection.find_one(self._hash_query(content_hash, user_id), {"_id": 0})
+
+    def list_for_user(self, user_id: str) -> list[dict]:
+        return list(self.collection.find({"user_id": user_id}, {"_id": 0}).sort("created_at", DESCENDING))
+
+    async def alist_for_user(self, user_id: str) -> list[dict]:
+        cursor = self.async_collection.find({"user_id": user_id}, {"_id": 0}).sort("created_at", DESCENDING)
+        return await cursor.to_list(length=None)
+
+    async def aowned_ids(self, user_id: str, document_ids: list[str] = None) -> list[str]:
+        """
+        Returns the ids of the user's documents, newest first. With `document_ids`, only
+        those of them the user owns are returned.
+        """
+        query = {"user_id": user_id}
+        if document_ids is not None:
+            query["document_id"] = {"$in": list(document_ids)}
+        cursor = self.async_collection.find(query, {"_id": 0, "document_id": 1}).sort("created_at", DESCENDING)
+        return [row["document_id"] for row in await cursor.to_list(length=None)]
+
+    @staticmethod
+    def _hash_query(content_hash: str, user_id: str = None) -> dict:
+        query = {"content_hash": content_hash}
+        if user_id is not None:
+            query["user_id"] = user_id
+        return query
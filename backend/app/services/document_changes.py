@@ -0,0 +1,44 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from pymongo import ASCENDING
+
+# Changes are only needed until every worker has polled them
+CHANGE_RETENTION_SECONDS = 24 * 3600
+
+
+class DocumentChangeLog:
+    """
+    Records which documents had their chunks changed, so API workers other than the
+    one that made the change can drop their cached indexes and answers for them.
+    Each process tags its own changes with `origin` and skips them when polling.
+    """
+    def __init__(self, db, poll_overlap_seconds: float = 2.0):
+        self.collection = db.get_collection("document_changes")
+        self.origin = uuid.uuid4().hex
+        # Polls re-read this far back so changes written by a worker whose clock is
+        # slightly behind are not missed; already applied ones are skipped
+        self.poll_overlap = timedelta(seconds=poll_overlap_seconds)
+        self._last_poll = datetime.now(timezone.utc)
+        self._seen = set()
+
+    def ensure_indexes(self):
+        self.collection.create_index([("changed_at", ASCENDING)], expireAfterSeconds=CHANGE_RETENTION_SECONDS)
+
+    def record(self, document_id: str):
+        self.collection.insert_one({
+            "document_id": document_id,
+            "origin": self.origin,
+            "changed_at": datetime.now(timezone.utc),
+        })
+
+    def poll(self) -> list[str]:
+        """Returns the ids of documents changed by other processes since the last poll."""
+        now = datetime.now(timezone.utc)
+        changes = list(self.collection.find(
+            {"changed_at": {"$gt": self._last_poll - self.poll_overlap}, "origin": {"$ne": self.origin}},
+            {"document_id": 1},
+        ))
+        new = [change for change in changes if change["_id"] not in self._seen]
+        self._seen = {change["_id"] for change in changes}
+        self._last_poll = now
+        return list(dict.fromkeys(change["document_id"] for change in new))
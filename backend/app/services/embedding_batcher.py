@@ -0,0 +1,82 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+from app.core.metrics import EMBEDDED_TEXTS, EMBEDDING_BATCH_SIZE
+
+
+class EmbeddingBatcher:
+    """
+    Dynamic micro-batching for query embeddings. Concurrent callers enqueue their text;
+    a single background task gathers whatever arrives within `max_wait_ms` (up to
+    `max_batch_size` texts), runs one batched forward pass on a worker thread and
+    resolves each caller's future with its own vector.
+    """
+    def __init__(self, model, max_batch_size: int = 32, max_wait_ms: float = 5.0, threads: int = 1):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.threads = threads
+        self.executor = None
+        self._queue = None
+        self._task = None
+        # all-MiniLM-L6-v2 is symmetric, so a batch of queries can go through the document path
+        self._embed_batch = getattr(model, "embed_queries", None) or model.embed_documents
+
+    async def embed_query(self, text: str) -> list[float]:
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._queue = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def _ensure_started(self):
+        # Created lazily so the queue and task belong to the event loop serving requests
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="embedding-batcher")
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                vectors = await loop.run_in_executor(self.executor, self._embed_batch, texts)
+            except Exception as e:
+                logger.error(f"Batched embedding of {len(texts)} queries failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            EMBEDDING_BATCH_SIZE.labels("query").observe(len(batch))
+            EMBEDDED_TEXTS.labels("query").inc(len(batch))
+            for (_, future), vector in zip(batch, vectors):
+                # The caller may have been cancelled (e.g. client disconnected) while waiting
+                if not future.done():
+                    future.set_result(vector)
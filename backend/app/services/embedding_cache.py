@@ -0,0 +1,187 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from loguru import logger
+from app.core.metrics import CACHE_LOOKUPS
+
+
+def normalize_text(text: str) -> str:
+    """Normalizes unicode and collapses whitespace so trivially different copies share a key."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model with a two-level cache: an in-memory LRU in front of a
+    SQLite file on local disk. Entries are keyed by model name, call kind (query or
+    document) and a hash of the normalized text, and stored as packed float32.
+    The lock only guards the LRU; each thread has its own connection to the WAL-mode file,
+    which other worker processes may share. Disk access that stays busy for longer than
+    `busy_timeout` seconds is skipped rather than failing the embedding call.
+    """
+    def __init__(self, model: Embeddings, model_name: str, path: str, memory_items: int = 10000, max_rows: int = 1_000_000, busy_timeout: float = 5.0):
+        self.model = model
+        self.model_name = model_name
+        self.path = path
+        self.memory_items = memory_items
+        self.max_rows = max_rows
+        self.busy_timeout = busy_timeout
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_eviction = 0
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        db = self._connection()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+        db.commit()
+        logger.info(f"Embedding cache for '{model_name}' opened at {path}")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Returns the calling thread's connection to the cache file, opening it on first use."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.busy_timeout)
+            db.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}")
+            self._local.db = db
+        return db
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embed(texts, kind="document")
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed([text], kind="query")[0]
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embeds several queries with one batched forward pass for the cache misses.
+        Only valid for symmetric models such as all-MiniLM-L6-v2, where query and
+        document embeddings are computed the same way.
+        """
+        return self._embed(texts, kind="query", batch_queries=True)
+
+    def _key(self, text: str, kind: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{kind}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _embed(self, texts: list[str], kind: str, batch_queries: bool = False) -> list[list[float]]:
+        keys = [self._key(text, kind) for text in texts]
+        found, disk_hits = self._lookup(set(keys))
+
+        # Each distinct missing text is embedded once, even if it repeats within the batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            if kind == "query" and not batch_queries:
+                vectors = [self.model.embed_query(text) for text in missing.values()]
+            else:
+                vectors = self.model.embed_documents(list(missing.values()))
+            # Round through float32 so memory and disk hits return identical values
+            computed = {
+                key: np.asarray(vector, dtype=np.float32).tolist()
+                for key, vector in zip(missing.keys(), vectors)
+            }
+            self._store(computed)
+            found.update(computed)
+
+        CACHE_LOOKUPS.labels("embedding", "memory_hit").inc(len(texts) - len(missing) - disk_hits)
+        CACHE_LOOKUPS.labels("embedding", "disk_hit").inc(disk_hits)
+        CACHE_LOOKUPS.labels("embedding", "miss").inc(len(missing))
+        return [list(found[key]) for key in keys]
+
+    def _lookup(self, keys: set[str]) -> tuple[dict, int]:
+        """Returns the cached vectors found for `keys` and how many of them came from disk."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+
+        on_disk = [key for key in keys if key not in found]
+        rows = []
+        try:
+            db = self._connection()
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(on_disk), 500):
+                batch = on_disk[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows.extend(db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall())
+            if rows:
+                db.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(time.time(), key) for key, _ in rows],
+                )
+                db.commit()
+        except sqlite3.Error as e:
+            # Rows read before a busy timeout are still good; only their access time is lost
+            logger.warning(f"Embedding cache lookup on disk failed: {e}")
+            self._rollback()
+
+        if rows:
+            vectors = {key: np.frombuffer(blob, dtype=np.float32).tolist() for key, blob in rows}
+            found.update(vectors)
+            with self._lock:
+                for key, vector in vectors.items():
+                    self._remember(key, vector)
+        return found, len(rows)
+
+    def _store(self, vectors: dict):
+        with self._lock:
+            for key, vector in vectors.items():
+                self._remember(key, vector)
+            self._writes_since_eviction += len(vectors)
+            # Trim the disk store in bulk rather than on every write
+            evict = self._writes_since_eviction >= max(self.max_rows // 100, 1)
+            if evict:
+                self._writes_since_eviction = 0
+
+        now = time.time()
+        try:
+            db = self._connection()
+            db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in vectors.items()],
+            )
+            if evict:
+                self._evict(db)
+            db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache could not write {len(vectors)} entries to disk: {e}")
+            self._rollback()
+
+    def _rollback(self):
+        try:
+            self._connection().rollback()
+        except sqlite3.Error:
+            pass
+
+    def _remember(self, key: str, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict(self, db: sqlite3.Connection):
+        (rows,) = db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = rows - self.max_rows
+        if excess > 0:
+            db.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+                (excess,),
+            )
+            logger.info(f"Evicted {excess} least recently used entries from the embedding cache")
@@ -0,0 +1,40 @@
+import numpy as np
+from bson.binary import Binary, BinaryVectorDtype, VECTOR_SUBTYPE
+
+STORAGE_FORMATS = ("float32", "list")
+# BSON vectors start with a dtype byte and a padding byte before the packed values
+_VECTOR_HEADER = BinaryVectorDtype.FLOAT32.value + b"\x00"
+
+
+def encode_embedding(vector, storage_format: str = "float32"):
+    """
+    Encodes an embedding for the chunk collection. "float32" packs it into a BSON
+    float32 vector (Binary subtype 9, 4 bytes per dimension); "list" keeps the legacy
+    array of doubles.
+    """
+    if storage_format == "list":
+        return np.asarray(vector, dtype=np.float64).tolist()
+    if storage_format != "float32":
+        raise ValueError(f"Unknown embedding storage format: '{storage_format}'")
+    return Binary(_VECTOR_HEADER + np.asarray(vector, dtype="<f4").tobytes(), subtype=VECTOR_SUBTYPE)
+
+
+def decode_embedding(value) -> np.ndarray:
+    """
+    Decodes a stored embedding in any supported format into a float32 array.
+    Packed vectors are viewed in place with np.frombuffer, without copying.
+    """
+    if isinstance(value, (bytes, bytearray)):
+        if isinstance(value, Binary) and value.subtype == VECTOR_SUBTYPE:
+            if value[:1] != BinaryVectorDtype.FLOAT32.value:
+                raise ValueError("Only float32 BSON vectors are supported for stored embeddings")
+            return np.frombuffer(value, dtype="<f4", offset=len(_VECTOR_HEADER))
+        return np.frombuffer(value, dtype="<f4")
+    return np.asarray(value, dtype=np.float32)
+
+
+def decode_embeddings(values) -> np.ndarray:
+    """Decodes a sequence of stored embeddings into one contiguous float32 matrix."""
+    if not values:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.vstack([decode_embedding(value) for value in values]).astype(np.float32, copy=False)
@@ -0,0 +1,222 @@
+import os
+import queue
+import secrets
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from loguru import logger
+from app.core.config import settings
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+def load_local_model() -> Embeddings:
+    """Loads the sentence-transformers model into this process."""
+    # Imported here: langchain_huggingface pulls in the transformers stack
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    # This will download the model on the first run and cache it.
+    logger.info("Initializing local sentence-transformer model. This may take a moment on the first run...")
+    return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+
+
+def _authkey() -> bytes:
+    return settings.EMBEDDING_SERVER_AUTHKEY.encode() if settings.EMBEDDING_SERVER_AUTHKEY else None
+
+
+def key_path(address: str) -> str:
+    """Where the server keeps a generated authkey when EMBEDDING_SERVER_AUTHKEY is not set."""
+    return f"{address}.key"
+
+
+def generated_authkey(address: str) -> bytes:
+    """
+    Returns the authkey stored next to the socket, generating it on first use. The file
+    is created readable by the owner only, and kept across server restarts so connected
+    workers need not pick up a new key.
+    """
+    path = key_path(address)
+    if not os.path.exists(path):
+        # A temp file renamed into place, so a worker never reads a half-written key
+        temp_path = f"{path}.{os.getpid()}"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(secrets.token_bytes(32))
+        os.replace(temp_path, path)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class EmbeddingServer:
+    """
+    Serves one copy of the embedding model to every API worker on the machine over a
+    Unix socket. Each connection is handled on its own thread; a single model thread
+    drains whatever requests are pending from all connections into one forward pass
+    (up to `max_batch_size` texts), so workers share batches as well as memory.
+
+    Protocol (multiprocessing.connection): the client sends a list of texts; the
+    server replies ("ok", shape) followed by the float32 matrix as raw bytes, or
+    ("error", message). Clients always authenticate: without a configured authkey the
+    server generates one into an owner-only file next to the socket.
+    """
+    def __init__(self, model: Embeddings, address: str, authkey: bytes = None, max_batch_size: int = 128):
+        self.model = model
+        self.address = address
+        self.authkey = authkey
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+        self.items = 0
+        self._requests = queue.Queue()
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        threading.Thread(target=self._run_model, name="embedding-model", daemon=True).start()
+        authkey = self.authkey or generated_authkey(self.address)
+        # The socket is created owner-only, so no other user can connect between bind and chmod
+        previous_umask = os.umask(0o177)
+        try:
+            listener = Listener(self.address, family="AF_UNIX", authkey=authkey)
+        finally:
+            os.umask(previous_umask)
+        with listener:
+            logger.success(f"Embedding server listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    logger.warning(f"Rejected embedding client connection: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            try:
+                while True:
+                    future = Future()
+                    self._requests.put((conn.recv(), future))
+                    try:
+                        vectors = future.result()
+                    except Exception as e:
+                        conn.send(("error", str(e)))
+                        continue
+                    conn.send(("ok", vectors.shape))
+                    conn.send_bytes(vectors.tobytes())
+            except (EOFError, OSError):
+                # The worker closed its connection
+                return
+
+    def _run_model(self):
+        while True:
+            batch = [self._requests.get()]
+            size = len(batch[0][0])
+            while size < self.max_batch_size:
+                try:
+                    item = self._requests.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            texts = [text for request_texts, _ in batch for text in request_texts]
+            try:
+                # all-MiniLM-L6-v2 is symmetric, so queries go through the document path too
+                vectors = np.asarray(self.model.embed_documents(texts), dtype=np.float32).reshape(len(texts), -1)
+            except Exception as e:
+                logger.error(f"Embedding {len(texts)} texts failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(texts)
+            start = 0
+            for request_texts, future in batch:
+                future.set_result(vectors[start:start + len(request_texts)])
+                start += len(request_texts)
+
+
+class RemoteEmbeddings(Embeddings):
+    """
+    Embeddings computed by the shared EmbeddingServer. Each thread keeps its own
+    connection; a dropped connection (e.g. the server restarted) is reopened and the
+    request retried once. Connecting waits up to `connect_timeout` seconds for the
+    server to come up, so workers can start before it has loaded the model. Without an
+    `authkey`, the key the server generated is read from the file next to the socket.
+    """
+    def __init__(self, address: str, authkey: bytes = None, connect_timeout: float = 60.0):
+        self.address = address
+        self.authkey = authkey
+        self.connect_timeout = connect_timeout
+        self._local = threading.local()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        return self._request(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._request([text])[0].tolist()
+
+    def _request(self, texts: list[str]) -> np.ndarray:
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.send(texts)
+                status, payload = conn.recv()
+                if status != "ok":
+                    raise RuntimeError(f"Embedding server error: {payload}")
+                return np.frombuffer(conn.recv_bytes(), dtype=np.float32).reshape(payload)
+            except (EOFError, OSError):
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _connect(self):
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                authkey = self.authkey
+                if authkey is None:
+                    with open(key_path(self.address), "rb") as f:
+                        authkey = f.read()
+                return Client(self.address, family="AF_UNIX", authkey=authkey)
+            except (FileNotFoundError, ConnectionRefusedError, AuthenticationError):
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.2)
+
+
+def get_remote_embeddings() -> RemoteEmbeddings:
+    return RemoteEmbeddings(
+        settings.EMBEDDING_SERVER_ADDRESS,
+        authkey=_authkey(),
+        connect_timeout=settings.EMBEDDING_SERVER_CONNECT_TIMEOUT,
+    )
+
+
+if __name__ == "__main__":
+    # python -m app.services.embedding_server
+    from app.core.logger import setup_logging
+
+    setup_logging()
+    if not settings.EMBEDDING_SERVER_ADDRESS:
+        raise SystemExit("Set EMBEDDING_SERVER_ADDRESS to the Unix socket path to listen on.")
+    server = EmbeddingServer(
+        load_local_model(),
+        settings.EMBEDDING_SERVER_ADDRESS,
+        authkey=_authkey(),
+        max_batch_size=settings.EMBEDDING_SERVER_MAX_BATCH_SIZE,
+    )
+    server.serve_forever()
@@ -0,0 +1,536 @@
+import asyncio
+import os
+import threading
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from langchain.docstore.document import Document
+from pymongo import ASCENDING
+from fastapi.concurrency import run_in_threadpool
+from pymongo.errors import DuplicateKeyError
+from app.core.config import settings
+from app.core.metrics import current_request_id, format_stages, request_context, stage_timings
+from app.services.pdf_loader import PDFLoader
+from app.services.vector_store import POSITION_FIELDS, chunk_hash, vector_store
+from loguru import logger
+
+STAGES = ("parse", "split", "embed", "store")
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class DocumentBusyError(Exception):
+    """Raised when a job is queued for a document that already has one queued or running."""
+
+
+class DuplicateUploadError(Exception):
+    """
+    Raised when a user uploads a file identical to one of theirs still being ingested.
+    `job` is that job, or None if it finished in the meantime.
+    """
+    def __init__(self, message: str, job: dict = None):
+        super().__init__(message)
+        self.job = job
+
+
+class JobStore:
+    """
+    Persists ingestion job state in MongoDB so any API process can report on a job,
+    regardless of which worker is running it. Request handlers use the async variants.
+    Queued and running jobs are flagged `active`; a unique index over the flagged jobs
+    lets at most one of them exist per document, across all workers, and another lets a
+    user have at most one new-document job per file content. The worker holding
+    a job keeps its `updated_at` fresh, so jobs orphaned by a crash can be told apart.
+    """
+    def __init__(self, db, async_db=None):
+        self.collection = db.get_collection("ingestion_jobs")
+        self.async_collection = async_db.get_collection("ingestion_jobs") if async_db is not None else None
+
+    def ensure_indexes(self):
+        self.collection.create_index([("job_id", ASCENDING)], unique=True)
+        self.collection.create_index(
+            [("document_id", ASCENDING)], unique=True,
+            partialFilterExpression={"active": True}, name="one_active_job_per_document",
+        )
+        # Claims a file's content hash for the user when the job is created, so concurrent
+        # identical uploads (e.g. a double-clicked submit) are ingested once
+        self.collection.create_index(
+            [("user_id", ASCENDING), ("content_hash", ASCENDING)], unique=True,
+            partialFilterExpression={"active": True, "operation": "create", "content_hash": {"$type": "string"}},
+            name="one_active_upload_per_file",
+        )
+        self.collection.create_index([("status", ASCENDING), ("updated_at", ASCENDING)])
+
+    def create(self, user_id: str, document_id: str, filename: str, content_hash: str = None, operation: str = "create", file_path: str = None) -> dict:
+        job = self._new_job(user_id, document_id, filename, content_hash, operation, file_path)
+        self.collection.insert_one(job.copy())
+        return job
+
+    async def acreate(self, user_id: str, document_id: str, filename: str, content_hash: str = None, operation: str = "create", file_path: str = None) -> dict:
+        """
+        Async variant of create. Raises DocumentBusyError if the document already has an
+        active job, and DuplicateUploadError if the user already has an active job creating
+        a document from the same file.
+        """
+        job = self._new_job(user_id, document_id, filename, content_hash, operation, file_path)
+        try:
+            await self.async_collection.insert_one(job.copy())
+        except DuplicateKeyError:
+            if operation != "create":
+                raise DocumentBusyError(f"Document {document_id} already has a job queued or running.")
+            # New documents get a fresh id, so only the content hash can collide
+            existing = await self.async_collection.find_one(
+                {"user_id": user_id, "content_hash": content_hash, "operation": "create", "active": True}, {"_id": 0}
+            )
+            raise DuplicateUploadError("An identical file is already being processed.", job=existing)
+        return job
+
+    @staticmethod
+    def _new_job(user_id: str, document_id: str, filename: str, content_hash: str = None, operation: str = "create", file_path: str = None) -> dict:
+        now = datetime.now(timezone.utc)
+        return {
+            "job_id": str(uuid.uuid4()),
+            # The upload request that created the job, so its logs can be traced into the worker
+            "request_id": current_request_id(),
+            "user_id": user_id,
+            "document_id": document_id,
+            "filename": filename,
+            "content_hash": content_hash,
+            # "create" for a new document, "update" for a new version of an existing one
+            "operation": operation,
+            # The spooled upload, removed by whoever finishes or gives up on the job
+            "file_path": file_path,
+            "status": "queued",
+            # Cleared when the job finishes; see ensure_indexes
+            "active": True,
+            "stages": {stage: {"status": "pending", "progress": 0.0} for stage in STAGES},
+            "chunk_count": None,
+            "reused_chunks": 0,
+            "removed_chunks": 0,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+    def get(self, job_id: str):
+        return self.collection.find_one({"job_id": job_id}, {"_id": 0})
+
+    async def aget(self, job_id: str):
+        return await self.async_collection.find_one({"job_id": job_id}, {"_id": 0})
+
+    def update(self, job_id: str, **fields):
+        fields["updated_at"] = datetime.now(timezone.utc)
+        change = {"$set": fields}
+        if fields.get("status") in TERMINAL_STATUSES:
+            # Releases the document for its next job
+            change["$unset"] = {"active": ""}
+        self.collection.update_one({"job_id": job_id}, change)
+
+    def update_progress(self, job_id: str, progress: dict):
+        """
+        Records the fraction completed of the given stages. Stages advance in pipeline
+        order: a stage is only marked running (or completed) once every stage before it
+        in `progress` has completed, so the first running stage is where the job is.
+        """
+        fields = {}
+        blocked = False
+        for stage in STAGES:
+            if stage not in progress:
+                continue
+            fraction = progress[stage]
+            fields[f"stages.{stage}.progress"] = round(fraction, 4)
+            if not blocked:
+                fields[f"stages.{stage}.status"] = "completed" if fraction >= 1 else "running"
+                blocked = fraction < 1
+        self.update(job_id, **fields)
+
+    def has_active_job(self, document_id: str) -> bool:
+        return self.collection.find_one({"document_id": document_id, "active": True}, {"_id": 1}) is not None
+
+    def heartbeat(self, job_ids: list[str]):
+        """Refreshes `updated_at` of jobs this process is holding, queued ones included."""
+        if job_ids:
+            self.collection.update_many(
+                {"job_id": {"$in": job_ids}, "status": {"$nin": list(TERMINAL_STATUSES)}},
+                {"$set": {"updated_at": datetime.now(timezone.utc)}},
+            )
+
+    def fail_stale(self, stale_seconds: float) -> list[dict]:
+        """
+        Marks queued or running jobs that no worker has touched for `stale_seconds` as
+        failed. Returns the jobs that were marked.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=stale_seconds)
+        query = {"status": {"$nin": list(TERMINAL_STATUSES)}, "updated_at": {"$lt": cutoff}}
+        failed = []
+        for job in self.collection.find(query, {"_id": 0, "job_id": 1, "document_id": 1, "file_path": 1}):
+            # The same filter again, so a job touched since it was read is left alone
+            result = self.collection.update_one(
+                {**query, "job_id": job["job_id"]},
+                {
+                    "$set": {
+                        "status": "failed",
+                        "error": "The worker processing this job stopped before it finished.",
+                        "updated_at": datetime.now(timezone.utc),
+                    },
+                    "$unset": {"active": ""},
+                },
+            )
+            if result.modified_count:
+                failed.append(job)
+        return failed
+
+
+class IngestionPipeline:
+    """
+    Runs parse -> split -> embed -> store for uploaded PDFs on a worker pool,
+    so uploads never block the event loop that serves chat requests.
+    """
+    def __init__(self, max_workers: int):
+        self.pdf_loader = PDFLoader(
+            profile=settings.CHUNKING_PROFILE,
+            engine=settings.PDF_ENGINE,
+            workers=settings.PDF_PARSE_WORKERS,
+            shard_pages=settings.PDF_SHARD_PAGES,
+        )
+        self.jobs = JobStore(vector_store.db, vector_store.async_db)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingestion")
+        # Futures of this process's queued and running jobs, by job_id
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+        logger.info(f"Ingestion pipeline started with {max_workers} workers.")
+
+    def submit(self, user_id: str, filename: str, file_path: str, content_hash: str = None) -> dict:
+        """
+        Queues a PDF that has already been spooled to `file_path`. The worker owns the
+        file from here on and removes it when the job finishes.
+        """
+        document_id = str(uuid.uuid4())
+        job = self.jobs.create(
+            user_id=user_id, document_id=document_id, filename=filename, content_hash=content_hash, file_path=file_path
+        )
+        self._submit(job, file_path)
+        logger.info(f"Queued ingestion job {job['job_id']} for document {document_id}")
+        return job
+
+    async def asubmit(self, user_id: str, filename: str, file_path: str, content_hash: str = None, document_id: str = None) -> dict:
+        """
+        Async variant of submit for request handlers; the job record is written without
+        blocking the event loop. Passing the `document_id` of one of the user's documents
+        queues the file as a new version of that document instead; raises DocumentBusyError
+        (leaving the file to the caller) while that document has another job queued or running,
+        and DuplicateUploadError (likewise) while the user's identical file is being ingested.
+        """
+        operation = "update" if document_id else "create"
+        document_id = document_id or str(uuid.uuid4())
+        job = await self.jobs.acreate(
+            user_id=user_id, document_id=document_id, filename=filename, content_hash=content_hash,
+            operation=operation, file_path=file_path,
+        )
+        self._submit(job, file_path)
+        logger.info(f"Queued ingestion job {job['job_id']} ({operation}) for document {document_id}")
+        return job
+
+    def _submit(self, job: dict, file_path: str):
+        with self._in_flight_lock:
+            self._in_flight[job["job_id"]] = (self.executor.submit(self._run, job, file_path), file_path)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        # Jobs that never started are failed now; running ones are left to the stale check
+        with self._in_flight_lock:
+            cancelled = [(job_id, file_path) for job_id, (future, file_path) in self._in_flight.items() if future.cancelled()]
+        for job_id, file_path in cancelled:
+            self.jobs.update(job_id, status="failed", error="The server shut down before the job started.")
+            self._remove_file(file_path)
+        self.pdf_loader.shutdown()
+
+    async def run_maintenance(self):
+        """
+        Every JOB_HEARTBEAT_SECONDS (starting at once, on startup): refreshes the jobs this
+        process holds and fails jobs orphaned by a worker that crashed or was stopped,
+        removing their spooled files.
+        """
+        while True:
+            try:
+                await run_in_threadpool(self.check_jobs)
+            except Exception as e:
+                logger.error(f"Ingestion job maintenance failed: {e}")
+            await asyncio.sleep(settings.JOB_HEARTBEAT_SECONDS)
+
+    def check_jobs(self) -> int:
+        """Heartbeats this process's jobs and fails stale ones. Returns the number failed."""
+        with self._in_flight_lock:
+            job_ids = list(self._in_flight)
+        self.jobs.heartbeat(job_ids)
+        stale = self.jobs.fail_stale(settings.JOB_STALE_SECONDS)
+        for job in stale:
+            logger.warning(f"Ingestion job {job['job_id']} for document {job['document_id']} went stale, marked failed")
+            # Only found if the job was spooled on this machine
+            self._remove_file(job.get("file_path"))
+        return len(stale)
+
+    @staticmethod
+    def _remove_file(file_path: str):
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+            logger.info(f"Cleaned up temporary file: {file_path}")
+
+    def _run(self, job: dict, file_path: str):
+        # Worker threads do not inherit the upload request's context; rebind its id
+        try:
+            with request_context(job.get("request_id")):
+                self._ingest(job, file_path)
+                logger.info(f"Ingestion job {job['job_id']} stage timings: {format_stages(stage_timings())}")
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.pop(job["job_id"], None)
+
+    def _ingest(self, job: dict, file_path: str):
+        """
+        Ingests one uploaded PDF. If another user already uploaded a byte-identical file,
+        its chunks and embeddings are copied instead of parsing and embedding again.
+        A new version of an existing document is diffed against the stored chunks.
+        """
+        job_id = job["job_id"]
+        user_id, document_id = job["user_id"], job["document_id"]
+        updating = job.get("operation") == "update"
+        job["current_stage"] = None
+        # Chunks written by an update, removed again if it fails
+        job["inserted_chunk_ids"] = []
+        # Position metadata of kept chunks before an update moved them, put back if it fails
+        job["previous_positions"] = {}
+        try:
+            self.jobs.update(job_id, status="running")
+
+            removed = 0
+            if updating:
+                chunk_ids, reused, removed = self._update_pdf(job, file_path)
+            else:
+                source = None
+                if job.get("content_hash"):
+                    source = vector_store.catalog.find_by_hash(job["content_hash"])
+                if source:
+                    chunk_ids, reused = self._copy_document(job, source, file_path)
+                else:
+                    chunk_ids, reused = self._ingest_pdf(job, file_path)
+
+            if not chunk_ids:
+                raise ValueError("No text could be extracted from the PDF.")
+
+            job["current_stage"] = "store"
+            # The indexes are built from the stored chunks rather than from copies kept while
+            # streaming: the embeddings are read into one matrix and the texts streamed
+            vectors = vector_store.load_vectors(chunk_ids)
+            texts = vector_store.iter_chunk_texts(chunk_ids)
+            record = {
+                "user_id": user_id,
+                "document_id": document_id,
+                "filename": job["filename"],
+                "chunk_count": len(chunk_ids),
+                "content_hash": job.get("content_hash"),
+            }
+            if updating:
+                # Set first: a rebuild that fails halfway may already have saved one of the indexes
+                job["index_replaced"] = True
+                vector_store.rebuild_index(document_id, ids=chunk_ids, vectors=vectors, texts=texts)
+                # Only after the new index is in place, so queries never miss a kept chunk
+                vector_store.tombstone_chunks(job["removed_chunk_ids"])
+                # The catalog goes last, so a failed update leaves it describing the live version.
+                # An update must not bring back a document deleted while the job was running.
+                if not vector_store.catalog.register(**record, upsert=False):
+                    raise ValueError("The document was deleted before the update finished.")
+            else:
+                vector_store.extend_index(document_id, ids=chunk_ids, vectors=vectors, texts=texts)
+                vector_store.catalog.register(**record)
+
+            self.jobs.update(
+                job_id,
+                status="completed",
+                chunk_count=len(chunk_ids),
+                reused_chunks=reused,
+                removed_chunks=removed,
+                stages={stage_name: {"status": "completed", "progress": 1.0} for stage_name in STAGES},
+            )
+            logger.success(
+                f"Ingestion job {job_id} stored document {document_id} "
+                f"({len(chunk_ids)} chunks, {reused} reused, {removed} removed)"
+            )
+        except Exception as e:
+            stage = job["current_stage"]
+            logger.error(f"Ingestion job {job_id} failed during '{stage}': {e}")
+            if stage:
+                self.jobs.update(job_id, **{f"stages.{stage}.status": "failed"})
+            self.jobs.update(job_id, status="failed", error=str(e))
+            if updating:
+                self._rollback_update(job)
+            else:
+                vector_store.delete_document_chunks(user_id, document_id)
+        finally:
+            self._remove_file(file_path)
+
+    def _rollback_update(self, job: dict):
+        """
+        Puts the previous version of a document back after a failed update: this job's
+        new chunks are dropped, kept chunks that moved get their old positions back and,
+        if the indexes were already replaced, the chunks the update retired are revived
+        and the indexes dropped, to be rebuilt from the live chunks on next use.
+        """
+        user_id, document_id = job["user_id"], job["document_id"]
+        try:
+            vector_store.delete_chunks(job["inserted_chunk_ids"])
+            vector_store.update_chunk_positions(job["previous_positions"])
+            if job.get("index_replaced"):
+                # A document deleted in the meantime stays deleted
+                if vector_store.catalog.get(user_id, document_id):
+                    vector_store.restore_chunks(job["removed_chunk_ids"])
+                vector_store.drop_indexes(document_id)
+        except Exception as e:
+            logger.error(f"Could not roll back the update of document {document_id}: {e}")
+
+    def _ingest_pdf(self, job: dict, file_path: str):
+        """
+        Streams the PDF through the pipeline: pages are parsed and split lazily and fed
+        into embedding and insert_many in EMBEDDING_BATCH_SIZE batches, so peak memory
+        is bounded by the batch size. Chunks whose text was embedded before reuse the
+        stored embedding. Returns the chunk ids and reuse count; the vector and BM25
+        indexes are built from the stored chunks once at the end.
+        """
+        job_id = job["job_id"]
+        job["current_stage"] = "parse"
+        total_pages = max(self.pdf_loader.count_pages(file_path), 1)
+        pages_parsed = 0
+
+        def pages():
+            nonlocal pages_parsed
+            for page in self.pdf_loader.iter_pages(file_path):
+                pages_parsed += 1
+                yield page
+
+        chunk_ids, reused = [], 0
+        batches = self.pdf_loader.iter_batches(
+            self.pdf_loader.iter_chunks(pages()), settings.EMBEDDING_BATCH_SIZE
+        )
+        for batch in batches:
+            job["current_stage"] = "embed"
+            embeddings, batch_reused = vector_store.embed_or_reuse(batch)
+            reused += batch_reused
+
+            job["current_stage"] = "store"
+            chunk_ids.extend(vector_store.insert_chunks(batch, embeddings, user_id=job["user_id"], document_id=job["document_id"]))
+
+            stored = min(batch[-1].metadata.get("page", 0) + 1, total_pages) / total_pages
+            parsed = pages_parsed / total_pages
+            self.jobs.update_progress(job_id, {"parse": parsed, "split": parsed, "embed": stored, "store": stored})
+            job["current_stage"] = "parse"
+        return chunk_ids, reused
+
+    def _update_pdf(self, job: dict, file_path: str):
+        """
+        Streams a new version of a document through parse and split, and diffs its chunks
+        against the stored ones by content hash. Chunks whose text is unchanged keep their
+        record and embedding (only moved ones get their page metadata updated); new text
+        goes through embed_or_reuse and is inserted. Stored chunks left unmatched are
+        returned in job["removed_chunk_ids"] to be tombstoned once the new index is saved.
+        Returns the live chunk ids, the number of chunks not re-embedded and the number removed.
+        """
+        job_id, user_id, document_id = job["job_id"], job["user_id"], job["document_id"]
+        job["current_stage"] = "parse"
+        total_pages = max(self.pdf_loader.count_pages(file_path), 1)
+        pages_parsed = 0
+
+        previous = defaultdict(list)
+        for chunk in vector_store.live_chunks(user_id, document_id):
+            previous[chunk["chunk_hash"]].append(chunk)
+
+        def pages():
+            nonlocal pages_parsed
+            for page in self.pdf_loader.iter_pages(file_path):
+                pages_parsed += 1
+                yield page
+
+        kept_ids, moved = [], {}
+        new_ids, reused = [], 0
+        batches = self.pdf_loader.iter_batches(
+            self.pdf_loader.iter_chunks(pages()), settings.EMBEDDING_BATCH_SIZE
+        )
+        for batch in batches:
+            changed = []
+            for doc in batch:
+                matches = previous.get(chunk_hash(doc.page_content))
+                if not matches:
+                    changed.append(doc)
+                    continue
+                match = matches.pop(0)
+                kept_ids.append(match["_id"])
+                if any(match["metadata"].get(field) != doc.metadata.get(field) for field in POSITION_FIELDS):
+                    moved[match["_id"]] = doc.metadata
+                    job["previous_positions"][match["_id"]] = match["metadata"]
+
+            if changed:
+                job["current_stage"] = "embed"
+                embeddings, batch_reused = vector_store.embed_or_reuse(changed)
+                reused += batch_reused
+
+                job["current_stage"] = "store"
+                ids = vector_store.insert_chunks(changed, embeddings, user_id=user_id, document_id=document_id)
+                job["inserted_chunk_ids"].extend(ids)
+                new_ids.extend(ids)
+
+            stored = min(batch[-1].metadata.get("page", 0) + 1, total_pages) / total_pages
+            parsed = pages_parsed / total_pages
+            self.jobs.update_progress(job_id, {"parse": parsed, "split": parsed, "embed": stored, "store": stored})
+            job["current_stage"] = "parse"
+
+        job["current_stage"] = "store"
+        vector_store.update_chunk_positions(moved)
+        job["removed_chunk_ids"] = [chunk["_id"] for chunks in previous.values() for chunk in chunks]
+        logger.info(
+            f"Update of document {document_id}: {len(kept_ids)} chunks unchanged, {len(new_ids)} new, "
+            f"{len(job['removed_chunk_ids'])} removed"
+        )
+        return kept_ids + new_ids, len(kept_ids) + reused, len(job["removed_chunk_ids"])
+
+    def _copy_document(self, job: dict, source: dict, file_path: str):
+        """
+        Short-circuits an identical file: copies the source document's chunks and
+        embeddings into a new document owned by the uploading user. The source's chunk
+        ids are read up front and checked again at the end; if the source was updated or
+        deleted meanwhile, the partial copy is dropped and the file is ingested normally.
+        """
+        source_user_id, source_id = source["user_id"], source["document_id"]
+        logger.info(f"File for job {job['job_id']} matches document {source_id}, reusing its embeddings")
+        job["current_stage"] = "store"
+        snapshot = vector_store.live_chunk_ids(source_user_id, source_id)
+        chunk_ids = []
+        if self._is_current(source, len(snapshot)):
+            for batch in vector_store.iter_chunks(snapshot, settings.EMBEDDING_BATCH_SIZE):
+                documents = [Document(page_content=chunk["text"], metadata=dict(chunk["metadata"])) for chunk in batch]
+                embeddings = [chunk["embedding"] for chunk in batch]
+                chunk_ids.extend(vector_store.insert_chunks(documents, embeddings, user_id=job["user_id"], document_id=job["document_id"]))
+                self.jobs.update_progress(job["job_id"], {
+                    # Nothing is parsed or embedded for a copy
+                    "parse": 1.0, "split": 1.0, "embed": 1.0,
+                    "store": len(chunk_ids) / max(len(snapshot), 1),
+                })
+            if (
+                len(chunk_ids) == len(snapshot)
+                and vector_store.live_chunk_ids(source_user_id, source_id) == snapshot
+                and self._is_current(source, len(snapshot))
+            ):
+                return chunk_ids, len(chunk_ids)
+        logger.warning(f"Document {source_id} changed while job {job['job_id']} was copying it, ingesting the file instead")
+        vector_store.delete_chunks(chunk_ids)
+        return self._ingest_pdf(job, file_path)
+
+    def _is_current(self, source: dict, chunk_count: int) -> bool:
+        """Whether a copy source is still the version it was found as, with no job changing it."""
+        record = vector_store.catalog.get(source["user_id"], source["document_id"])
+        return (
+            record is not None
+            and record.get("content_hash") == source.get("content_hash")
+            and record["chunk_count"] == chunk_count
+            and not self.jobs.has_active_job(source["document_id"])
+        )
+
+ingestion_pipeline = IngestionPipeline(max_workers=settings.INGESTION_WORKERS)
@@ -0,0 +1,164 @@
+import io
+import math
+import re
+from collections import Counter
+import numpy as np
+from app.services.vector_index import top_k
+
+# Words joined by these separators stay one token (e.g. part numbers like "AB-1234/7"),
+# and their parts are indexed as well.
+TOKEN_PATTERN = re.compile(r"[^\W_]+(?:[-_./:#][^\W_]+)*")
+TOKEN_SEPARATORS = re.compile(r"[-_./:#]")
+MAX_TOKEN_LENGTH = 40
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have if in into is it its of on or "
+    "such that the their then there these they this to was were which will with".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased word tokens for BM25, keeping compound codes intact alongside their parts."""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.casefold()):
+        token = match.group()
+        if len(token) > MAX_TOKEN_LENGTH or token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in TOKEN_SEPARATORS.split(token) if part and part not in STOPWORDS)
+    return tokens
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over one document's chunks. Postings are stored in CSR
+    form: the rows and term frequencies of term i live in rows[offsets[i]:offsets[i+1]].
+    Like the vector indexes, each row maps to a chunk `_id` in the embeddings collection.
+    """
+    kind = "bm25"
+
+    def __init__(self, ids, terms: list[str], offsets, rows, tfs, doc_lengths, k1: float = 1.2, b: float = 0.75):
+        self.ids = np.asarray(ids, dtype=str)
+        self.terms = list(terms)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.rows = np.asarray(rows, dtype=np.int32)
+        self.tfs = np.asarray(tfs, dtype=np.uint16)
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.int32)
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = float(self.doc_lengths.mean()) if len(self.doc_lengths) else 0.0
+        self._term_ids = {term: i for i, term in enumerate(self.terms)}
+
+    def __len__(self):
+        return self.ids.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        vocabulary_bytes = sum(len(term) + 1 for term in self.terms)
+        return (
+            self.ids.nbytes + self.offsets.nbytes + self.rows.nbytes
+            + self.tfs.nbytes + self.doc_lengths.nbytes + vocabulary_bytes
+        )
+
+    @classmethod
+    def build(cls, ids, texts: list[str], k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        posting_terms, posting_rows, posting_tfs, doc_lengths = [], [], [], []
+        for row, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                posting_terms.append(term)
+                posting_rows.append(row)
+                posting_tfs.append(tf)
+        return cls._from_postings(ids, posting_terms, posting_rows, posting_tfs, doc_lengths, k1=k1, b=b)
+
+    @classmethod
+    def _from_postings(cls, ids, posting_terms, posting_rows, posting_tfs, doc_lengths, k1: float, b: float) -> "BM25Index":
+        if len(posting_terms) == 0:
+            return cls(ids, [], [0], [], [], doc_lengths, k1=k1, b=b)
+        terms, term_of_posting = np.unique(np.asarray(posting_terms, dtype=str), return_inverse=True)
+        # Stable sort keeps each term's postings in row order
+        order = np.argsort(term_of_posting, kind="stable")
+        counts = np.bincount(term_of_posting, minlength=len(terms))
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        return cls(
+            ids, terms.tolist(), offsets,
+            np.asarray(posting_rows, dtype=np.int32)[order],
+            np.minimum(np.asarray(posting_tfs), np.iinfo(np.uint16).max)[order],
+            doc_lengths, k1=k1, b=b,
+        )
+
+    def merge(self, other: "BM25Index") -> "BM25Index":
+        """Returns a new index with `other`'s chunks appended after this one's."""
+        postings_per_term = [np.repeat(np.asarray(index.terms, dtype=str), np.diff(index.offsets)) for index in (self, other)]
+        return self._from_postings(
+            np.concatenate([self.ids, other.ids]),
+            np.concatenate(postings_per_term),
+            np.concatenate([self.rows, other.rows + len(self)]),
+            np.concatenate([self.tfs, other.tfs]),
+            np.concatenate([self.doc_lengths, other.doc_lengths]),
+            k1=self.k1, b=self.b,
+        )
+
+    def search(self, query: str, k: int):
+        """Returns (chunk_ids, scores) for the k best matching chunks, best first. Chunks sharing no term are left out."""
+        n = len(self)
+        scores = np.zeros(n, dtype=np.float32)
+        if n == 0:
+            return self.ids[:0], scores
+        length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / max(self.avg_doc_length, 1e-9))
+        for term in set(tokenize(query)):
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                continue
+            start, stop = self.offsets[term_id], self.offsets[term_id + 1]
+            rows, tfs = self.rows[start:stop], self.tfs[start:stop].astype(np.float32)
+            df = stop - start
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + length_norm[rows])
+
+        winners = top_k(scores, k)
+        winners = winners[scores[winners] > 0]
+        return self.ids[winners], scores[winners]
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            kind=np.array(self.kind),
+            ids=self.ids,
+            # The vocabulary is packed as one UTF-8 blob rather than a fixed-width string array
+            vocabulary=np.frombuffer("\n".join(self.terms).encode("utf-8"), dtype=np.uint8),
+            offsets=self.offsets,
+            rows=self.rows,
+            tfs=self.tfs,
+            doc_lengths=self.doc_lengths,
+            params=np.array([self.k1, self.b]),
+        )
+        return buffer.getvalue()
+
+    @staticmethod
+    def from_bytes(data: bytes) -> "BM25Index":
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            kind = str(arrays["kind"])
+            if kind != BM25Index.kind:
+                raise ValueError(f"Unknown lexical index kind: '{kind}'")
+            vocabulary = arrays["vocabulary"].tobytes().decode("utf-8")
+            k1, b = arrays["params"].tolist()
+            return BM25Index(
+                arrays["ids"], vocabulary.split("\n") if vocabulary else [],
+                arrays["offsets"], arrays["rows"], arrays["tfs"], arrays["doc_lengths"],
+                k1=k1, b=b,
+            )
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = 60) -> list[tuple[str, float]]:
+    """
+    Fuses several best-first lists of chunk ids into one, scoring each id by the sum
+    of 1 / (k + rank) over the lists it appears in. Returns (chunk_id, score) pairs, best first.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
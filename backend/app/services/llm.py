@@ -0,0 +1,67 @@
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING
+from langchain_core.callbacks import BaseCallbackHandler
+from app.core.config import settings
+from app.core.metrics import observe_stage
+
+if TYPE_CHECKING:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (about 4 characters per token) that avoids a count_tokens API call."""
+    return len(text) // 4 + 1
+
+class LLMTimingCallback(BaseCallbackHandler):
+    """
+    Records LLM calls as pipeline stages: `<stage>_first_token` (streaming calls only)
+    and `<stage>_total`.
+    """
+    # Called inline rather than on an executor, so timings land in the caller's request context
+    run_inline = True
+
+    def __init__(self, stage: str = "llm"):
+        self.stage = stage
+        self._started = {}
+        self._streaming = set()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        started = self._started.get(run_id)
+        if started is not None and run_id not in self._streaming:
+            self._streaming.add(run_id)
+            observe_stage(f"{self.stage}_first_token", time.perf_counter() - started)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        self._streaming.discard(run_id)
+        if started is not None:
+            observe_stage(f"{self.stage}_total", time.perf_counter() - started)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+        self._streaming.discard(run_id)
+
+
+@lru_cache(maxsize=None)
+def get_chat_model(model: str, temperature: float = None) -> "ChatGoogleGenerativeAI":
+    """
+    Returns a shared Gemini chat client per (model, temperature).
+    Reusing the instance keeps its underlying client and connections alive across
+    requests instead of paying the setup cost on every call.
+    """
+    # Imported on first use: the Gemini SDK is slow to import and not needed to start the API
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    kwargs = {"temperature": temperature} if temperature is not None else {}
+    # Explicitly pass the API key to ensure simple key-based auth is used.
+    return ChatGoogleGenerativeAI(
+        model=model,
+        google_api_key=settings.GOOGLE_API_KEY,
+        **kwargs,
+    )
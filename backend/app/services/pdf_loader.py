@@ -1,46 +1,193 @@
+import hashlib
+import math
+import multiprocessing
 import os
 import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterable, Iterator
+import pymupdf
 from fastapi import UploadFile
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain.docstore.document import Document
+from pypdf import PdfReader
 from loguru import logger
+from app.core.metrics import timed
+from app.services.chunking import Chunker, get_profile, layout_page
+
+# Size of each read when copying an upload to disk
+SPOOL_CHUNK_BYTES = 1024 * 1024
+
+ENGINES = ("pypdf", "pymupdf")
+
+
+def _extract_page_range(engine: str, file_path: str, start: int, stop: int, layout: bool = False) -> list[tuple]:
+    """
+    Extracts the (text, layout blocks or None) of pages [start, stop) in a worker process.
+    Module-level so it can be pickled by the process pool.
+    """
+    if engine == "pymupdf":
+        with pymupdf.open(file_path) as pdf:
+            if layout:
+                return [layout_page(pdf[page_number]) for page_number in range(start, stop)]
+            return [(pdf[page_number].get_text(), None) for page_number in range(start, stop)]
+    reader = PdfReader(file_path)
+    return [(reader.pages[page_number].extract_text(), None) for page_number in range(start, stop)]
+
 
 class PDFLoader:
     """
-    Handles loading, splitting, and processing of PDF files using PyPDFLoader.
+    Handles loading, splitting, and processing of PDF files.
+    Text is extracted with either pypdf or PyMuPDF; with `workers > 1`
+    page ranges are extracted in parallel on a process pool and merged back in page order.
+    Pages and chunks are produced lazily so ingestion memory is bounded by the
+    batch size rather than by the size of the document.
+    Chunks are cut with the named chunking profile; structured profiles get layout
+    blocks (headings, tables) from PyMuPDF, and guess them from the text with pypdf.
     """
-    def __init__(self, chunk_size=1000, chunk_overlap=100):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap
-        )
-        logger.info("PDFLoader initialized with PyPDFLoader.")
+    def __init__(self, profile: str = "legacy", engine: str = "pypdf", workers: int = 1, shard_pages: int = 32):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown PDF engine '{engine}'. Expected one of {ENGINES}.")
+        self.profile = get_profile(profile)
+        self.chunker = Chunker(self.profile)
+        self.engine = engine
+        # Layout analysis costs parse time, so it only runs when the profile uses it
+        self.layout = self.profile.structured and engine == "pymupdf"
+        self.workers = workers
+        self.shard_pages = shard_pages
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        logger.info(f"PDFLoader initialized with engine '{engine}', chunking profile '{profile}' and {workers} parse worker(s).")
+
+    @staticmethod
+    def spool_to_disk(source: BinaryIO) -> tuple[str, str]:
+        """
+        Copies an uploaded file to a temp file in fixed-size reads.
+        Returns the temp file path and the SHA-256 of the content, computed on the way.
+        The caller is responsible for removing the file.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
+            while block := source.read(SPOOL_CHUNK_BYTES):
+                digest.update(block)
+                temp_file.write(block)
+                size += len(block)
+            temp_file_path = temp_file.name
+        if size == 0:
+            os.remove(temp_file_path)
+            raise ValueError("Uploaded file is empty or could not be read.")
+        return temp_file_path, digest.hexdigest()
 
     def load_and_split_documents(self, file: UploadFile):
+        temp_file_path = None
         try:
-            # Ensure the file is read correctly
-            content = file.file.read()
-            if not content:
-                raise ValueError("Uploaded file is empty or could not be read.")
-    
-            # Save the file temporarily
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
-                temp_file.write(content)
-                temp_file_path = temp_file.name
-    
+            temp_file_path, _ = self.spool_to_disk(file.file)
             logger.info(f"Temporarily saved PDF to {temp_file_path}")
-    
+
             # Process the file
-            loader = PyPDFLoader(temp_file_path)
-            documents = loader.load_and_split(text_splitter=self.text_splitter)
-    
+            documents = list(self.iter_chunks(self.iter_pages(temp_file_path)))
+
             logger.success(f"Successfully loaded and split PDF into {len(documents)} chunks.")
             return documents
-    
+
         except Exception as e:
             logger.error(f"Failed to load or split PDF: {e}")
             raise
         finally:
             if temp_file_path and os.path.exists(temp_file_path):
                 os.remove(temp_file_path)
-                logger.info(f"Cleaned up temporary file: {temp_file_path}")
\ No newline at end of file
+                logger.info(f"Cleaned up temporary file: {temp_file_path}")
+
+    def count_pages(self, file_path: str) -> int:
+        if self.engine == "pymupdf":
+            with pymupdf.open(file_path) as pdf:
+                return pdf.page_count
+        return len(PdfReader(file_path).pages)
+
+    def iter_pages(self, file_path: str) -> Iterator[Document]:
+        """Parses a PDF on disk lazily, yielding one Document per page in page order."""
+        pages = self._iter_pages(file_path)
+        try:
+            while True:
+                # Only the time spent producing each page counts, not the consumer's work between pages
+                with timed("pdf_parse"):
+                    page = next(pages, None)
+                if page is None:
+                    return
+                yield page
+        finally:
+            pages.close()
+
+    def _iter_pages(self, file_path: str) -> Iterator[Document]:
+        if self.workers > 1:
+            yield from self._iter_pages_parallel(file_path)
+        elif self.engine == "pymupdf":
+            with pymupdf.open(file_path) as pdf:
+                for page in pdf:
+                    text, blocks = layout_page(page) if self.layout else (page.get_text(), None)
+                    yield self._page_document(file_path, page.number, text, pdf.page_count, blocks)
+        else:
+            reader = PdfReader(file_path)
+            for page_number, page in enumerate(reader.pages):
+                yield self._page_document(file_path, page_number, page.extract_text(), len(reader.pages))
+
+    def _iter_pages_parallel(self, file_path: str) -> Iterator[Document]:
+        total_pages = self.count_pages(file_path)
+        shard_count = math.ceil(total_pages / self.shard_pages)
+        starts = [shard * self.shard_pages for shard in range(shard_count)]
+        stops = [min(start + self.shard_pages, total_pages) for start in starts]
+        # map() yields shard results in submission order, so pages come back in order
+        shards = self._get_pool().map(
+            _extract_page_range,
+            [self.engine] * shard_count, [file_path] * shard_count, starts, stops, [self.layout] * shard_count,
+        )
+        for start, pages in zip(starts, shards):
+            for offset, (text, blocks) in enumerate(pages):
+                yield self._page_document(file_path, start + offset, text, total_pages, blocks)
+
+    @staticmethod
+    def _page_document(file_path: str, page_number: int, text: str, total_pages: int, blocks: list = None) -> Document:
+        # Every engine and parse path builds its pages here, so stored chunk metadata has one schema
+        metadata = {"source": file_path, "page": page_number, "total_pages": total_pages}
+        if blocks is not None:
+            # [kind, start, end] layout blocks, consumed by the chunker and not stored
+            metadata["blocks"] = blocks
+        return Document(page_content=text, metadata=metadata)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # Spawned rather than forked: the API process runs threads that must not be forked mid-operation
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def iter_chunks(self, pages: Iterable[Document]) -> Iterator[Document]:
+        """
+        Splits pages one at a time, yielding chunks as soon as each page is split.
+        The current section heading carries over from one page to the next.
+        """
+        section = None
+        for page in pages:
+            with timed("split"):
+                chunks, section = self.chunker.split_page(page, section)
+            yield from chunks
+
+    @staticmethod
+    def iter_batches(chunks: Iterable[Document], batch_size: int) -> Iterator[list[Document]]:
+        """Groups a chunk stream into lists of at most `batch_size` chunks."""
+        batch = []
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
@@ -1,19 +1,25 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
+import inspect
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnablePassthrough, RunnableLambda
 from langchain_core.output_parsers import StrOutputParser
-from app.core.config import settings  # Import the settings
+from app.services.context_packer import ContextPacker
+from app.services.llm import LLMTimingCallback, estimate_tokens, get_chat_model
+from loguru import logger
 
 class RAGPipeline:
     """
     Manages the Retrieval-Augmented Generation pipeline using LangChain.
+
+    The chain is built once. `retriever` is an async function
+    `(question, user_id, document_id=None, document_ids=None, query_embedding=None) -> docs`,
+    and each invocation passes {"question", "user_id", "document_id"} (or "document_ids"
+    to search several documents, and optionally the question's "query_embedding") as runtime input, so nothing is rebuilt per request. Retrieved chunks go through `packer` before being
+    formatted into the prompt; without one they are used as retrieved.
     """
-    def __init__(self):
-        # Explicitly pass the API key to ensure simple key-based auth is used.
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            google_api_key=settings.GOOGLE_API_KEY
-        )
+    def __init__(self, retriever=None, llm=None, packer: ContextPacker = None):
+        self.llm = llm or get_chat_model("gemini-1.5-flash")
+        self.retriever = retriever
+        self.packer = packer
 
         self.template = """
         You are a helpful assistant that answers questions based on the following context.
@@ -23,31 +29,67 @@ class RAGPipeline:
         """
         self.prompt = ChatPromptTemplate.from_template(self.template)
         self.output_parser = StrOutputParser()
+        # Prompt -> LLM -> text, shared by the full chain and the streaming path
+        self.answer_chain = (
+            self.prompt
+            | self.llm.with_config(callbacks=[LLMTimingCallback("llm")])
+            | self.output_parser
+        )
+        self.chain = (
+            RunnablePassthrough.assign(context=RunnableLambda(self._get_context))
+            | self.answer_chain
+        )
+
+    async def _get_context(self, inputs: dict) -> str:
+        docs = await self.retriever(
+            inputs["question"], user_id=inputs["user_id"], query_embedding=inputs.get("query_embedding"), **self.scope(inputs)
+        )
+        return self.format_docs(docs)
+
+    @staticmethod
+    def scope(inputs: dict) -> dict:
+        """Retriever keyword arguments for the documents an invocation covers."""
+        if inputs.get("document_ids") is not None:
+            return {"document_ids": inputs["document_ids"]}
+        return {"document_id": inputs["document_id"]}
+
+    def format_docs(self, docs):
+        """Format retrieved documents into a single context string."""
+        if not docs:
+            return "No relevant context found."
+
+        if self.packer is not None:
+            retrieved_tokens = sum(estimate_tokens(doc.page_content) for doc in docs)
+            docs = self.packer.pack(docs)
+            packed_tokens = sum(estimate_tokens(doc.page_content) for doc in docs)
+            logger.debug(f"Packed {retrieved_tokens} retrieved context tokens into {packed_tokens} ({len(docs)} passages)")
+
+        formatted_context = []
+        for i, doc in enumerate(docs, 1):
+            # Include similarity score if available for debugging
+            score_info = ""
+            if hasattr(doc, 'metadata') and 'similarity_score' in doc.metadata:
+                score_info = f" (similarity: {doc.metadata['similarity_score']:.3f})"
+            
+            formatted_context.append(f"Document {i}{score_info}:\n{doc.page_content}")
+        
+        return "\n\n".join(formatted_context)
 
     def get_chain(self, retriever):
         """
-        Builds and returns the RAG chain.
+        Builds and returns a RAG chain bound to a single retriever.
+        `retriever` may be a plain function or an async function of the question.
+        Request handlers should use the prebuilt `self.chain` instead.
         """
-        def format_docs(docs):
-            """Format retrieved documents into a single context string."""
-            if not docs:
-                return "No relevant context found."
-            
-            formatted_context = []
-            for i, doc in enumerate(docs, 1):
-                # Include similarity score if available for debugging
-                score_info = ""
-                if hasattr(doc, 'metadata') and 'similarity_score' in doc.metadata:
-                    score_info = f" (similarity: {doc.metadata['similarity_score']:.3f})"
-                
-                formatted_context.append(f"Document {i}{score_info}:\n{doc.page_content}")
-            
-            return "\n\n".join(formatted_context)
-        
         # Create a simple function that handles the retrieval and formatting
-        def get_context(question):
-            docs = retriever(question)
-            return format_docs(docs)
+        if inspect.iscoroutinefunction(retriever):
+            async def get_context(question):
+                docs = await retriever(question)
+                return self.format_docs(docs)
+        else:
+            def get_context(question):
+                docs = retriever(question)
+                return self.format_docs(docs)
         
         # Build the chain using RunnableLambda for the context retrieval
         chain = (
@@ -55,9 +97,16 @@ class RAGPipeline:
                 "context": RunnableLambda(get_context),
                 "question": RunnablePassthrough()
             }
-            | self.prompt
-            | self.llm
-            | self.output_parser
+            | self.answer_chain
         )
         return chain
 
+    async def astream_answer(self, question: str, docs):
+        """
+        Streams the answer for already retrieved documents, yielding text as the LLM produces it.
+        """
+        async for token in self.answer_chain.astream(
+            {"context": self.format_docs(docs), "question": question}
+        ):
+            if token:
+                yield token
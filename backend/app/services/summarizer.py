@@ -1,13 +1,254 @@
+import asyncio
 import logging
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
 from typing import List
-from langchain.chains.summarize import load_summarize_chain
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
 from langchain.docstore.document import Document
-from langchain_google_genai import ChatGoogleGenerativeAI
-from ..core.config import settings
+from pymongo import ASCENDING
+from app.core.config import settings
+from app.services.vector_store import chunk_hash, vector_store
+from .llm import LLMTimingCallback, estimate_tokens, get_chat_model
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Bump when the prompts change so cached chunk summaries are not reused across versions
+PROMPT_VERSION = 1
+
+MAP_PROMPT = PromptTemplate.from_template(
+    "Write a concise summary of the following:\n\n\"{text}\"\n\nCONCISE SUMMARY:"
+)
+COMBINE_PROMPT = PromptTemplate.from_template(
+    "The following are summaries of consecutive parts of one document:\n\n{text}\n\n"
+    "Combine them into a single concise summary that keeps the key points in order.\n\nCONCISE SUMMARY:"
+)
+
+
+class SummaryStaleError(Exception):
+    """Raised when a summary's record was dropped mid-run because the document's chunks changed."""
+
+
+async def gather_or_cancel(*awaitables) -> list:
+    """
+    Like asyncio.gather, but as soon as one awaitable fails the others are cancelled
+    (so they stop using LLM quota and rate-limit tokens) before its exception is raised.
+    """
+    tasks = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+class TokenBucket:
+    """
+    Async token bucket allowing `rate` acquisitions per `per` seconds, with bursts of
+    up to `capacity`. Callers wait until a token is available.
+    """
+    def __init__(self, rate: float, per: float = 60.0, capacity: float = None):
+        self.rate = rate / per
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ChunkSummaryCache:
+    """
+    Stores per-chunk summaries in MongoDB keyed by model, prompt version and chunk
+    hash, so identical chunks (re-uploads, shared boilerplate) are summarized once.
+    """
+    def __init__(self, async_db, model: str):
+        self.async_collection = async_db.get_collection("chunk_summaries")
+        self.model = model
+
+    def key(self, text_hash: str) -> str:
+        return f"{self.model}:{PROMPT_VERSION}:{text_hash}"
+
+    async def get_many(self, text_hashes: list[str]) -> dict:
+        keys = {self.key(text_hash): text_hash for text_hash in text_hashes}
+        cursor = self.async_collection.find({"_id": {"$in": list(keys)}})
+        return {keys[row["_id"]]: row["summary"] for row in await cursor.to_list(length=None)}
+
+    async def put(self, text_hash: str, summary: str):
+        await self.async_collection.update_one(
+            {"_id": self.key(text_hash)},
+            {"$set": {"summary": summary, "created_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+
+
+class Summarizer:
+    """
+    Map-reduce summarization with bounded concurrency. Each chunk is summarized (map)
+    under a semaphore and a requests-per-minute token bucket shared by all summaries
+    running in this process; the chunk summaries are then combined in a tree, packing
+    as many as fit in `reduce_token_budget` into each combine call until one remains.
+    """
+    def __init__(self, llm, max_concurrency: int, requests_per_minute: float, reduce_token_budget: int, cache: ChunkSummaryCache = None):
+        llm = llm.with_config(callbacks=[LLMTimingCallback("summary_llm")])
+        self.map_chain = MAP_PROMPT | llm | StrOutputParser()
+        self.combine_chain = COMBINE_PROMPT | llm | StrOutputParser()
+        self.reduce_token_budget = reduce_token_budget
+        self.cache = cache
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._bucket = TokenBucket(requests_per_minute, capacity=max_concurrency)
+
+    async def summarize(self, documents: List[Document], on_progress=None) -> dict:
+        """
+        Summarizes chunks in document order. `on_progress(done, total)` is awaited as
+        chunk summaries complete. Returns the summary and how many chunks were cached.
+        """
+        hashes = [chunk_hash(doc.page_content) for doc in documents]
+        texts = dict(zip(hashes, (doc.page_content for doc in documents)))
+        summaries = await self.cache.get_many(list(texts)) if self.cache else {}
+        cached = len(summaries)
+
+        missing = [text_hash for text_hash in texts if text_hash not in summaries]
+        done = cached
+
+        async def map_chunk(text_hash: str):
+            nonlocal done
+            summaries[text_hash] = await self._call(self.map_chain, texts[text_hash])
+            if self.cache:
+                await self.cache.put(text_hash, summaries[text_hash])
+            done += 1
+            if on_progress:
+                await on_progress(done, len(texts))
+
+        await gather_or_cancel(*(map_chunk(text_hash) for text_hash in missing))
+        logger.info(f"Map phase finished: {len(missing)} chunks summarized, {cached} from cache.")
+
+        ordered = [summaries[text_hash] for text_hash in dict.fromkeys(hashes)]
+        return {"summary": await self._reduce(ordered), "cached_chunks": cached}
+
+    async def _reduce(self, summaries: list[str]) -> str:
+        level = 0
+        while len(summaries) > 1:
+            groups = self._pack(summaries)
+            level += 1
+            logger.info(f"Reduce level {level}: combining {len(summaries)} summaries in {len(groups)} calls.")
+            summaries = await gather_or_cancel(*(
+                self._call(self.combine_chain, "\n\n".join(group)) for group in groups
+            ))
+        return summaries[0]
+
+    def _pack(self, summaries: list[str]) -> list[list[str]]:
+        """Groups consecutive summaries so each group fits the reduce token budget."""
+        groups, current, current_tokens = [], [], 0
+        for summary in summaries:
+            tokens = estimate_tokens(summary)
+            if current and current_tokens + tokens > self.reduce_token_budget:
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(summary)
+            current_tokens += tokens
+        groups.append(current)
+        # Summaries too long to pair up within the budget are still combined two at a
+        # time, so every level makes progress
+        if len(groups) == len(summaries):
+            groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+        return groups
+
+    async def _call(self, chain, text: str) -> str:
+        async with self._semaphore:
+            await self._bucket.acquire()
+            return await chain.ainvoke({"text": text})
+
+
+class SummaryStore:
+    """
+    Persists one summary record per document (status, progress and result), so any
+    API process can serve a summary started by another.
+    """
+    def __init__(self, db, async_db):
+        self.collection = db.get_collection("document_summaries")
+        self.async_collection = async_db.get_collection("document_summaries")
+
+    def ensure_indexes(self):
+        self.collection.create_index([("document_id", ASCENDING)], unique=True)
+
+    async def get(self, document_id: str):
+        return await self.async_collection.find_one({"document_id": document_id}, {"_id": 0})
+
+    async def start(self, user_id: str, document_id: str) -> dict:
+        record = self._new_record(user_id, document_id, status="running")
+        await self.async_collection.replace_one({"document_id": document_id}, record, upsert=True)
+        return record
+
+    async def update(self, document_id: str, **fields) -> bool:
+        """Updates a summary record. Returns False if there is none, e.g. it was dropped mid-run."""
+        fields["updated_at"] = datetime.now(timezone.utc)
+        result = await self.async_collection.update_one({"document_id": document_id}, {"$set": fields})
+        return result.matched_count > 0
+
+    async def mark_stale(self, user_id: str, document_id: str):
+        """
+        Records that a run was abandoned because the document changed under it, so
+        pollers get a failed status instead of a 404. A run started since is left alone.
+        """
+        record = self._new_record(
+            user_id, document_id, status="failed",
+            error="The document changed while it was being summarized; request the summary again.",
+        )
+        await self.async_collection.update_one({"document_id": document_id}, {"$setOnInsert": record}, upsert=True)
+
+    @staticmethod
+    def _new_record(user_id: str, document_id: str, status: str, error: str = None) -> dict:
+        now = datetime.now(timezone.utc)
+        return {
+            "document_id": document_id,
+            "user_id": user_id,
+            "status": status,
+            "summary": None,
+            "progress": 0.0,
+            "chunk_count": None,
+            "cached_chunks": 0,
+            "error": error,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+    def delete(self, document_id: str):
+        self.collection.delete_one({"document_id": document_id})
+
+
+@lru_cache(maxsize=1)
+def get_summarizer() -> Summarizer:
+    """Builds the summarizer once, on the shared Gemini client, so its limits are process-wide."""
+    return Summarizer(
+        get_chat_model(settings.SUMMARY_MODEL, temperature=0.1),
+        max_concurrency=settings.SUMMARY_MAX_CONCURRENCY,
+        requests_per_minute=settings.SUMMARY_REQUESTS_PER_MINUTE,
+        reduce_token_budget=settings.SUMMARY_REDUCE_TOKEN_BUDGET,
+        cache=ChunkSummaryCache(vector_store.async_db, model=settings.SUMMARY_MODEL),
+    )
+
+
+summary_store = SummaryStore(vector_store.db, vector_store.async_db)
+# A summary no longer matches a document whose chunks changed
+vector_store.add_document_listener(summary_store.delete)
+# Running summary tasks, referenced so they are not garbage collected mid-run
+_running = {}
+
+
 async def summarize_document(documents: List[Document]) -> str:
     """
     Generates a summary for a list of document chunks.
@@ -24,23 +265,67 @@ async def summarize_document(documents: List[Document]) -> str:
         return "The document is empty and cannot be summarized."
 
     logger.info(f"Starting summarization for a document with {len(documents)} chunks.")
-    
+
     try:
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash-latest",
-            google_api_key=settings.GOOGLE_API_KEY,
-            temperature=0.1
-        )
+        result = await get_summarizer().summarize(documents)
 
-        # "map_reduce" is efficient for large documents. It summarizes each chunk (map)
-        # and then combines the summaries into a final summary (reduce).
-        summary_chain = load_summarize_chain(llm, chain_type="map_reduce")
-        
-        summary = await summary_chain.arun(documents)
-        
         logger.info("Summarization completed successfully.")
-        return summary
+        return result["summary"]
 
     except Exception as e:
         logger.exception("An error occurred during document summarization.")
         raise
+
+
+async def start_document_summary(user_id: str, document_id: str) -> dict:
+    """
+    Starts summarizing a stored document in the background, unless a run for it is
+    already in progress in this process. Returns the summary record.
+    """
+    task = _running.get(document_id)
+    if task is not None and not task.done():
+        return await summary_store.get(document_id)
+
+    record = await summary_store.start(user_id, document_id)
+    _running[document_id] = asyncio.get_running_loop().create_task(_run_summary(user_id, document_id))
+    return record
+
+
+async def _run_summary(user_id: str, document_id: str):
+    async def update(**fields):
+        # The document-change listener drops the record when the chunks change; the run
+        # then stops rather than spend LLM calls on (and store) a summary of the old version
+        if not await summary_store.update(document_id, **fields):
+            raise SummaryStaleError(f"Document {document_id} changed while it was being summarized.")
+
+    try:
+        chunks = await vector_store.aget_document_chunks(user_id, document_id)
+        documents = [Document(page_content=chunk["text"], metadata=chunk["metadata"]) for chunk in chunks]
+        await update(chunk_count=len(documents))
+
+        last_reported = 0.0
+
+        async def on_progress(done: int, total: int):
+            nonlocal last_reported
+            # Report in 5% steps rather than on every chunk; the map phase counts as 90%
+            if done / total - last_reported >= 0.05 or done == total:
+                last_reported = done / total
+                await update(progress=round(last_reported * 0.9, 4))
+
+        if not documents:
+            result = {"summary": await summarize_document(documents), "cached_chunks": 0}
+        else:
+            result = await get_summarizer().summarize(documents, on_progress=on_progress)
+        await update(
+            status="completed", progress=1.0,
+            summary=result["summary"], cached_chunks=result["cached_chunks"],
+        )
+        logger.info(f"Summary for document {document_id} completed.")
+    except SummaryStaleError as e:
+        logger.warning(f"{e} The run was abandoned.")
+        await summary_store.mark_stale(user_id, document_id)
+    except Exception as e:
+        logger.exception(f"Summary for document {document_id} failed.")
+        await summary_store.update(document_id, status="failed", error=str(e))
+    finally:
+        _running.pop(document_id, None)
@@ -0,0 +1,348 @@
+import io
+import threading
+from collections import OrderedDict
+import numpy as np
+import gridfs
+from loguru import logger
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns the positions of the k highest scores, best first.
+    Uses argpartition so only the k winners are sorted, not the whole array.
+    """
+    n = scores.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(n)
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class VectorIndex:
+    """
+    Base class for the in-process indexes built over one document's chunk embeddings.
+    Each row of the index maps to a chunk `_id` in the embeddings collection.
+    """
+    kind = "base"
+    # Quantized indexes return approximate scores that need rescoring
+    quantized = False
+
+    def __init__(self, ids: np.ndarray, vectors: np.ndarray):
+        self.ids = np.asarray(ids, dtype=str)
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+
+    def __len__(self):
+        return self.ids.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.ids.nbytes + self.vectors.nbytes
+
+    def search(self, query_embedding, k: int):
+        """Returns (chunk_ids, scores) for the k best matching chunks, best first."""
+        raise NotImplementedError
+
+    def _arrays(self) -> dict:
+        return {"ids": self.ids, "vectors": self.vectors}
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez(buffer, kind=np.array(self.kind), **self._arrays())
+        return buffer.getvalue()
+
+    @staticmethod
+    def from_bytes(data: bytes) -> "VectorIndex":
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            kind = str(arrays["kind"])
+            index_cls = INDEX_TYPES.get(kind)
+            if index_cls is None:
+                raise ValueError(f"Unknown vector index kind: '{kind}'")
+            return index_cls._from_arrays(arrays)
+
+    @classmethod
+    def _from_arrays(cls, arrays) -> "VectorIndex":
+        return cls(arrays["ids"], arrays["vectors"])
+
+
+class FlatIndex(VectorIndex):
+    """
+    Exact search over a contiguous float32 matrix: one matrix-vector product per query.
+    """
+    kind = "flat"
+
+    def search(self, query_embedding, k: int):
+        query = np.asarray(query_embedding, dtype=np.float32)
+        scores = self.vectors @ query
+        winners = top_k(scores, k)
+        return self.ids[winners], scores[winners]
+
+
+class IVFIndex(VectorIndex):
+    """
+    Approximate inverted-file index. Vectors are clustered with spherical k-means and
+    stored grouped by cluster, so a query only scores the `nprobe` closest clusters.
+    """
+    kind = "ivf"
+
+    def __init__(self, ids, vectors, centroids, offsets, nprobe: int = 8):
+        super().__init__(ids, vectors)
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.nprobe = nprobe
+
+    @property
+    def nbytes(self) -> int:
+        return super().nbytes + self.centroids.nbytes + self.offsets.nbytes
+
+    @classmethod
+    def build(cls, ids, vectors, nlist: int = None, nprobe: int = 8, iterations: int = 10, seed: int = 0):
+        ids = np.asarray(ids, dtype=str)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        n = vectors.shape[0]
+        nlist = nlist or max(1, int(np.sqrt(n)))
+        nlist = min(nlist, n)
+
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(n, size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = vectors[assignments == c]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    norm = np.linalg.norm(centroid)
+                    centroids[c] = centroid / norm if norm else centroid
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=nlist)
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        return cls(ids[order], vectors[order], centroids, offsets, nprobe=nprobe)
+
+    def search(self, query_embedding, k: int):
+        query = np.asarray(query_embedding, dtype=np.float32)
+        probes = top_k(self.centroids @ query, self.nprobe)
+        rows = np.concatenate([
+            np.arange(self.offsets[c], self.offsets[c + 1]) for c in probes
+        ])
+        scores = self.vectors[rows] @ query
+        winners = top_k(scores, k)
+        return self.ids[rows[winners]], scores[winners]
+
+    def _arrays(self) -> dict:
+        arrays = super()._arrays()
+        arrays.update(centroids=self.centroids, offsets=self.offsets, nprobe=np.array(self.nprobe))
+        return arrays
+
+    @classmethod
+    def _from_arrays(cls, arrays) -> "IVFIndex":
+        return cls(
+            arrays["ids"], arrays["vectors"], arrays["centroids"], arrays["offsets"],
+            nprobe=int(arrays["nprobe"]),
+        )
+
+
+class QuantizedIndex(VectorIndex):
+    """
+    Base class for flat indexes that keep only compressed codes in memory. Their scores
+    are approximate, so callers search for a few times k candidates and rescore those
+    with the full-precision embeddings stored in Mongo.
+    """
+    quantized = True
+    # Rows scored per block, bounding the temporary float32 buffer a query allocates
+    block_rows = 4096
+
+    def __init__(self, ids, codes: np.ndarray, dims: int):
+        self.ids = np.asarray(ids, dtype=str)
+        self.codes = np.ascontiguousarray(codes)
+        self.dims = dims
+
+    @property
+    def vectors(self):
+        raise AttributeError(f"{type(self).__name__} does not keep float vectors")
+
+    @property
+    def nbytes(self) -> int:
+        return self.ids.nbytes + self.codes.nbytes
+
+    @classmethod
+    def build(cls, ids, vectors) -> "QuantizedIndex":
+        raise NotImplementedError
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def search(self, query_embedding, k: int):
+        scores = self._scores(np.asarray(query_embedding, dtype=np.float32))
+        winners = top_k(scores, k)
+        return self.ids[winners], scores[winners]
+
+    def _arrays(self) -> dict:
+        return {"ids": self.ids, "codes": self.codes, "dims": np.array(self.dims)}
+
+    @classmethod
+    def _from_arrays(cls, arrays) -> "QuantizedIndex":
+        return cls(arrays["ids"], arrays["codes"], int(arrays["dims"]))
+
+
+class Int8Index(QuantizedIndex):
+    """
+    Scalar quantization: each vector is scaled by its largest absolute component into
+    int8, a quarter of the float32 size. The per-vector scales are kept for scoring.
+    """
+    kind = "int8"
+
+    def __init__(self, ids, codes, dims: int, scales=None):
+        super().__init__(ids, np.asarray(codes, dtype=np.int8), dims)
+        self.scales = np.asarray(scales, dtype=np.float32)
+
+    @property
+    def nbytes(self) -> int:
+        return super().nbytes + self.scales.nbytes
+
+    @classmethod
+    def build(cls, ids, vectors) -> "Int8Index":
+        vectors = np.asarray(vectors, dtype=np.float32)
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return cls(ids, codes, vectors.shape[1], scales)
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), self.block_rows):
+            block = slice(start, start + self.block_rows)
+            scores[block] = self.codes[block].astype(np.float32) @ query
+        return scores * self.scales
+
+    def _arrays(self) -> dict:
+        arrays = super()._arrays()
+        arrays.update(scales=self.scales)
+        return arrays
+
+    @classmethod
+    def _from_arrays(cls, arrays) -> "Int8Index":
+        return cls(arrays["ids"], arrays["codes"], int(arrays["dims"]), arrays["scales"])
+
+
+# Number of set bits for every byte value, for Hamming distances over packed codes
+_POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint16)
+
+
+class BinaryIndex(QuantizedIndex):
+    """
+    Sign quantization: one bit per dimension (32x smaller than float32). Vectors are
+    scored by Hamming similarity of their sign bits to the query's, a coarse proxy for
+    cosine similarity that needs rescoring to order the final results.
+    """
+    kind = "binary"
+
+    @classmethod
+    def build(cls, ids, vectors) -> "BinaryIndex":
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return cls(ids, np.packbits(vectors > 0, axis=1), vectors.shape[1])
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        query_bits = np.packbits(query > 0)
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), self.block_rows):
+            block = slice(start, start + self.block_rows)
+            distances = _POPCOUNT[self.codes[block] ^ query_bits].sum(axis=1)
+            scores[block] = 1 - 2 * distances / self.dims
+        return scores
+
+
+INDEX_TYPES = {index_cls.kind: index_cls for index_cls in (FlatIndex, IVFIndex, Int8Index, BinaryIndex)}
+QUANTIZERS = {"int8": Int8Index, "binary": BinaryIndex}
+
+
+def build_index(ids, vectors, flat_threshold: int = 20000, nprobe: int = 8, quantization: str = "none") -> VectorIndex:
+    """
+    Picks the index type for a document: flat search for small documents, exact or over
+    `quantization` ("int8" or "binary") codes, and IVF for documents with at least
+    `flat_threshold` chunks.
+    """
+    if len(ids) >= flat_threshold:
+        return IVFIndex.build(ids, vectors, nprobe=nprobe)
+    if quantization == "none":
+        return FlatIndex(ids, vectors)
+    quantizer = QUANTIZERS.get(quantization)
+    if quantizer is None:
+        raise ValueError(f"Unknown vector index quantization: '{quantization}'")
+    return quantizer.build(ids, vectors)
+
+
+class IndexCache:
+    """
+    Thread-safe LRU of loaded indexes keyed by document_id, bounded by the total bytes of
+    their id arrays and float32 matrices rather than by entry count.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def get(self, document_id: str):
+        with self._lock:
+            index = self._entries.get(document_id)
+            if index is not None:
+                self._entries.move_to_end(document_id)
+            return index
+
+    def put(self, document_id: str, index: VectorIndex):
+        with self._lock:
+            self._pop(document_id)
+            if index.nbytes > self.max_bytes:
+                logger.warning(f"Index for document {document_id} ({index.nbytes} bytes) exceeds the cache budget, not caching")
+                return
+            self._entries[document_id] = index
+            self._bytes += index.nbytes
+            while self._bytes > self.max_bytes:
+                evicted_id, _ = next(iter(self._entries.items()))
+                self._pop(evicted_id)
+                logger.debug(f"Evicted index for document {evicted_id} from cache")
+
+    def invalidate(self, document_id: str):
+        with self._lock:
+            self._pop(document_id)
+
+    def _pop(self, document_id: str):
+        index = self._entries.pop(document_id, None)
+        if index is not None:
+            self._bytes -= index.nbytes
+
+
+class VectorIndexStore:
+    """
+    Persists serialized indexes in GridFS next to the chunk collection, one file per document.
+    `index_cls` provides from_bytes, so the same store also holds the lexical indexes.
+    """
+    def __init__(self, db, bucket_name: str = "vector_indexes", index_cls=VectorIndex):
+        self.fs = gridfs.GridFS(db, collection=bucket_name)
+        self.index_cls = index_cls
+
+    def save(self, document_id: str, index: VectorIndex):
+        # Write the new version before removing the old ones so a reader never sees a gap.
+        new_file_id = self.fs.put(index.to_bytes(), filename=document_id, kind=index.kind, size=len(index))
+        for old in self.fs.find({"filename": document_id, "_id": {"$ne": new_file_id}}):
+            self.fs.delete(old._id)
+        logger.info(f"Persisted {index.kind} index with {len(index)} chunks for document {document_id}")
+
+    def load(self, document_id: str):
+        grid_out = self.fs.find_one({"filename": document_id}, sort=[("uploadDate", -1)])
+        if grid_out is None:
+            return None
+        return self.index_cls.from_bytes(grid_out.read())
+
+    def delete(self, document_id: str):
+        for old in self.fs.find({"filename": document_id}):
+            self.fs.delete(old._id)
@@ -1,67 +1,888 @@
-from pymongo import MongoClient
-# --- THE FIX: Import from the new, correct package ---
-from langchain_huggingface import HuggingFaceEmbeddings
+import asyncio
+import hashlib
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+from bson import ObjectId
+from fastapi.concurrency import run_in_threadpool
+from pymongo import ASCENDING, AsyncMongoClient, MongoClient, UpdateOne
 from langchain.docstore.document import Document
 from app.core.config import settings
+from app.core.metrics import EMBEDDED_TEXTS, EMBEDDING_BATCH_SIZE, timed
+from app.services.document_catalog import DocumentCatalog
+from app.services.document_changes import DocumentChangeLog
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.embedding_cache import CachedEmbeddings
+from app.services.embedding_server import EMBEDDING_MODEL_NAME, get_remote_embeddings, load_local_model
+from app.services.embedding_codec import decode_embedding, decode_embeddings, encode_embedding
+from app.services.lexical_index import BM25Index, reciprocal_rank_fusion
+from app.services.vector_index import build_index, top_k, IndexCache, VectorIndexStore
 from loguru import logger
 
+def chunk_hash(text: str) -> str:
+    """Content hash identifying a chunk's text, independent of the document it came from."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# Matches chunks that have not been tombstoned by a document update or delete
+LIVE_CHUNKS = {"deleted_at": None}
+# Metadata locating a chunk in its PDF, refreshed when an update keeps a chunk that moved
+POSITION_FIELDS = ("page", "total_pages", "start_index", "section")
+
+
+def mongo_client_options() -> dict:
+    """Connection pool settings shared by the sync and async MongoDB clients."""
+    return {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": settings.MONGO_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    }
+
+
 class MongoVectorStore:
     """
     Manages storing and retrieving document embeddings from MongoDB using
     a local sentence-transformers model.
+
+    Two clients share the same database: the sync client serves ingestion workers,
+    index persistence and scripts, while request handlers use the `a`-prefixed
+    methods, which go through the async client and never block the event loop.
     """
     def __init__(self):
         try:
-            self.client = MongoClient(settings.MONGO_CONNECTION_STRING)
+            self.client = MongoClient(settings.MONGO_CONNECTION_STRING, **mongo_client_options())
             self.db = self.client.get_database("chat_with_pdf_db")
             self.collection = self.db.get_collection("document_embeddings_local")
+            # Connects lazily, on the event loop of the first awaited operation
+            self.async_client = AsyncMongoClient(settings.MONGO_CONNECTION_STRING, **mongo_client_options())
+            self.async_db = self.async_client.get_database("chat_with_pdf_db")
+            self.async_collection = self.async_db.get_collection("document_embeddings_local")
+            self.index_store = VectorIndexStore(self.db)
+            self.catalog = DocumentCatalog(self.db, self.async_db)
+            # Contiguous float32 embedding matrices loaded into this process, keyed by document_id
+            self.index_cache = IndexCache(max_bytes=settings.VECTOR_INDEX_CACHE_MAX_BYTES)
+            # BM25 inverted indexes over the same chunks, for keyword and hybrid retrieval
+            self.lexical_store = VectorIndexStore(self.db, bucket_name="lexical_indexes", index_cls=BM25Index)
+            self.lexical_cache = IndexCache(max_bytes=settings.LEXICAL_INDEX_CACHE_MAX_BYTES)
+            # Callbacks run with a document_id whenever that document's chunks change,
+            # as (callback, in_memory) pairs
+            self._document_listeners = []
+            # Lets the other API workers learn about those changes
+            self.changes = DocumentChangeLog(self.db, poll_overlap_seconds=settings.DOCUMENT_CHANGE_POLL_SECONDS / 2)
+            # Loads the indexes of several documents from GridFS at once for multi-document queries
+            self._shard_loader = ThreadPoolExecutor(max_workers=settings.SHARD_LOAD_WORKERS, thread_name_prefix="shard-loader")
 
-            # --- CRITICAL CHANGE: Use local HuggingFaceEmbeddings from the new package ---
-            # This will download the model on the first run and cache it.
-            logger.info("Initializing local sentence-transformer model. This may take a moment on the first run...")
-            self.embedding_model = HuggingFaceEmbeddings(
-                model_name="all-MiniLM-L6-v2"
-            )
-            
-            logger.success("Successfully connected to MongoDB and initialized local embedding model.")
+            # The embedding model and the query batcher are created on first use (or by
+            # warm_up), so importing this module does not load the model
+            self._embedding_model = None
+            self._query_batcher = None
+            self._model_lock = threading.Lock()
+
+            logger.success("Initialized MongoVectorStore; the embedding model loads on first use.")
         except Exception as e:
             logger.error(f"Failed to initialize MongoVectorStore: {e}")
             raise
 
+    @property
+    def embedding_model(self):
+        """The local sentence-transformers model, loaded on first access."""
+        if self._embedding_model is None:
+            with self._model_lock:
+                if self._embedding_model is None:
+                    self._embedding_model = self._load_embedding_model()
+        return self._embedding_model
+
+    @property
+    def query_batcher(self) -> EmbeddingBatcher:
+        """Micro-batcher for query embeddings, created on first access."""
+        if self._query_batcher is None:
+            embedding_model = self.embedding_model
+            with self._model_lock:
+                if self._query_batcher is None:
+                    self._query_batcher = EmbeddingBatcher(
+                        embedding_model,
+                        max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+                        max_wait_ms=settings.EMBEDDING_BATCH_MAX_WAIT_MS,
+                        threads=settings.EMBEDDING_BATCH_THREADS,
+                    )
+        return self._query_batcher
+
+    async def aembed_query(self, query: str) -> list[float]:
+        """
+        Embeds a query through the micro-batcher. If the model has not been loaded
+        yet (no warm-up), it is loaded on a worker thread rather than on the event loop.
+        """
+        if self._embedding_model is None:
+            await run_in_threadpool(lambda: self.embedding_model)
+        with timed("embed_query"):
+            return await self.query_batcher.embed_query(query)
+
+    def _load_embedding_model(self):
+        if settings.EMBEDDING_SERVER_ADDRESS:
+            # Multi-worker mode: the model lives in the shared embedding server process
+            logger.info(f"Using the shared embedding server at {settings.EMBEDDING_SERVER_ADDRESS}")
+            embedding_model = get_remote_embeddings()
+        else:
+            embedding_model = load_local_model()
+        if settings.EMBEDDING_CACHE_ENABLED:
+            # Repeated questions and boilerplate chunks are served from the cache
+            embedding_model = CachedEmbeddings(
+                embedding_model,
+                model_name=EMBEDDING_MODEL_NAME,
+                path=settings.EMBEDDING_CACHE_PATH,
+                memory_items=settings.EMBEDDING_CACHE_MEMORY_ITEMS,
+                max_rows=settings.EMBEDDING_CACHE_MAX_ROWS,
+                busy_timeout=settings.EMBEDDING_CACHE_BUSY_TIMEOUT_SECONDS,
+            )
+        logger.success("Embedding model ready.")
+        return embedding_model
+
+    def warm_up(self):
+        """
+        Loads the embedding model, runs one forward pass so the first query does not
+        pay for it, and checks that MongoDB is reachable. Blocking; run it off the event loop.
+        """
+        self.embedding_model.embed_query("warm-up")
+        self.client.admin.command("ping")
+
+    async def aping(self):
+        """Round trip to MongoDB through the async client, for readiness checks."""
+        await self.async_db.command("ping")
+
+    def add_document_listener(self, callback, in_memory: bool = False):
+        """
+        Registers `callback(document_id)` to run whenever a document's chunks change.
+        Listeners that only drop per-process state pass `in_memory=True`; they also run
+        in every other worker when it picks up the change from the change log.
+        """
+        self._document_listeners.append((callback, in_memory))
+
+    def _notify_document_changed(self, document_id: str):
+        try:
+            self.changes.record(document_id)
+        except Exception as e:
+            logger.error(f"Could not record the change of document {document_id}: {e}")
+        self._run_listeners(document_id, in_memory_only=False)
+
+    def _run_listeners(self, document_id: str, in_memory_only: bool):
+        for callback, in_memory in self._document_listeners:
+            if in_memory_only and not in_memory:
+                continue
+            try:
+                callback(document_id)
+            except Exception as e:
+                logger.error(f"Document change listener failed for {document_id}: {e}")
+
+    def apply_remote_changes(self) -> int:
+        """
+        Drops this process's cached indexes (and in-memory listener state) for documents
+        other workers have changed since the last call. Returns the number of documents.
+        """
+        document_ids = self.changes.poll()
+        for document_id in document_ids:
+            self.index_cache.invalidate(document_id)
+            self.lexical_cache.invalidate(document_id)
+            self._run_listeners(document_id, in_memory_only=True)
+        if document_ids:
+            logger.info(f"Invalidated cached state of {len(document_ids)} documents changed by other workers")
+        return len(document_ids)
+
+    def ensure_indexes(self):
+        """
+        Creates the MongoDB indexes used by the hot paths and registers documents missing
+        from the catalog (once). Safe to call on every startup.
+        """
+        self.collection.create_index(
+            [("metadata.user_id", ASCENDING), ("metadata.document_id", ASCENDING)]
+        )
+        self.collection.create_index([("chunk_hash", ASCENDING)])
+        # Only tombstoned chunks have the field, so the index stays as small as the backlog
+        self.collection.create_index([("deleted_at", ASCENDING)], sparse=True)
+        self.catalog.ensure_indexes()
+        self.changes.ensure_indexes()
+        logger.info("MongoDB indexes are in place.")
+        # Documents uploaded before the catalog existed would otherwise be invisible to their owners
+        self.catalog.backfill(self.collection, LIVE_CHUNKS)
+
     def add_documents(self, documents: list[Document], user_id: str, document_id: str):
         """
         Embeds and adds a list of document chunks to the vector store.
         This process is now fast and runs locally without rate limits.
         """
         try:
-            texts_to_embed = [doc.page_content for doc in documents]
-            if not texts_to_embed:
+            if not documents:
                 logger.warning("No text found in documents to embed.")
                 return
 
-            embeddings = self.embedding_model.embed_documents(texts_to_embed)
-
-            docs_to_insert = []
-            for i, doc in enumerate(documents):
-                doc.metadata["user_id"] = user_id
-                doc.metadata["document_id"] = document_id
-                docs_to_insert.append({
-                    "text": doc.page_content,
-                    "embedding": embeddings[i],
-                    "metadata": doc.metadata
-                })
+            embeddings = self.embed_documents(documents)
+            self.store_documents(documents, embeddings, user_id=user_id, document_id=document_id)
+        except Exception as e:
+            logger.error(f"Error adding documents to vector store: {e}")
+            raise
 
-            if docs_to_insert:
-                self.collection.insert_many(docs_to_insert)
+    async def aadd_documents(self, documents: list[Document], user_id: str, document_id: str):
+        """
+        Async variant of add_documents. Embedding and index building run on worker
+        threads; the chunks are inserted with the async client.
+        """
+        try:
+            if not documents:
+                logger.warning("No text found in documents to embed.")
+                return
 
+            embeddings = await run_in_threadpool(self.embed_documents, documents)
+            ids = await self.ainsert_chunks(documents, embeddings, user_id=user_id, document_id=document_id)
+            await run_in_threadpool(
+                self.extend_index, document_id, ids,
+                np.asarray(embeddings, dtype=np.float32),
+                [doc.page_content for doc in documents],
+            )
             logger.success(f"All {len(documents)} chunks have been successfully embedded and stored locally.")
         except Exception as e:
             logger.error(f"Error adding documents to vector store: {e}")
             raise
 
+    def embed_documents(self, documents: list[Document], on_progress=None) -> list[list[float]]:
+        """
+        Embeds document chunks in batches of EMBEDDING_BATCH_SIZE.
+        `on_progress(done, total)` is called after every batch.
+        """
+        texts_to_embed = [doc.page_content for doc in documents]
+        batch_size = settings.EMBEDDING_BATCH_SIZE
+        embeddings = []
+        for start in range(0, len(texts_to_embed), batch_size):
+            batch = texts_to_embed[start:start + batch_size]
+            with timed("embed"):
+                embeddings.extend(self.embedding_model.embed_documents(batch))
+            EMBEDDING_BATCH_SIZE.labels("documents").observe(len(batch))
+            EMBEDDED_TEXTS.labels("documents").inc(len(batch))
+            if on_progress:
+                on_progress(len(embeddings), len(texts_to_embed))
+        return embeddings
+
+    def embed_or_reuse(self, documents: list[Document]) -> tuple[list[list[float]], int]:
+        """
+        Embeds document chunks, reusing stored embeddings for chunks whose text has
+        already been embedded for any user. Only the embedding is shared; the new chunk
+        records still belong to the uploading user.
+        Returns the embeddings and the number of chunks that were reused.
+        """
+        hashes = [chunk_hash(doc.page_content) for doc in documents]
+        with timed("mongo_read"):
+            known = {
+                row["_id"]: decode_embedding(row["embedding"])
+                for row in self.collection.aggregate([
+                    {"$match": {"chunk_hash": {"$in": list(set(hashes))}}},
+                    {"$group": {"_id": "$chunk_hash", "embedding": {"$first": "$embedding"}}},
+                ])
+            }
+
+        missing = [i for i, h in enumerate(hashes) if h not in known]
+        fresh = self.embed_documents([documents[i] for i in missing]) if missing else []
+        fresh_by_hash = dict(zip((hashes[i] for i in missing), fresh))
+
+        embeddings = [known[h] if h in known else fresh_by_hash[h] for h in hashes]
+        return embeddings, len(documents) - len(missing)
+
+    def live_chunk_ids(self, user_id: str, document_id: str) -> list[str]:
+        """Returns the ids of a document's live chunks, in insertion order."""
+        cursor = self.collection.find(
+            {"metadata.user_id": user_id, "metadata.document_id": document_id, **LIVE_CHUNKS}, {"_id": 1}
+        ).sort("_id", ASCENDING)
+        return [str(chunk["_id"]) for chunk in cursor]
+
+    def iter_chunks(self, chunk_ids: list[str], batch_size: int):
+        """
+        Yields the given chunks (text, float32 embedding, metadata) in the given order, in
+        batches. Chunks deleted or tombstoned since their ids were read are left out.
+        """
+        for start in range(0, len(chunk_ids), batch_size):
+            batch_ids = chunk_ids[start:start + batch_size]
+            found = {
+                str(chunk["_id"]): chunk
+                for chunk in self.collection.find(
+                    {"_id": {"$in": [ObjectId(chunk_id) for chunk_id in batch_ids]}, **LIVE_CHUNKS},
+                    {"text": 1, "embedding": 1, "metadata": 1},
+                )
+            }
+            batch = []
+            for chunk_id in batch_ids:
+                if chunk_id in found:
+                    chunk = found[chunk_id]
+                    chunk["embedding"] = decode_embedding(chunk["embedding"])
+                    batch.append(chunk)
+            if batch:
+                yield batch
+
+    async def aget_document_chunks(self, user_id: str, document_id: str) -> list[dict]:
+        """
+        Returns a stored document's chunk texts and metadata in reading order. Insertion
+        order is not enough: chunks added by an update come after all the kept ones.
+        """
+        cursor = self.async_collection.find(
+            {"metadata.user_id": user_id, "metadata.document_id": document_id, **LIVE_CHUNKS},
+            {"_id": 0, "text": 1, "metadata": 1},
+        ).sort([("metadata.page", ASCENDING), ("metadata.start_index", ASCENDING), ("_id", ASCENDING)])
+        return await cursor.to_list(length=None)
+
+    def store_documents(self, documents: list[Document], embeddings: list[list[float]], user_id: str, document_id: str):
+        """
+        Inserts already embedded chunks and updates the document's vector and lexical indexes.
+        """
+        ids = self.insert_chunks(documents, embeddings, user_id=user_id, document_id=document_id)
+        self.extend_index(
+            document_id, ids=ids,
+            vectors=np.asarray(embeddings, dtype=np.float32),
+            texts=[doc.page_content for doc in documents],
+        )
+
+        logger.success(f"All {len(documents)} chunks have been successfully embedded and stored locally.")
+
+    def insert_chunks(self, documents: list[Document], embeddings: list[list[float]], user_id: str, document_id: str) -> list[str]:
+        """
+        Inserts embedded chunks without touching the index. Returns the new chunk ids
+        so callers streaming many batches can build the index once at the end.
+        """
+        records = self._chunk_records(documents, embeddings, user_id, document_id)
+        with timed("mongo_write"):
+            result = self.collection.insert_many(records)
+        return [str(inserted_id) for inserted_id in result.inserted_ids]
+
+    async def ainsert_chunks(self, documents: list[Document], embeddings: list[list[float]], user_id: str, document_id: str) -> list[str]:
+        """Async variant of insert_chunks."""
+        records = self._chunk_records(documents, embeddings, user_id, document_id)
+        with timed("mongo_write"):
+            result = await self.async_collection.insert_many(records)
+        return [str(inserted_id) for inserted_id in result.inserted_ids]
+
+    @staticmethod
+    def _chunk_records(documents: list[Document], embeddings: list[list[float]], user_id: str, document_id: str) -> list[dict]:
+        docs_to_insert = []
+        for i, doc in enumerate(documents):
+            doc.metadata["user_id"] = user_id
+            doc.metadata["document_id"] = document_id
+            docs_to_insert.append({
+                "text": doc.page_content,
+                "embedding": encode_embedding(embeddings[i], settings.EMBEDDING_STORAGE_FORMAT),
+                "chunk_hash": chunk_hash(doc.page_content),
+                "metadata": doc.metadata
+            })
+        return docs_to_insert
+
+    def delete_document_chunks(self, user_id: str, document_id: str):
+        """Removes a document's chunks and its index, e.g. after a failed ingestion."""
+        result = self.collection.delete_many({"metadata.user_id": user_id, "metadata.document_id": document_id})
+        self.drop_indexes(document_id)
+        logger.info(f"Deleted {result.deleted_count} chunks for document {document_id}")
+
+    def drop_indexes(self, document_id: str):
+        """
+        Drops a document's persisted and cached indexes. Documents that still have live
+        chunks get new ones built from them on next use.
+        """
+        self.index_store.delete(document_id)
+        self.index_cache.invalidate(document_id)
+        self.lexical_store.delete(document_id)
+        self.lexical_cache.invalidate(document_id)
+        self._notify_document_changed(document_id)
+
+    def delete_chunks(self, chunk_ids: list[str]):
+        """Removes the given chunks outright, e.g. those inserted by a failed update."""
+        for start in range(0, len(chunk_ids), 1000):
+            batch = [ObjectId(chunk_id) for chunk_id in chunk_ids[start:start + 1000]]
+            self.collection.delete_many({"_id": {"$in": batch}})
+
+    def live_chunks(self, user_id: str, document_id: str) -> list[dict]:
+        """
+        Returns the id, content hash and metadata of each of a document's live chunks, in
+        insertion order, for diffing against a new version of the document.
+        """
+        chunks = []
+        cursor = self.collection.find(
+            {"metadata.user_id": user_id, "metadata.document_id": document_id, **LIVE_CHUNKS},
+            {"chunk_hash": 1, "text": 1, "metadata": 1},
+        ).sort("_id", ASCENDING)
+        for chunk in cursor:
+            chunks.append({
+                "_id": str(chunk["_id"]),
+                # Chunks stored before content hashes existed are hashed from their text
+                "chunk_hash": chunk.get("chunk_hash") or chunk_hash(chunk["text"]),
+                "metadata": chunk["metadata"],
+            })
+        return chunks
+
+    def update_chunk_positions(self, positions: dict):
+        """Sets the page and offset metadata of kept chunks; `positions` maps chunk id to a metadata dict."""
+        if not positions:
+            return
+        with timed("mongo_write"):
+            self.collection.bulk_write([
+                UpdateOne(
+                    {"_id": ObjectId(chunk_id)},
+                    {"$set": {f"metadata.{field}": metadata.get(field) for field in POSITION_FIELDS}},
+                )
+                for chunk_id, metadata in positions.items()
+            ], ordered=False)
+
+    def tombstone_chunks(self, chunk_ids: list[str]):
+        """
+        Marks chunks as deleted. Queries stop returning them immediately; the records
+        are purged by the compactor once TOMBSTONE_GRACE_SECONDS have passed.
+        """
+        now = datetime.now(timezone.utc)
+        with timed("mongo_write"):
+            for start in range(0, len(chunk_ids), 1000):
+                batch = [ObjectId(chunk_id) for chunk_id in chunk_ids[start:start + 1000]]
+                self.collection.update_many({"_id": {"$in": batch}}, {"$set": {"deleted_at": now}})
+
+    def restore_chunks(self, chunk_ids: list[str]):
+        """Clears the tombstones of the given chunks, e.g. those retired by a failed update."""
+        with timed("mongo_write"):
+            for start in range(0, len(chunk_ids), 1000):
+                batch = [ObjectId(chunk_id) for chunk_id in chunk_ids[start:start + 1000]]
+                self.collection.update_many({"_id": {"$in": batch}}, {"$unset": {"deleted_at": ""}})
+
+    async def adelete_document(self, user_id: str, document_id: str) -> bool:
+        """
+        Deletes one of a user's documents: removes it from the catalog, tombstones its
+        chunks and drops its indexes. Returns False if the user has no such document.
+        """
+        if not await self.catalog.aremove(user_id, document_id):
+            return False
+        with timed("mongo_write"):
+            result = await self.async_collection.update_many(
+                {"metadata.user_id": user_id, "metadata.document_id": document_id, **LIVE_CHUNKS},
+                {"$set": {"deleted_at": datetime.now(timezone.utc)}},
+            )
+        await run_in_threadpool(self.drop_indexes, document_id)
+        logger.info(f"Deleted document {document_id} of user {user_id}, tombstoned {result.modified_count} chunks")
+        return True
+
+    def purge_tombstones(self, older_than: datetime, batch_size: int = 1000) -> int:
+        """Removes chunks tombstoned before `older_than`, in batches. Returns the number removed."""
+        purged = 0
+        while True:
+            ids = [
+                chunk["_id"]
+                for chunk in self.collection.find({"deleted_at": {"$lt": older_than}}, {"_id": 1}).limit(batch_size)
+            ]
+            if not ids:
+                return purged
+            purged += self.collection.delete_many({"_id": {"$in": ids}}).deleted_count
+
+    def extend_index(self, document_id: str, ids: list[str], vectors: np.ndarray, texts):
+        """
+        Adds freshly inserted chunks to the document's vector and BM25 indexes, rebuilds
+        them and persists them. `texts` may be any iterable, e.g. iter_chunk_texts.
+        """
+        # Explicit None checks: an index with no rows is falsy but still the current one
+        existing = self.index_cache.get(document_id)
+        if existing is None:
+            existing = self.index_store.load(document_id)
+        existing_lexical = self.lexical_cache.get(document_id)
+        if existing_lexical is None:
+            existing_lexical = self.lexical_store.load(document_id)
+        # Drop the stale indexes before rebuilding so no query scores against a partial view
+        self.index_cache.invalidate(document_id)
+        self.lexical_cache.invalidate(document_id)
+
+        with timed("index_build"):
+            lexical = BM25Index.build(ids, texts, k1=settings.BM25_K1, b=settings.BM25_B)
+            if existing_lexical is not None:
+                lexical = existing_lexical.merge(lexical)
+            if existing is not None and len(existing):
+                # Quantized indexes only keep codes, so their float vectors are read back from Mongo
+                existing_vectors = self.load_vectors(existing.ids) if existing.quantized else existing.vectors
+                ids = np.concatenate([existing.ids, np.asarray(ids, dtype=str)])
+                vectors = np.vstack([existing_vectors, vectors])
+            index = self._build_index(ids, vectors)
+        self._replace_indexes(document_id, index, lexical)
+
+    def rebuild_index(self, document_id: str, ids: list[str], vectors: np.ndarray, texts):
+        """
+        Replaces the document's vector and BM25 indexes with ones built over exactly the
+        given chunks, so chunks dropped by an update no longer cost memory or query time.
+        """
+        with timed("index_build"):
+            lexical = BM25Index.build(ids, texts, k1=settings.BM25_K1, b=settings.BM25_B)
+            index = self._build_index(np.asarray(ids, dtype=str), vectors)
+        self._replace_indexes(document_id, index, lexical)
+
+    def _replace_indexes(self, document_id: str, index, lexical):
+        with timed("mongo_write"):
+            self.index_store.save(document_id, index)
+            self.lexical_store.save(document_id, lexical)
+        self.index_cache.put(document_id, index)
+        self.lexical_cache.put(document_id, lexical)
+        self._notify_document_changed(document_id)
+
+    @staticmethod
+    def _build_index(ids, vectors):
+        return build_index(
+            ids, vectors,
+            flat_threshold=settings.VECTOR_INDEX_FLAT_THRESHOLD,
+            nprobe=settings.VECTOR_INDEX_NPROBE,
+            quantization=settings.VECTOR_INDEX_QUANTIZATION,
+        )
+
+    def load_vectors(self, chunk_ids) -> np.ndarray:
+        """
+        Reads the stored float32 embeddings of the given chunks, in the given order. Rows
+        are decoded straight into one preallocated matrix, so peak memory is the matrix
+        itself plus one batch of stored embeddings.
+        """
+        rows = defaultdict(list)
+        for row, chunk_id in enumerate(chunk_ids):
+            rows[str(chunk_id)].append(row)
+        vectors, found = None, 0
+        unique_ids = list(rows)
+        # Bounded $in batches keep each query well under the BSON size limit
+        for start in range(0, len(unique_ids), 1000):
+            batch = [ObjectId(chunk_id) for chunk_id in unique_ids[start:start + 1000]]
+            for chunk in self.collection.find({"_id": {"$in": batch}}, {"embedding": 1}):
+                vector = decode_embedding(chunk["embedding"])
+                if vectors is None:
+                    vectors = np.empty((len(chunk_ids), vector.shape[0]), dtype=np.float32)
+                vectors[rows[str(chunk["_id"])]] = vector
+                found += 1
+        if found < len(unique_ids):
+            raise KeyError(f"{len(unique_ids) - found} of the requested chunks are missing")
+        return vectors if vectors is not None else np.empty((0, 0), dtype=np.float32)
+
+    def iter_chunk_texts(self, chunk_ids):
+        """Yields the text of the given chunks in the given order, reading them in bounded batches."""
+        chunk_ids = [str(chunk_id) for chunk_id in chunk_ids]
+        for start in range(0, len(chunk_ids), 1000):
+            batch = chunk_ids[start:start + 1000]
+            texts = {
+                str(chunk["_id"]): chunk["text"]
+                for chunk in self.collection.find({"_id": {"$in": [ObjectId(chunk_id) for chunk_id in batch]}}, {"text": 1})
+            }
+            for chunk_id in batch:
+                yield texts[chunk_id]
+
+    def _vector_candidates(self, index, query_embedding, k: int):
+        """
+        Searches a vector index for the k best chunks. Quantized indexes are searched for
+        VECTOR_INDEX_RESCORE_FACTOR * k candidates, which are then rescored exactly
+        against their stored float32 embeddings.
+        """
+        if not index.quantized:
+            return index.search(query_embedding, k)
+        candidate_ids, _ = index.search(query_embedding, k * settings.VECTOR_INDEX_RESCORE_FACTOR)
+        return self._rescore(candidate_ids, query_embedding, k)
+
+    def _vector_candidates_across(self, indexes, query_embedding, k: int):
+        """
+        Searches several documents' vector indexes for the global k best chunks. The
+        candidates of all quantized indexes are rescored together, so their float32
+        embeddings are read in one batched query rather than one per document.
+        """
+        results, quantized_ids = [], []
+        for index in indexes:
+            if index is None:
+                continue
+            if index.quantized:
+                quantized_ids.append(index.search(query_embedding, k * settings.VECTOR_INDEX_RESCORE_FACTOR)[0])
+            else:
+                results.append(index.search(query_embedding, k))
+        if quantized_ids:
+            results.append(self._rescore(np.concatenate(quantized_ids), query_embedding, k))
+        return self._merge_top_k(results, k)
+
+    def _rescore(self, candidate_ids, query_embedding, k: int):
+        """Scores candidates exactly against their stored float32 embeddings and keeps the k best."""
+        if len(candidate_ids) == 0:
+            return candidate_ids, np.empty(0, dtype=np.float32)
+        scores = self.load_vectors(candidate_ids) @ np.asarray(query_embedding, dtype=np.float32)
+        winners = top_k(scores, k)
+        return candidate_ids[winners], scores[winners]
+
+    def _get_index(self, user_id: str, document_id: str):
+        """
+        Returns the index for a document, loading it lazily from GridFS. Documents stored
+        before indexes existed are indexed from their chunk embeddings on first use.
+        """
+        index = self.index_cache.get(document_id)
+        if index is not None:
+            return index
+
+        index = self.index_store.load(document_id)
+        if index is None:
+            chunks = list(self.collection.find(
+                {"metadata.user_id": user_id, "metadata.document_id": document_id, **LIVE_CHUNKS},
+                {"embedding": 1},
+            ))
+            if not chunks:
+                return None
+            logger.info(f"No stored index for document {document_id}, building one from {len(chunks)} chunks")
+            index = self._build_index(
+                [str(chunk["_id"]) for chunk in chunks],
+                decode_embeddings([chunk["embedding"] for chunk in chunks]),
+            )
+            self.index_store.save(document_id, index)
+
+        self.index_cache.put(document_id, index)
+        return index
+
+    def _get_lexical_index(self, user_id: str, document_id: str):
+        """
+        Returns the BM25 index for a document, loading it lazily from GridFS. Documents
+        stored before lexical indexes existed are indexed from their chunk text on first use.
+        """
+        index = self.lexical_cache.get(document_id)
+        if index is not None:
+            return index
+
+        index = self.lexical_store.load(document_id)
+        if index is None:
+            chunks = list(self.collection.find(
+                {"metadata.user_id": user_id, "metadata.document_id": document_id, **LIVE_CHUNKS},
+                {"text": 1},
+            ))
+            if not chunks:
+                return None
+            logger.info(f"No stored lexical index for document {document_id}, building one from {len(chunks)} chunks")
+            index = BM25Index.build(
+                [str(chunk["_id"]) for chunk in chunks],
+                [chunk["text"] for chunk in chunks],
+                k1=settings.BM25_K1, b=settings.BM25_B,
+            )
+            self.lexical_store.save(document_id, index)
+
+        self.lexical_cache.put(document_id, index)
+        return index
+
+    @staticmethod
+    def _chunk_query(chunk_ids, user_id: str, document_id) -> dict:
+        """Matches the given chunks of one document, or of any of a list of documents."""
+        return {
+            "_id": {"$in": [ObjectId(chunk_id) for chunk_id in chunk_ids]},
+            "metadata.user_id": user_id,
+            "metadata.document_id": document_id if isinstance(document_id, str) else {"$in": list(document_id)},
+            # A worker whose cached index predates an update or delete must not see removed chunks
+            **LIVE_CHUNKS,
+        }
+
+    @staticmethod
+    def _to_documents(chunk_ids, results, scores: dict) -> list[Document]:
+        """
+        Orders fetched chunks by `chunk_ids`. `scores` maps metadata field names to
+        {chunk_id: score} and is merged into each chunk's metadata.
+        """
+        results_by_id = {str(result["_id"]): result for result in results}
+        docs = []
+        for chunk_id in chunk_ids:
+            result = results_by_id.get(str(chunk_id))
+            if result is None:
+                continue
+            metadata = result['metadata'].copy()
+            for field, scores_by_id in scores.items():
+                if chunk_id in scores_by_id:
+                    metadata[field] = float(scores_by_id[chunk_id])
+            docs.append(Document(page_content=result['text'], metadata=metadata))
+        return docs
+
+    def _fetch_chunks(self, chunk_ids, user_id: str, document_id: str, scores: dict) -> list[Document]:
+        """Fetches the text and metadata of ranked chunks, in the given order."""
+        if not chunk_ids:
+            return []
+        # Only the winners' text and metadata are fetched from Mongo
+        with timed("mongo_read"):
+            results = list(self.collection.find(self._chunk_query(chunk_ids, user_id, document_id), {"embedding": 0}))
+        return self._to_documents(chunk_ids, results, scores)
+
+    async def _afetch_chunks(self, chunk_ids, user_id: str, document_id: str, scores: dict) -> list[Document]:
+        """Async variant of _fetch_chunks over the async client."""
+        if not chunk_ids:
+            return []
+        with timed("mongo_read"):
+            cursor = self.async_collection.find(self._chunk_query(chunk_ids, user_id, document_id), {"embedding": 0})
+            results = await cursor.to_list(length=None)
+        return self._to_documents(chunk_ids, results, scores)
+
+    # Ranking runs entirely against the in-process indexes; each returns the winning
+    # chunk ids (best first) and the scores to attach, leaving the fetch to the caller.
+
+    def _rank_by_vector(self, query_embedding, user_id: str, document_id: str, k: int):
+        # Add detailed logging for debugging
+        logger.info(f"Searching for documents with user_id='{user_id}' and document_id='{document_id}'")
+
+        index = self._get_index(user_id, document_id)
+        if index is None:
+            logger.warning(f"No documents found for user {user_id} and document {document_id}")
+            logger.warning(f"Query was looking for exact match on document_id: '{document_id}' (type: {type(document_id)})")
+            doc_ids = [doc["document_id"] for doc in self.catalog.list_for_user(user_id)]
+            logger.info(f"Available document IDs for user {user_id}: {doc_ids}")
+            return [], {}
+
+        # Single matrix op (IVF probe, or a scan over quantized codes plus rescoring) with argpartition top-k
+        chunk_ids, scores = self._vector_candidates(index, query_embedding, k)
+        chunk_ids = [str(chunk_id) for chunk_id in chunk_ids]
+        return chunk_ids, {"similarity_score": dict(zip(chunk_ids, scores))}
+
+    def _rank_by_keywords(self, query: str, user_id: str, document_id: str, k: int):
+        index = self._get_lexical_index(user_id, document_id)
+        if index is None:
+            logger.warning(f"No lexical index for user {user_id} and document {document_id}")
+            return [], {}
+        chunk_ids, scores = index.search(query, k)
+        chunk_ids = [str(chunk_id) for chunk_id in chunk_ids]
+        return chunk_ids, {"bm25_score": dict(zip(chunk_ids, scores))}
+
+    def _rank_hybrid(self, query: str, query_embedding, user_id: str, document_id: str, k: int):
+        index = self._get_index(user_id, document_id)
+        lexical = self._get_lexical_index(user_id, document_id)
+        if index is None or lexical is None:
+            return self._rank_by_vector(query_embedding, user_id, document_id, k)
+
+        candidates = max(k, settings.HYBRID_CANDIDATES)
+        vector_ids, vector_scores = self._vector_candidates(index, query_embedding, candidates)
+        lexical_ids, lexical_scores = lexical.search(query, candidates)
+        vector_ids = [str(chunk_id) for chunk_id in vector_ids]
+        lexical_ids = [str(chunk_id) for chunk_id in lexical_ids]
+
+        fused = reciprocal_rank_fusion([vector_ids, lexical_ids], k=settings.RRF_K)[:k]
+        logger.info(f"Hybrid ranking fused {len(vector_ids)} vector and {len(lexical_ids)} keyword candidates")
+        return [chunk_id for chunk_id, _ in fused], {
+            "rrf_score": dict(fused),
+            "similarity_score": dict(zip(vector_ids, vector_scores)),
+            "bm25_score": dict(zip(lexical_ids, lexical_scores)),
+        }
+
+    def _rank(self, query: str, query_embedding, user_id: str, document_id: str, k: int):
+        """Ranks with the retrieval mode configured by RETRIEVAL_MODE."""
+        with timed("similarity"):
+            if settings.RETRIEVAL_MODE == "hybrid":
+                return self._rank_hybrid(query, query_embedding, user_id, document_id, k)
+            return self._rank_by_vector(query_embedding, user_id, document_id, k)
+
+    # Multi-document retrieval: each document's vector and BM25 indexes form one shard.
+    # A query takes the best candidates from every shard in scope (in memory) and
+    # merges them into a global top-k; the winners are fetched in a single query.
+
+    def _get_shards(self, user_id: str, document_ids: list[str]) -> list[tuple]:
+        """Returns (vector index, BM25 index) per document, loading uncached ones concurrently."""
+        cold = [
+            document_id for document_id in document_ids
+            if self.index_cache.get(document_id) is None or self.lexical_cache.get(document_id) is None
+        ]
+        if len(cold) > 1:
+            list(self._shard_loader.map(
+                lambda document_id: (self._get_index(user_id, document_id), self._get_lexical_index(user_id, document_id)),
+                cold,
+            ))
+        return [
+            (self._get_index(user_id, document_id), self._get_lexical_index(user_id, document_id))
+            for document_id in document_ids
+        ]
+
+    @staticmethod
+    def _merge_top_k(shard_results, k: int):
+        """Merges per-shard (chunk_ids, scores), each best first, into the global k best."""
+        ids, scores = [], []
+        for shard_ids, shard_scores in shard_results:
+            ids.append(np.asarray(shard_ids, dtype=str))
+            scores.append(np.asarray(shard_scores, dtype=np.float32))
+        if not ids:
+            return [], np.empty(0, dtype=np.float32)
+        ids, scores = np.concatenate(ids), np.concatenate(scores)
+        winners = top_k(scores, k)
+        return [str(chunk_id) for chunk_id in ids[winners]], scores[winners]
+
+    def _rank_across(self, query: str, query_embedding, shards: list[tuple], k: int):
+        """
+        Ranks chunks across shards. Cosine scores are comparable between shards; BM25
+        scores use each document's own term statistics, which is close enough to merge
+        the keyword candidates before they are fused with the vector ones.
+        """
+        hybrid = settings.RETRIEVAL_MODE == "hybrid"
+        candidates = max(k, settings.HYBRID_CANDIDATES) if hybrid else k
+        with timed("similarity"):
+            vector_ids, vector_scores = self._vector_candidates_across(
+                [index for index, _ in shards], query_embedding, candidates,
+            )
+            if not hybrid:
+                return vector_ids, {"similarity_score": dict(zip(vector_ids, vector_scores))}
+            lexical_ids, lexical_scores = self._merge_top_k(
+                (lexical.search(query, candidates) for _, lexical in shards if lexical is not None),
+                candidates,
+            )
+            fused = reciprocal_rank_fusion([vector_ids, lexical_ids], k=settings.RRF_K)[:k]
+        return [chunk_id for chunk_id, _ in fused], {
+            "rrf_score": dict(fused),
+            "similarity_score": dict(zip(vector_ids, vector_scores)),
+            "bm25_score": dict(zip(lexical_ids, lexical_scores)),
+        }
+
+    async def aretrieve_across(self, queries: list[str], user_id: str, document_ids: list[str], k: int = 5) -> list[list[Document]]:
+        """
+        Retrieves the top k chunks for each query across several of a user's documents.
+        The queries are embedded together through the micro-batcher, shards are
+        resolved once, and all winning chunks are fetched in one round trip.
+        """
+        if not document_ids or not queries:
+            return [[] for _ in queries]
+        embeddings = await asyncio.gather(*(self.aembed_query(query) for query in queries))
+
+        def rank_all():
+            shards = self._get_shards(user_id, document_ids)
+            return [self._rank_across(query, embedding, shards, k) for query, embedding in zip(queries, embeddings)]
+
+        rankings = await run_in_threadpool(rank_all)
+        chunk_ids = list(dict.fromkeys(chunk_id for ids, _ in rankings for chunk_id in ids))
+        if not chunk_ids:
+            return [[] for _ in queries]
+        with timed("mongo_read"):
+            cursor = self.async_collection.find(self._chunk_query(chunk_ids, user_id, document_ids), {"embedding": 0})
+            results = await cursor.to_list(length=None)
+        return [self._to_documents(ids, results, scores) for ids, scores in rankings]
+
+    def similarity_search_by_vector(self, query_embedding, user_id: str, document_id: str, k: int = 5) -> list[Document]:
+        """
+        Returns the k chunks of a document most similar to an already computed query embedding.
+        """
+        chunk_ids, scores = self._rank_by_vector(query_embedding, user_id, document_id, k)
+        top_docs = self._fetch_chunks(chunk_ids, user_id, document_id, scores)
+
+        logger.info(f"Retrieved {len(top_docs)} similar documents")
+        if top_docs:
+            logger.debug(f"Top similarity score: {top_docs[0].metadata.get('similarity_score', 'N/A')}")
+        return top_docs
+
+    def lexical_search(self, query: str, user_id: str, document_id: str, k: int = 5) -> list[Document]:
+        """
+        Returns the k chunks of a document ranked by BM25 against the query's keywords.
+        """
+        chunk_ids, scores = self._rank_by_keywords(query, user_id, document_id, k)
+        return self._fetch_chunks(chunk_ids, user_id, document_id, scores)
+
+    def hybrid_search(self, query: str, query_embedding, user_id: str, document_id: str, k: int = 5) -> list[Document]:
+        """
+        Fuses the cosine and BM25 rankings of a document's chunks with reciprocal rank
+        fusion, so exact keyword matches (part numbers, error codes) that the embedding
+        misses still reach the top k.
+        """
+        chunk_ids, scores = self._rank_hybrid(query, query_embedding, user_id, document_id, k)
+        return self._fetch_chunks(chunk_ids, user_id, document_id, scores)
+
+    def search(self, query: str, query_embedding, user_id: str, document_id: str, k: int = 5) -> list[Document]:
+        """Runs the retrieval mode configured by RETRIEVAL_MODE for an already embedded query."""
+        chunk_ids, scores = self._rank(query, query_embedding, user_id, document_id, k)
+        return self._fetch_chunks(chunk_ids, user_id, document_id, scores)
+
+    def _text_search_fallback(self, query: str, user_id: str, document_id: str, k: int) -> list[Document]:
+        # Fall back to keyword search over the BM25 index if embedding or vector search fails
+        logger.warning("Falling back to BM25 keyword search")
+        return self.lexical_search(query, user_id, document_id, k)
+
     def get_retriever(self, user_id: str, document_id: str, k: int = 5):
         """
-        Returns a retriever that performs vector similarity search for a specific user and document.
+        Returns a retriever that searches one user's document using RETRIEVAL_MODE.
         
         Args:
             user_id: The user ID to filter documents
@@ -70,77 +891,51 @@ class MongoVectorStore:
         """
         def vector_similarity_retriever(query: str):
             try:
-                # Add detailed logging for debugging
-                logger.info(f"Searching for documents with user_id='{user_id}' and document_id='{document_id}'")
-                
-                # First, let's see what documents exist for this user
-                all_user_docs = list(self.collection.find({"metadata.user_id": user_id}))
-                logger.info(f"Found {len(all_user_docs)} total documents for user {user_id}")
-                
-                if all_user_docs:
-                    # Log the document IDs we have for this user
-                    doc_ids = [doc.get('metadata', {}).get('document_id', 'MISSING') for doc in all_user_docs]
-                    logger.info(f"Available document IDs for user {user_id}: {doc_ids}")
-                
                 # Embed the query using the same model used for document embeddings
                 query_embedding = self.embedding_model.embed_query(query)
-                
-                # Retrieve all documents for the user and document_id
-                results = list(self.collection.find({
-                    "metadata.user_id": user_id,
-                    "metadata.document_id": document_id
-                }))
-                
-                if not results:
-                    logger.warning(f"No documents found for user {user_id} and document {document_id}")
-                    logger.warning(f"Query was looking for exact match on document_id: '{document_id}' (type: {type(document_id)})")
-                    return []
-                
-                # Calculate similarity scores in Python (more reliable than MongoDB aggregation)
-                import numpy as np
-                
-                scored_docs = []
-                for result in results:
-                    doc_embedding = result['embedding']
-                    
-                    # Calculate cosine similarity (dot product for normalized vectors)
-                    similarity_score = np.dot(query_embedding, doc_embedding)
-                    
-                    # Add similarity score to metadata
-                    metadata = result['metadata'].copy()
-                    metadata['similarity_score'] = float(similarity_score)
-                    
-                    scored_docs.append({
-                        'document': Document(
-                            page_content=result['text'], 
-                            metadata=metadata
-                        ),
-                        'score': similarity_score
-                    })
-                
-                # Sort by similarity score (descending) and take top k
-                scored_docs.sort(key=lambda x: x['score'], reverse=True)
-                top_docs = [item['document'] for item in scored_docs[:k]]
-                
-                logger.info(f"Retrieved {len(top_docs)} similar documents for query: '{query[:50]}...'")
-                if top_docs:
-                    logger.debug(f"Top similarity score: {top_docs[0].metadata.get('similarity_score', 'N/A')}")
-                
-                return top_docs
-                
+                return self.search(query, query_embedding, user_id, document_id, k)
             except Exception as e:
                 logger.error(f"Error in vector similarity search: {e}")
-                # Fallback to simple text search if vector search fails
-                logger.warning("Falling back to simple text search")
-                results = self.collection.find({
-                    "metadata.user_id": user_id,
-                    "metadata.document_id": document_id,
-                    "text": {"$regex": query, "$options": "i"}  # Case-insensitive text search
-                }).limit(k)
-                
-                return [Document(page_content=r['text'], metadata=r['metadata']) for r in results]
-        
+                return self._text_search_fallback(query, user_id, document_id, k)
+
         return vector_similarity_retriever
 
-vector_store = MongoVectorStore()
+    async def aretrieve(self, query: str, user_id: str, document_id: str = None, k: int = 5, document_ids: list[str] = None, query_embedding=None) -> list[Document]:
+        """
+        Async retrieval for request handlers. The query is embedded through the
+        micro-batcher, so concurrent chat requests share forward passes; ranking runs
+        on a worker thread against the in-process indexes and the winning chunks are
+        fetched with the async client, so no Mongo round trip blocks the event loop.
+        Passing `document_ids` instead of `document_id` searches across those documents.
+        A `query_embedding` the caller already computed (e.g. for the answer cache) is
+        used instead of embedding the query again.
+        """
+        if document_ids is not None:
+            return (await self.aretrieve_across([query], user_id, document_ids, k))[0]
+        try:
+            if query_embedding is None:
+                query_embedding = await self.aembed_query(query)
+            chunk_ids, scores = await run_in_threadpool(self._rank, query, query_embedding, user_id, document_id, k)
+        except Exception as e:
+            logger.error(f"Error in vector similarity search: {e}")
+            logger.warning("Falling back to BM25 keyword search")
+            chunk_ids, scores = await run_in_threadpool(self._rank_by_keywords, query, user_id, document_id, k)
+        return await self._afetch_chunks(chunk_ids, user_id, document_id, scores)
+
+    def get_async_retriever(self, user_id: str, document_id: str, k: int = 5):
+        """
+        Async counterpart of get_retriever, bound to one user and document.
+        """
+        async def async_vector_similarity_retriever(query: str):
+            return await self.aretrieve(query, user_id=user_id, document_id=document_id, k=k)
+
+        return async_vector_similarity_retriever
+
+    async def aclose(self):
+        """Stops the query batcher (if it was started) and the shard loader, and closes the async client's connection pool."""
+        self._shard_loader.shutdown(wait=False)
+        if self._query_batcher is not None:
+            await self._query_batcher.close()
+        await self.async_client.close()
 
+vector_store = MongoVectorStore()
\ No newline at end of file
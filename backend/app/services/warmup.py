@@ -0,0 +1,40 @@
+import time
+from fastapi.concurrency import run_in_threadpool
+from loguru import logger
+
+
+class WarmupState:
+    """
+    Runs the startup warm-up steps (blocking callables, each on a worker thread) and
+    records their outcome for the readiness endpoint. Steps run in order; the first
+    failure stops the warm-up and leaves the process not ready.
+    """
+    def __init__(self):
+        self.status = "pending"
+        self.error = None
+        self.timings = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    async def run(self, steps: dict):
+        self.status = "running"
+        for name, step in steps.items():
+            started = time.perf_counter()
+            try:
+                await run_in_threadpool(step)
+            except Exception as e:
+                self.status, self.error = "failed", f"{name}: {e}"
+                logger.error(f"Warm-up step '{name}' failed: {e}")
+                return
+            self.timings[name] = round(time.perf_counter() - started, 3)
+            logger.info(f"Warm-up step '{name}' finished in {self.timings[name]}s")
+        self.status = "ready"
+        logger.success("Warm-up complete; the API is ready.")
+
+    def to_dict(self) -> dict:
+        return {"status": self.status, "error": self.error, "timings": self.timings}
+
+
+warmup_state = WarmupState()
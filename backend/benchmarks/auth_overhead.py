@@ -0,0 +1,85 @@
+"""
+Measures the authentication overhead per request under concurrent load. A pool of
+users each send many requests with their own HS256 token, the way a signed-in
+frontend reuses its session token:
+
+  - uncached: every request verifies the token's signature and claims.
+  - cached: `get_current_user` with the verified-token cache, so only the first
+    request of each token pays for verification.
+
+Requests are issued by `--concurrency` asyncio tasks on one event loop, as the API
+handles them. No service is contacted.
+
+Run from the backend directory:
+    python -m benchmarks.auth_overhead --users 200 --requests 20000 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+# The app settings require these; the benchmark never talks to any of the services.
+for _name in ("MONGO_CONNECTION_STRING", "GOOGLE_API_KEY", "SUPABASE_URL", "SUPABASE_KEY", "SUPABASE_ANON_KEY"):
+    os.environ.setdefault(_name, "benchmark")
+os.environ.setdefault("SUPABASE_JWT_SECRET", "benchmark-secret-benchmark-secret")
+
+from jose import jwt
+
+from app.core.config import settings
+from app.core.security import get_current_user, token_cache, verify_token
+
+
+def make_tokens(users: int) -> list[str]:
+    expires = int(time.time()) + 3600
+    return [
+        jwt.encode({"sub": f"user-{i}", "aud": "authenticated", "exp": expires}, settings.SUPABASE_JWT_SECRET, algorithm="HS256")
+        for i in range(users)
+    ]
+
+
+async def run(authenticate, tokens: list[str], requests: int, concurrency: int) -> float:
+    remaining = iter(range(requests))
+
+    async def worker():
+        for i in remaining:
+            await authenticate(tokens[i % len(tokens)])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+
+async def measure(users: int, requests: int, concurrency: int) -> list[dict]:
+    tokens = make_tokens(users)
+    results = []
+    for mode, authenticate in (("uncached", verify_token), ("cached", get_current_user)):
+        token_cache.clear()
+        elapsed = await run(authenticate, tokens, requests, concurrency)
+        results.append({
+            "mode": mode,
+            "us_per_request": round(elapsed / requests * 1e6, 1),
+            "requests_per_second": round(requests / elapsed, 1),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200, help="Distinct tokens.")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--json", dest="json_path", help="Optional path to write results as JSON.")
+    args = parser.parse_args()
+
+    settings.AUTH_TOKEN_CACHE_ENABLED = True
+    results = asyncio.run(measure(args.users, args.requests, args.concurrency))
+    for row in results:
+        print(f"{row['mode']:<9} us_per_request={row['us_per_request']:<10} requests_per_second={row['requests_per_second']}")
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
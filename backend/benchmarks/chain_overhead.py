@@ -0,0 +1,88 @@
+"""
+Measures per-request overhead of the RAG chain with a fake local LLM and a fixed
+in-memory retriever, so only chain construction and invocation are timed:
+
+  per-request  - the old path: build a retriever closure and a fresh Runnable graph
+                 with RAGPipeline.get_chain for every request, then ainvoke it
+  build-once   - the prebuilt RAGPipeline.chain, with user_id/document_id as input
+
+The two paths measure within run-to-run noise of each other (e.g. 2426 vs 2435
+us/request, and 2824 vs 2773 us/request in another run): building the Runnable graph
+per request was not a bottleneck, as invoking the chain dominates. Building it once is
+kept because it lets the chat paths share one LLM client and its connection pool,
+which this benchmark's fake model does not exercise.
+
+Run from the backend directory:
+    python -m benchmarks.chain_overhead --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+# The app settings require these; the benchmark never talks to any of the services.
+for _name in ("MONGO_CONNECTION_STRING", "GOOGLE_API_KEY", "SUPABASE_URL", "SUPABASE_KEY", "SUPABASE_JWT_SECRET", "SUPABASE_ANON_KEY"):
+    os.environ.setdefault(_name, "benchmark")
+
+from langchain.docstore.document import Document
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from app.services.rag_pipeline import RAGPipeline
+
+DOCS = [
+    Document(page_content=f"Chunk {i} of the handbook about maintenance intervals.", metadata={"page": i, "similarity_score": 0.9 - i / 10})
+    for i in range(5)
+]
+
+
+async def retrieve(question: str, user_id: str, document_id: str = None, query_embedding=None):
+    return DOCS
+
+
+async def per_request(pipeline: RAGPipeline, requests: int) -> float:
+    started = time.perf_counter()
+    for i in range(requests):
+        async def retriever(question, user_id=f"user-{i}", document_id="doc"):
+            return await retrieve(question, user_id, document_id)
+        chain = pipeline.get_chain(retriever)
+        await chain.ainvoke("What is the maintenance interval?")
+    return time.perf_counter() - started
+
+
+async def build_once(pipeline: RAGPipeline, requests: int) -> float:
+    started = time.perf_counter()
+    for i in range(requests):
+        await pipeline.chain.ainvoke({
+            "question": "What is the maintenance interval?",
+            "user_id": f"user-{i}",
+            "document_id": "doc",
+        })
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--json", dest="json_path", help="Optional path to write results as JSON.")
+    args = parser.parse_args()
+
+    llm = FakeListChatModel(responses=["The interval is 500 hours."])
+    pipeline = RAGPipeline(retriever=retrieve, llm=llm)
+
+    # Warm up both paths so import and first-call costs are excluded
+    asyncio.run(per_request(pipeline, 10))
+    asyncio.run(build_once(pipeline, 10))
+
+    results = {}
+    for name, run in (("per_request", per_request), ("build_once", build_once)):
+        seconds = asyncio.run(run(pipeline, args.requests))
+        results[name] = {"requests": args.requests, "us_per_request": round(seconds / args.requests * 1e6, 1)}
+        print(f"{name:<12} {results[name]['us_per_request']:>9.1f} us/request")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Compares the chunking profiles (app/services/chunking.py) on a fixed synthetic corpus
+of manuals: numbered sections with large-font headings, paragraphs, and ruled tables
+of part numbers, with facts planted in both prose and tables. For each profile and
+PDF engine it reports:
+
+  - chunks, mean/max tokens per chunk, and the share of chunks longer than the
+    embedding model's 256-token window (their tail is never embedded);
+  - parse+split and embedding time;
+  - retrieval hit@k: the share of questions about a planted fact for which one of
+    the top k chunks of the fact's document holds both the fact's key and its value,
+    with the vector index and with BM25.
+
+Embeddings come from the local sentence-transformers model, or with --embeddings hash
+from a deterministic hashing stand-in (vector hit rates are then meaningless, but
+chunk counts, sizes and BM25 hit rates are unchanged). No service is contacted.
+
+Run from the backend directory:
+    python -m benchmarks.chunking_profiles --pages 8 40 240 --json chunking.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+# The app settings require these; the benchmark never talks to any of the services.
+for _name in ("MONGO_CONNECTION_STRING", "GOOGLE_API_KEY", "SUPABASE_URL", "SUPABASE_KEY", "SUPABASE_JWT_SECRET", "SUPABASE_ANON_KEY"):
+    os.environ.setdefault(_name, "benchmark")
+
+import numpy as np
+import pymupdf
+
+from app.core.config import settings
+from app.services.chunking import MODEL_MAX_TOKENS, PROFILES, token_length
+from app.services.lexical_index import BM25Index
+from app.services.pdf_loader import ENGINES, PDFLoader
+from app.services.vector_index import build_index
+from benchmarks.pdf_parsing import WORDS
+
+COMPONENTS = ["impeller", "bearing housing", "shaft seal", "coupling", "inlet valve", "gear train"]
+UNITS = ["Orion", "Vega", "Lyra", "Draco", "Hydra", "Cygnus", "Aquila", "Carina"]
+TABLE_ROWS = 4
+
+
+def _filler(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _draw_table(page: pymupdf.Page, top: float, rows: list[list[str]]) -> float:
+    """Draws a ruled table at `top` and returns the y below it."""
+    widths, row_height, left = [150, 150, 150], 16, 50
+    for r, row in enumerate(rows):
+        y = top + r * row_height
+        x = left
+        for width, cell in zip(widths, row):
+            page.insert_text((x + 4, y + 11), cell, fontsize=9)
+            x += width
+    bottom = top + len(rows) * row_height
+    right = left + sum(widths)
+    for r in range(len(rows) + 1):
+        page.draw_line((left, top + r * row_height), (right, top + r * row_height))
+    x = left
+    for width in [0] + widths:
+        x += width
+        page.draw_line((x, top), (x, bottom))
+    return bottom
+
+
+def make_corpus_pdf(path: str, pages: int, seed: int) -> list[dict]:
+    """
+    Writes a manual of `pages` pages, one numbered section per page, and returns the
+    planted facts as {"question", "key", "answer"}.
+    """
+    rng = random.Random(seed)
+    facts = []
+    with pymupdf.open() as pdf:
+        for page_number in range(pages):
+            page = pdf.new_page()
+            unit = f"{rng.choice(UNITS)}-{seed}{page_number:03d}"
+            component = rng.choice(COMPONENTS)
+            torque = rng.randint(12, 480)
+            page.insert_text((50, 60), f"{page_number + 1}. Servicing the {unit} {component}", fontsize=15)
+            prose = (
+                f"{_filler(rng, 70)} The {component} of unit {unit} must be tightened to {torque} Nm. "
+                f"{_filler(rng, 60)}"
+            )
+            page.insert_textbox(pymupdf.Rect(50, 75, 545, 245), prose, fontsize=9)
+            facts.append({
+                "question": f"What torque is the {component} of unit {unit} tightened to?",
+                "key": unit, "answer": f"{torque} Nm",
+            })
+
+            page.insert_text((50, 270), f"{page_number + 1}.1 Service intervals", fontsize=15)
+            rows = [["Part", "Torque", "Interval"]]
+            for row in range(TABLE_ROWS):
+                part, interval = f"XK-{seed}{page_number:03d}{row}", rng.randint(50, 5000)
+                rows.append([part, f"{rng.randint(12, 480)} Nm", f"{interval} h"])
+                facts.append({
+                    "question": f"What is the service interval of part {part}?",
+                    "key": part, "answer": f"{interval} h",
+                })
+            bottom = _draw_table(page, 285, rows)
+
+            page.insert_text((50, bottom + 30), f"{page_number + 1}.2 Notes", fontsize=15)
+            page.insert_textbox(pymupdf.Rect(50, bottom + 45, 545, 800), "\n\n".join(_filler(rng, 90) for _ in range(4)), fontsize=9)
+        pdf.save(path)
+    return facts
+
+
+def _holds(text: str, fact: dict) -> bool:
+    text = " ".join(text.split())
+    return fact["key"] in text and fact["answer"] in text
+
+
+def load_embeddings(kind: str):
+    if kind == "hash":
+        from benchmarks.end_to_end import HashEmbeddings
+
+        return HashEmbeddings()
+    from app.services.embedding_server import load_local_model
+
+    return load_local_model()
+
+
+def evaluate(corpus: list[tuple[str, list[dict]]], profile: str, engine: str, embeddings, k: int) -> dict:
+    loader = PDFLoader(profile=profile, engine=engine)
+    count = token_length()
+    totals = {"chunks": 0, "split_seconds": 0.0, "embed_seconds": 0.0, "questions": 0, "vector_hits": 0, "bm25_hits": 0}
+    sizes = []
+    try:
+        for path, facts in corpus:
+            started = time.perf_counter()
+            chunks = list(loader.iter_chunks(loader.iter_pages(path)))
+            totals["split_seconds"] += time.perf_counter() - started
+            texts = [chunk.page_content for chunk in chunks]
+            ids = [str(i) for i in range(len(texts))]
+            sizes.extend(count(text) for text in texts)
+
+            started = time.perf_counter()
+            vectors = []
+            for batch_start in range(0, len(texts), settings.EMBEDDING_BATCH_SIZE):
+                vectors.extend(embeddings.embed_documents(texts[batch_start:batch_start + settings.EMBEDDING_BATCH_SIZE]))
+            totals["embed_seconds"] += time.perf_counter() - started
+
+            vector_index = build_index(ids, np.asarray(vectors, dtype=np.float32))
+            bm25 = BM25Index.build(ids, texts)
+            for fact in facts:
+                vector_ids, _ = vector_index.search(embeddings.embed_query(fact["question"]), k)
+                bm25_ids, _ = bm25.search(fact["question"], k)
+                totals["vector_hits"] += any(_holds(texts[int(i)], fact) for i in vector_ids)
+                totals["bm25_hits"] += any(_holds(texts[int(i)], fact) for i in bm25_ids)
+            totals["questions"] += len(facts)
+            totals["chunks"] += len(chunks)
+    finally:
+        loader.shutdown()
+
+    return {
+        "profile": profile,
+        "engine": engine,
+        "chunks": totals["chunks"],
+        "mean_tokens": round(statistics.mean(sizes), 1) if sizes else 0,
+        "max_tokens": max(sizes, default=0),
+        "over_window": round(sum(size > MODEL_MAX_TOKENS - 2 for size in sizes) / max(len(sizes), 1), 3),
+        "split_seconds": round(totals["split_seconds"], 3),
+        "embed_seconds": round(totals["embed_seconds"], 3),
+        f"vector_hit@{k}": round(totals["vector_hits"] / totals["questions"], 3),
+        f"bm25_hit@{k}": round(totals["bm25_hits"] / totals["questions"], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[8, 40, 240], help="Page count of each corpus document.")
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=ENGINES)
+    parser.add_argument("--embeddings", choices=["local", "hash"], default="local")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--json", dest="json_path", help="Optional path to write results as JSON.")
+    args = parser.parse_args()
+
+    embeddings = load_embeddings(args.embeddings)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = []
+        for seed, pages in enumerate(args.pages):
+            path = os.path.join(tmp, f"manual_{pages}.pdf")
+            corpus.append((path, make_corpus_pdf(path, pages, seed)))
+        for engine in args.engines:
+            for profile in args.profiles:
+                row = evaluate(corpus, profile, engine, embeddings, args.k)
+                results.append(row)
+                print("  ".join(f"{key}={value}" for key, value in row.items()))
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Measures how much prompt context the ContextPacker saves. Synthetic pages are split
+with the ingestion splitter (1000 chars, 100 overlap); each simulated question
+"retrieves" CONTEXT_CANDIDATES chunks clustered around one spot of the document, with
+some boilerplate repeated on every page, which is what top-k retrieval over
+overlapping chunks tends to return. Reports estimated prompt tokens for the old
+format (top 5, concatenated), for all candidates concatenated, and for the packed
+context, plus packing time.
+
+Run from the backend directory:
+    python -m benchmarks.context_packing --questions 500
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+# The app settings require these; the benchmark never talks to any of the services.
+for _name in ("MONGO_CONNECTION_STRING", "GOOGLE_API_KEY", "SUPABASE_URL", "SUPABASE_KEY", "SUPABASE_JWT_SECRET", "SUPABASE_ANON_KEY"):
+    os.environ.setdefault(_name, "benchmark")
+
+from langchain.docstore.document import Document
+from app.core.config import settings
+from app.services.context_packer import ContextPacker
+from app.services.llm import estimate_tokens
+from app.services.pdf_loader import PDFLoader
+
+WORDS = "pump valve pressure seal bearing torque inspection interval filter housing gasket lubricant shaft coupling".split()
+BOILERPLATE = "Confidential maintenance manual. Refer to the safety notice before servicing any equipment. "
+
+
+def make_pages(pages: int, rng: random.Random) -> list[Document]:
+    documents = []
+    for page in range(pages):
+        sentences = [
+            " ".join(rng.choice(WORDS) for _ in range(12)).capitalize() + f" (ref {page}-{i})."
+            for i in range(40)
+        ]
+        text = BOILERPLATE * 2 + " ".join(sentences)
+        documents.append(Document(page_content=text, metadata={"document_id": "doc", "page": page}))
+    return documents
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("--candidates", type=int, default=settings.CONTEXT_CANDIDATES)
+    parser.add_argument("--budget", type=int, default=settings.CONTEXT_TOKEN_BUDGET)
+    parser.add_argument("--json", dest="json_path", help="Optional path to write results as JSON.")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    chunks = list(PDFLoader().iter_chunks(make_pages(args.pages, rng)))
+    packer = ContextPacker(token_budget=args.budget, mmr_lambda=settings.CONTEXT_MMR_LAMBDA)
+
+    baseline_tokens, candidate_tokens, packed_tokens, packing_seconds = 0, 0, 0, 0.0
+    for _ in range(args.questions):
+        # Neighbouring chunks around one spot, plus a boilerplate-heavy chunk from elsewhere
+        center = rng.randrange(len(chunks))
+        neighbours = [chunks[i] for i in range(max(center - 3, 0), min(center + 4, len(chunks)))]
+        rng.shuffle(neighbours)
+        retrieved = (neighbours + [chunks[rng.randrange(len(chunks))]])[:args.candidates]
+
+        baseline_tokens += sum(estimate_tokens(doc.page_content) for doc in retrieved[:5])
+        candidate_tokens += sum(estimate_tokens(doc.page_content) for doc in retrieved)
+        started = time.perf_counter()
+        packed = packer.pack(retrieved)
+        packing_seconds += time.perf_counter() - started
+        packed_tokens += sum(estimate_tokens(doc.page_content) for doc in packed)
+
+    results = {
+        "questions": args.questions,
+        "baseline_top5_tokens_per_question": round(baseline_tokens / args.questions, 1),
+        "candidate_tokens_per_question": round(candidate_tokens / args.questions, 1),
+        "packed_tokens_per_question": round(packed_tokens / args.questions, 1),
+        "packing_us_per_question": round(packing_seconds / args.questions * 1e6, 1),
+    }
+    for name, value in results.items():
+        print(f"{name:<36} {value}")
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
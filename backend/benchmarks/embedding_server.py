@@ -0,0 +1,105 @@
+"""
+Compares N worker processes that each load the embedding model ("local") with N
+workers sharing one EmbeddingServer over a Unix socket ("shared"). Every worker
+embeds the same number of short queries in batches, concurrently with the others.
+Reports the combined resident memory of all processes involved and the aggregate
+embedding throughput.
+
+Memory is read from /proc, so this runs on Linux only.
+
+Run from the backend directory:
+    python -m benchmarks.embedding_server --workers 4 --queries 2000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+# The app settings require these; the benchmark never talks to any of the services.
+for _name in ("MONGO_CONNECTION_STRING", "GOOGLE_API_KEY", "SUPABASE_URL", "SUPABASE_KEY", "SUPABASE_JWT_SECRET", "SUPABASE_ANON_KEY"):
+    os.environ.setdefault(_name, "benchmark")
+
+from app.services.embedding_server import EmbeddingServer, RemoteEmbeddings, load_local_model
+
+
+def rss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def run_server(address: str):
+    EmbeddingServer(load_local_model(), address).serve_forever()
+
+
+def run_worker(mode: str, address: str, queries: int, batch_size: int, ready, start, done):
+    model = load_local_model() if mode == "local" else RemoteEmbeddings(address)
+    model.embed_query("warm-up")
+    ready.set()
+    start.wait()
+    texts = [f"What does section {i} say about maintenance intervals?" for i in range(queries)]
+    for offset in range(0, queries, batch_size):
+        model.embed_documents(texts[offset:offset + batch_size])
+    done.put(os.getpid())
+    # Stay alive so the parent can read this process's memory
+    time.sleep(3600)
+
+
+def measure(mode: str, workers: int, queries: int, batch_size: int) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    address = os.path.join(tempfile.mkdtemp(), "embedding.sock")
+    processes = []
+    if mode == "shared":
+        processes.append(ctx.Process(target=run_server, args=(address,), daemon=True))
+        processes[0].start()
+
+    start, done = ctx.Event(), ctx.Queue()
+    readies = []
+    for _ in range(workers):
+        ready = ctx.Event()
+        process = ctx.Process(target=run_worker, args=(mode, address, queries, batch_size, ready, start, done), daemon=True)
+        process.start()
+        processes.append(process)
+        readies.append(ready)
+    for ready in readies:
+        ready.wait()
+
+    started = time.perf_counter()
+    start.set()
+    for _ in range(workers):
+        done.get()
+    elapsed = time.perf_counter() - started
+
+    rss = sum(rss_bytes(process.pid) for process in processes)
+    for process in processes:
+        process.terminate()
+    return {
+        "mode": mode,
+        "processes": len(processes),
+        "total_rss_mb": round(rss / 1e6, 1),
+        "texts_per_second": round(workers * queries / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=2000, help="Texts embedded by each worker.")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--json", dest="json_path", help="Optional path to write results as JSON.")
+    args = parser.parse_args()
+
+    results = [measure(mode, args.workers, args.queries, args.batch_size) for mode in ("local", "shared")]
+    for row in results:
+        print(f"{row['mode']:<8} processes={row['processes']:<3} total_rss_mb={row['total_rss_mb']:<10} texts_per_second={row['texts_per_second']}")
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""
+End-to-end benchmark and load test of the API, driven in-process through httpx's
+ASGI transport (lifespan included) with local stand-ins for the external services:
+
+  - LLM: a fake chat model with a configurable generation delay instead of Gemini.
+  - MongoDB: mongomock (requires `pip install mongomock`), or a real server with
+    --mongo-uri. The app writes to its usual database, so point it at a throwaway
+    mongod, never at production data.
+  - Embeddings: the real sentence-transformers model, or --embeddings hash for a
+    deterministic hashing stand-in when only the rest of the stack is of interest.
+  - Auth: the token check is overridden; each simulated user is its own subject.
+
+Phases:
+  upload - POST synthetic PDFs of --pages pages and poll their jobs until done;
+           reports pages/sec and chunks/sec over the whole batch.
+  chat   - POST /chat at each --concurrency level against the uploaded documents;
+           reports p50/p95/p99 latency and requests/sec. The answer cache is off
+           by default so every request runs retrieval and the LLM.
+
+Peak RSS of the process is recorded after each phase. Results (with the git commit)
+are written as JSON by --json; --compare prints the change against an earlier run.
+
+Run from the backend directory:
+    python -m benchmarks.end_to_end --documents 4 --pages 50 --concurrency 1 8 32 --json e2e.json
+    python -m benchmarks.end_to_end --compare e2e.json
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# The app settings require these; with the stand-ins none of the services is contacted.
+# The Supabase URL still has to parse.
+os.environ.setdefault("MONGO_CONNECTION_STRING", "mongodb://localhost:27017")
+os.environ.setdefault("SUPABASE_URL", "https://benchmark.supabase.co")
+for _name in ("GOOGLE_API_KEY", "SUPABASE_KEY", "SUPABASE_JWT_SECRET", "SUPABASE_ANON_KEY"):
+    os.environ.setdefault(_name, "benchmark")
+# Warm-up is done explicitly (without the Supabase client), and caches that would turn
+# repeated runs into cache hits are off unless the environment says otherwise
+os.environ.setdefault("WARMUP_ON_STARTUP", "false")
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from loguru import logger
+
+from benchmarks.pdf_parsing import make_synthetic_pdf
+
+QUESTIONS = [
+    "What is the torque specification for the pump valve assembly?",
+    "How often should the bearing housing be inspected?",
+    "Which section describes the seal clearance procedure?",
+    "What does the warranty say about maintenance intervals?",
+    "Summarize the inspection procedure for the housing.",
+]
+
+
+class FakeGemini(FakeListChatModel):
+    """Stand-in for the Gemini chat model that waits `latency` seconds per call."""
+    latency: float = 0.0
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._generate(messages, stop=stop, **kwargs)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        for chunk in self._stream(messages, stop=stop, **kwargs):
+            yield chunk
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic unit vectors derived from a hash of the text; no model is loaded."""
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimensions)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+def use_mongomock():
+    """Points pymongo's sync and async clients at one shared in-memory mongomock server."""
+    import mongomock
+    import mongomock.gridfs
+    import pymongo
+    from benchmarks.mongo_load import AsyncMongomockDatabase
+
+    mongomock.gridfs.enable_gridfs_integration()
+    # Recent pymongo passes `sort` to bulk updates, which mongomock does not accept yet
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+    mongomock.collection.BulkOperationBuilder.add_update = (
+        lambda self, *args, sort=None, **kwargs: add_update(self, *args, **kwargs)
+    )
+    client = mongomock.MongoClient()
+
+    class AsyncMongomockClient:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def get_database(self, name):
+            return AsyncMongomockDatabase(client.get_database(name))
+
+        async def close(self):
+            pass
+
+    pymongo.MongoClient = lambda *args, **kwargs: client
+    pymongo.AsyncMongoClient = AsyncMongomockClient
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1e6 if sys.platform == "darwin" else 1e3), 1)
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run_uploads(client, args, pdf_dir: str) -> tuple[dict, list[tuple[str, str]]]:
+    """Uploads --documents PDFs concurrently and waits for their ingestion jobs."""
+    paths = []
+    for i in range(args.documents):
+        path = os.path.join(pdf_dir, f"manual-{i}.pdf")
+        # A different seed per file, so no upload is deduplicated against another
+        make_synthetic_pdf(path, args.pages, seed=i + 1)
+        paths.append(path)
+
+    async def upload(i: int, path: str) -> tuple[str, str, dict]:
+        user_id = f"bench-user-{i % args.users}"
+        with open(path, "rb") as f:
+            response = await client.post(
+                "/api/v1/upload",
+                files={"file": (os.path.basename(path), f, "application/pdf")},
+                headers={"X-Bench-User": user_id},
+            )
+        response.raise_for_status()
+        body = response.json()
+        while True:
+            job = (await client.get(f"/api/v1/jobs/{body['job_id']}", headers={"X-Bench-User": user_id})).json()
+            if job["status"] in ("completed", "failed"):
+                break
+            await asyncio.sleep(args.poll_interval)
+        if job["status"] == "failed":
+            raise RuntimeError(f"Ingestion of {path} failed: {job['error']}")
+        return user_id, body["document_id"], job
+
+    started = time.perf_counter()
+    done = await asyncio.gather(*(upload(i, path) for i, path in enumerate(paths)))
+    elapsed = time.perf_counter() - started
+
+    chunks = sum(job["chunk_count"] for _, _, job in done)
+    pages = args.documents * args.pages
+    result = {
+        "documents": args.documents,
+        "pages": pages,
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(pages / elapsed, 1),
+        "chunks_per_second": round(chunks / elapsed, 1),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    return result, [(user_id, document_id) for user_id, document_id, _ in done]
+
+
+async def run_chat(client, documents: list[tuple[str, str]], requests: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        nonlocal errors
+        user_id, document_id = documents[i % len(documents)]
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(
+                "/api/v1/chat",
+                json={"question": f"{QUESTIONS[i % len(QUESTIONS)]} ({i})", "document_id": document_id},
+                headers={"X-Bench-User": user_id},
+            )
+            latencies.append(time.perf_counter() - started)
+            errors += response.status_code != 200
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "requests_per_second": round(requests / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def run_benchmark(args) -> dict:
+    import httpx
+    from fastapi import Request
+    from app.api.v1 import chat
+    from app.core.security import get_current_user
+    from app.main import app
+    from app.services import rag_pipeline
+    from app.services.vector_store import vector_store
+
+    def bench_user(request: Request) -> dict:
+        return {"sub": request.headers.get("X-Bench-User", "bench-user-0")}
+
+    app.dependency_overrides[get_current_user] = bench_user
+    # RAGPipeline looks the model up when the shared pipeline is first built
+    fake_llm = FakeGemini(responses=["The interval is 500 operating hours (see section 4)."], latency=args.llm_latency_ms / 1000)
+    rag_pipeline.get_chat_model = lambda *args, **kwargs: fake_llm
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        # The lifespan configures logging at INFO; per-request lines would swamp the results
+        logger.remove()
+        logger.add(sys.stderr, level="WARNING")
+        if args.embeddings == "hash":
+            vector_store._embedding_model = HashEmbeddings()
+        started = time.perf_counter()
+        await asyncio.to_thread(vector_store.warm_up)
+        chat.get_rag_pipeline()
+        results["warmup_seconds"] = round(time.perf_counter() - started, 3)
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            with tempfile.TemporaryDirectory() as pdf_dir:
+                results["upload"], documents = await run_uploads(client, args, pdf_dir)
+            print(
+                f"upload   {results['upload']['pages']} pages, {results['upload']['chunks']} chunks in "
+                f"{results['upload']['seconds']}s: {results['upload']['pages_per_second']} pages/s, "
+                f"{results['upload']['chunks_per_second']} chunks/s"
+            )
+
+            # One untimed round so the first-request costs are not attributed to a level
+            await run_chat(client, documents, min(args.requests, 10), 1)
+            results["chat"] = []
+            for concurrency in args.concurrency:
+                row = await run_chat(client, documents, args.requests, concurrency)
+                results["chat"].append(row)
+                print(
+                    f"chat     c={concurrency:<4} {row['requests_per_second']:>8.1f} req/s  p50 {row['p50_ms']:>8.2f} ms  "
+                    f"p95 {row['p95_ms']:>8.2f} ms  p99 {row['p99_ms']:>8.2f} ms  errors {row['errors']}"
+                )
+    results["peak_rss_mb"] = peak_rss_mb()
+    print(f"peak RSS {results['peak_rss_mb']} MB")
+    return results
+
+
+def compare(current: dict, baseline: dict):
+    """Prints the relative change of the headline metrics against a baseline run."""
+    def change(new, old) -> str:
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    print(f"\nchange vs {baseline.get('commit') or 'baseline'}:")
+    for metric in ("pages_per_second", "chunks_per_second"):
+        print(f"  upload {metric:<20} {change(current['upload'][metric], baseline['upload'][metric])}")
+    baseline_chat = {row["concurrency"]: row for row in baseline.get("chat", [])}
+    for row in current["chat"]:
+        old = baseline_chat.get(row["concurrency"])
+        if old is None:
+            continue
+        print(
+            f"  chat c={row['concurrency']:<4} req/s {change(row['requests_per_second'], old['requests_per_second'])}  "
+            + "  ".join(f"{p} {change(row[p], old[p])}" for p in ("p50_ms", "p95_ms", "p99_ms"))
+        )
+    print(f"  peak_rss_mb {change(current['peak_rss_mb'], baseline['peak_rss_mb'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", help="Use a real (throwaway) MongoDB server instead of mongomock.")
+    parser.add_argument("--embeddings", choices=("local", "hash"), default="local")
+    parser.add_argument("--documents", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=50, help="Pages per synthetic PDF.")
+    parser.add_argument("--users", type=int, default=2, help="Simulated users the documents are spread over.")
+    parser.add_argument("--requests", type=int, default=200, help="Chat requests per concurrency level.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="Simulated LLM generation time per call.")
+    parser.add_argument("--poll-interval", type=float, default=0.05, help="Seconds between job status polls.")
+    parser.add_argument("--json", dest="json_path", help="Optional path to write results as JSON.")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare against.")
+    args = parser.parse_args()
+
+    if args.mongo_uri:
+        os.environ["MONGO_CONNECTION_STRING"] = args.mongo_uri
+    else:
+        use_mongomock()
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {name: value for name, value in vars(args).items() if name not in ("json_path", "compare")},
+        **asyncio.run(run_benchmark(args)),
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
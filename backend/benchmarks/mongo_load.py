@@ -0,0 +1,253 @@
+"""
+Load test for the MongoDB access path of the chat hot path: a document ownership
+lookup in the catalog followed by fetching the top-k chunks by _id, as done for
+every chat request. Each simulated request runs the two queries in one of three ways:
+
+  blocking    - sync pymongo called directly inside the coroutine (the old behaviour)
+  threadpool  - sync pymongo offloaded with run_in_threadpool
+  async       - the pymongo async client, as used by the request handlers now
+
+and reports latency percentiles, throughput and the worst event-loop stall observed
+by a heartbeat task (how long any other request would have been frozen).
+
+Against a real local mongod:
+    python -m benchmarks.mongo_load --mongo-uri mongodb://localhost:27017 --concurrency 64
+
+Without a server, mongomock is used as an in-memory stand-in with a simulated network
+round trip per operation (requires `pip install mongomock`):
+    python -m benchmarks.mongo_load --latency-ms 2 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+# The app settings require these; only the Mongo URI matters here.
+for _name in ("MONGO_CONNECTION_STRING", "GOOGLE_API_KEY", "SUPABASE_URL", "SUPABASE_KEY", "SUPABASE_JWT_SECRET", "SUPABASE_ANON_KEY"):
+    os.environ.setdefault(_name, "benchmark")
+
+from bson import ObjectId
+from fastapi.concurrency import run_in_threadpool
+from loguru import logger
+from app.services.document_catalog import DocumentCatalog
+
+DATABASE = "chat_with_pdf_load_test"
+
+
+class _LatencyCollection:
+    """Sync mongomock collection that sleeps for a simulated round trip per operation."""
+    def __init__(self, collection, latency: float):
+        self._collection = collection
+        self._latency = latency
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            time.sleep(self._latency)
+            result = attr(*args, **kwargs)
+            # Materialize cursors so the round trip is paid once, like a single batch
+            return list(result) if name == "find" else result
+        return call
+
+
+class _LatencyDatabase:
+    def __init__(self, db, latency: float):
+        self._db = db
+        self._latency = latency
+
+    def get_collection(self, name):
+        return _LatencyCollection(self._db.get_collection(name), self._latency)
+
+
+class _AsyncCursor:
+    def __init__(self, cursor, latency: float):
+        self._cursor = cursor
+        self._latency = latency
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    async def to_list(self, length=None):
+        await asyncio.sleep(self._latency)
+        return list(self._cursor)
+
+
+class AsyncMongomockCollection:
+    """
+    Async stand-in over a mongomock collection, covering the operations the async
+    request path uses. The simulated round trip is awaited, so it does not block the loop.
+    """
+    def __init__(self, collection, latency: float = 0.0):
+        self._collection = collection
+        self._latency = latency
+
+    def find(self, *args, **kwargs):
+        return _AsyncCursor(self._collection.find(*args, **kwargs), self._latency)
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            await asyncio.sleep(self._latency)
+            return attr(*args, **kwargs)
+        return call
+
+
+class AsyncMongomockDatabase:
+    def __init__(self, db, latency: float = 0.0):
+        self._db = db
+        self._latency = latency
+
+    def get_collection(self, name):
+        return AsyncMongomockCollection(self._db.get_collection(name), self._latency)
+
+
+def open_databases(args):
+    """Returns (sync db, async db) for a real server or the mongomock stand-in."""
+    if args.mongo_uri:
+        from pymongo import AsyncMongoClient, MongoClient
+        options = {"maxPoolSize": args.pool_size}
+        return (
+            MongoClient(args.mongo_uri, **options).get_database(DATABASE),
+            AsyncMongoClient(args.mongo_uri, **options).get_database(DATABASE),
+        )
+    import mongomock
+    db = mongomock.MongoClient().get_database(DATABASE)
+    latency = args.latency_ms / 1000
+    return _LatencyDatabase(db, latency), AsyncMongomockDatabase(db, latency)
+
+
+def seed(db, documents: int, chunks_per_document: int) -> list[tuple[str, str, list[ObjectId]]]:
+    catalog = DocumentCatalog(db)
+    chunks = db.get_collection("document_embeddings_local")
+    seeded = []
+    for i in range(documents):
+        user_id, document_id = f"user-{i % 10}", str(uuid.uuid4())
+        catalog.register(user_id, document_id, f"doc-{i}.pdf", chunk_count=chunks_per_document)
+        ids = [ObjectId() for _ in range(chunks_per_document)]
+        chunks.insert_many([
+            {
+                "_id": chunk_id,
+                "text": f"Chunk {j} of document {i}. " * 20,
+                "metadata": {"user_id": user_id, "document_id": document_id, "page": j},
+            }
+            for j, chunk_id in enumerate(ids)
+        ])
+        seeded.append((user_id, document_id, ids))
+    return seeded
+
+
+def chunk_query(user_id: str, document_id: str, ids: list[ObjectId]) -> dict:
+    return {"_id": {"$in": ids[:5]}, "metadata.user_id": user_id, "metadata.document_id": document_id}
+
+
+def make_request(mode: str, sync_db, async_db):
+    catalog = DocumentCatalog(sync_db, async_db)
+    sync_chunks = sync_db.get_collection("document_embeddings_local")
+    async_chunks = async_db.get_collection("document_embeddings_local")
+
+    def sync_request(user_id, document_id, ids):
+        catalog.get(user_id, document_id)
+        return list(sync_chunks.find(chunk_query(user_id, document_id, ids), {"embedding": 0}))
+
+    async def request(user_id, document_id, ids):
+        if mode == "blocking":
+            return sync_request(user_id, document_id, ids)
+        if mode == "threadpool":
+            return await run_in_threadpool(sync_request, user_id, document_id, ids)
+        await catalog.aget(user_id, document_id)
+        cursor = async_chunks.find(chunk_query(user_id, document_id, ids), {"embedding": 0})
+        return await cursor.to_list(length=None)
+
+    return request
+
+
+async def run_load(request, seeded, total: int, concurrency: int) -> dict:
+    latencies = []
+    max_stall = 0.0
+    stop = asyncio.Event()
+
+    async def heartbeat(interval: float = 0.001):
+        nonlocal max_stall
+        while not stop.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            max_stall = max(max_stall, time.perf_counter() - started - interval)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            await request(*seeded[i % len(seeded)])
+            latencies.append(time.perf_counter() - started)
+
+    monitor = asyncio.create_task(heartbeat())
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+        "max_loop_stall_ms": round(max_stall * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", help="Use a real MongoDB server instead of the mongomock stand-in.")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Simulated round trip per operation (mongomock only).")
+    parser.add_argument("--pool-size", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    # Kept small by default so mongomock's own query cost does not drown the simulated round trip
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--chunks", type=int, default=20, help="Chunks per seeded document.")
+    parser.add_argument("--modes", default="blocking,threadpool,async")
+    parser.add_argument("--json", dest="json_path", help="Optional path to write results as JSON.")
+    args = parser.parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    sync_db, async_db = open_databases(args)
+    seeded = seed(sync_db, args.documents, args.chunks)
+
+    # One event loop for all modes: the async client is bound to the loop it first runs on
+    async def run_modes():
+        results = {}
+        for mode in args.modes.split(","):
+            request = make_request(mode, sync_db, async_db)
+            results[mode] = r = await run_load(request, seeded, args.requests, args.concurrency)
+            print(
+                f"{mode:<10} {r['throughput_rps']:>9.1f} req/s  p50 {r['p50_ms']:>8.2f} ms  "
+                f"p95 {r['p95_ms']:>8.2f} ms  max loop stall {r['max_loop_stall_ms']:>8.2f} ms"
+            )
+        return results
+
+    try:
+        results = asyncio.run(run_modes())
+    finally:
+        if args.mongo_uri:
+            sync_db.client.drop_database(DATABASE)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compares PDF text extraction throughput (pages/sec) for each PDFLoader engine and
+parse worker count on synthetic multi-hundred-page PDFs.
+
+Run from the backend directory:
+    python -m benchmarks.pdf_parsing --pages 200 500 --workers 1 2 4
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import pymupdf
+from app.services.pdf_loader import ENGINES, PDFLoader
+
+WORDS = (
+    "pump valve assembly torque specification maintenance interval warranty "
+    "section figure table inspection procedure clearance bearing housing seal"
+).split()
+
+
+def make_synthetic_pdf(path: str, pages: int, words_per_page: int = 450, seed: int = 0):
+    """Writes a PDF with `pages` pages of deterministic pseudo-random text."""
+    state = seed
+    with pymupdf.open() as pdf:
+        for page_number in range(pages):
+            words = []
+            for _ in range(words_per_page):
+                state = (state * 1103515245 + 12345) % (2 ** 31)
+                words.append(WORDS[state % len(WORDS)])
+            page = pdf.new_page()
+            page.insert_textbox(
+                pymupdf.Rect(50, 50, 545, 790),
+                f"Section {page_number + 1}\n" + " ".join(words),
+                fontsize=9,
+            )
+        pdf.save(path)
+
+
+def run(file_path: str, engine: str, workers: int, repeat: int) -> dict:
+    loader = PDFLoader(engine=engine, workers=workers)
+    try:
+        # One untimed pass so process spawn and worker imports are not attributed to parsing
+        if workers > 1:
+            sum(1 for _ in loader.iter_pages(file_path))
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            pages = sum(1 for _ in loader.iter_pages(file_path))
+            timings.append(time.perf_counter() - started)
+        best = min(timings)
+        return {"engine": engine, "workers": workers, "pages": pages, "seconds": round(best, 4), "pages_per_sec": round(pages / best, 1)}
+    finally:
+        loader.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[200, 500])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=ENGINES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", dest="json_path", help="Optional path to write results as JSON.")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in args.pages:
+            path = os.path.join(tmp, f"synthetic_{pages}.pdf")
+            make_synthetic_pdf(path, pages)
+            for engine in args.engines:
+                for workers in args.workers:
+                    result = run(path, engine, workers, args.repeat)
+                    results.append(result)
+                    print(f"{pages:>5} pages  {engine:<8} workers={workers:<2} {result['pages_per_sec']:>9.1f} pages/sec")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
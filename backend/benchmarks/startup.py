@@ -0,0 +1,97 @@
+"""
+Measures API startup cost. Each run is a fresh interpreter, so nothing is cached
+between measurements:
+
+  - import: `import app.main`, which is what uvicorn pays before it can answer a
+    liveness probe. Resources are lazy, so this loads no model and opens no
+    connection.
+  - eager: the import plus loading everything the old module-level singletons built
+    at import time (embedding model, RAG chain with its Gemini client, Supabase
+    client), i.e. the startup cost before resources became lazy, and roughly the
+    warm-up time before /readyz turns 200.
+
+Also lists the slowest modules of one `python -X importtime` import. MongoDB is never
+contacted; the connection string only has to parse.
+
+Run from the backend directory:
+    python -m benchmarks.startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# The app settings require these; the benchmark never talks to any of the services.
+# The connection string and the Supabase URL still have to parse.
+os.environ.setdefault("MONGO_CONNECTION_STRING", "mongodb://localhost:27017")
+os.environ.setdefault("SUPABASE_URL", "https://benchmark.supabase.co")
+for _name in ("GOOGLE_API_KEY", "SUPABASE_KEY", "SUPABASE_JWT_SECRET", "SUPABASE_ANON_KEY"):
+    os.environ.setdefault(_name, "benchmark")
+
+IMPORT_ONLY = "import app.main"
+EAGER = (
+    "import app.main\n"
+    "from app.api.v1.chat import get_rag_pipeline\n"
+    "from app.core.security import get_supabase_client\n"
+    "from app.services.vector_store import vector_store\n"
+    "vector_store.embedding_model.embed_query('warm-up')\n"
+    "get_rag_pipeline()\n"
+    "get_supabase_client()\n"
+)
+
+
+def time_subprocess(code: str) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True, capture_output=True)
+    return time.perf_counter() - started
+
+
+def slowest_imports(limit: int) -> list[dict]:
+    """Parses `-X importtime` output (microseconds, cumulative per top-level import)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_ONLY],
+        check=True, capture_output=True, text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append({"module": name.strip(), "cumulative_ms": round(int(cumulative) / 1000, 1)})
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to list.")
+    parser.add_argument("--skip-eager", action="store_true", help="Only time the lazy import.")
+    parser.add_argument("--json", dest="json_path", help="Optional path to write results as JSON.")
+    args = parser.parse_args()
+
+    # The first run also fills the bytecode and model caches; it is not counted
+    time_subprocess(IMPORT_ONLY)
+    import_times = [time_subprocess(IMPORT_ONLY) for _ in range(args.runs)]
+    results = {"runs": args.runs, "import_seconds_median": round(statistics.median(import_times), 3)}
+    if not args.skip_eager:
+        time_subprocess(EAGER)
+        eager_times = [time_subprocess(EAGER) for _ in range(args.runs)]
+        results["eager_seconds_median"] = round(statistics.median(eager_times), 3)
+
+    for name, value in results.items():
+        print(f"{name:<24} {value}")
+    results["slowest_imports"] = slowest_imports(args.top)
+    print("\nslowest imports (cumulative ms):")
+    for row in results["slowest_imports"]:
+        print(f"  {row['cumulative_ms']:>9}  {row['module']}")
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import bson
+import gridfs
+from pymongo import MongoClient, UpdateOne
+from app.core.config import settings
+from app.services.embedding_codec import STORAGE_FORMATS, decode_embedding, encode_embedding
+
+# Rewrites the embeddings in document_embeddings_local into EMBEDDING_STORAGE_FORMAT
+# (packed float32 BSON vectors by default), in batches and resumably: chunks already
+# in the target format are skipped.
+#
+#   python migrate_embeddings.py --dry-run
+#   python migrate_embeddings.py --batch-size 500
+#   python migrate_embeddings.py --drop-indexes   # after changing VECTOR_INDEX_QUANTIZATION
+
+
+def is_target_format(value, storage_format: str) -> bool:
+    if storage_format == "list":
+        return isinstance(value, list)
+    return not isinstance(value, list)
+
+
+def migrate(storage_format: str, batch_size: int, dry_run: bool) -> dict:
+    client = MongoClient(settings.MONGO_CONNECTION_STRING)
+    collection = client.get_database("chat_with_pdf_db").get_collection("document_embeddings_local")
+
+    # Legacy chunks store a BSON array; packed ones a BSON binary
+    source_type = "binData" if storage_format == "list" else "array"
+    query = {"embedding": {"$type": source_type}}
+    total = collection.count_documents(query)
+    print(f"{total} chunks to convert to '{storage_format}'" + (" (dry run)" if dry_run else ""))
+
+    converted, bytes_before, bytes_after = 0, 0, 0
+    updates = []
+    for chunk in collection.find(query, {"embedding": 1}, batch_size=batch_size):
+        value = chunk["embedding"]
+        if is_target_format(value, storage_format):
+            continue
+        encoded = encode_embedding(decode_embedding(value), storage_format)
+        # BSON arrays spend a type tag and a decimal index key on every element
+        bytes_before += len(bson.encode({"embedding": value}))
+        bytes_after += len(bson.encode({"embedding": encoded}))
+        updates.append(UpdateOne({"_id": chunk["_id"]}, {"$set": {"embedding": encoded}}))
+        if len(updates) == batch_size:
+            if not dry_run:
+                collection.bulk_write(updates, ordered=False)
+            converted += len(updates)
+            updates = []
+            print(f"  {converted}/{total}")
+    if updates and not dry_run:
+        collection.bulk_write(updates, ordered=False)
+    converted += len(updates)
+
+    return {"converted": converted, "payload_bytes_before": bytes_before, "payload_bytes_after": bytes_after}
+
+
+def drop_vector_indexes(dry_run: bool) -> int:
+    """
+    Deletes the persisted vector indexes so each is rebuilt on its next query with the
+    current VECTOR_INDEX_QUANTIZATION setting.
+    """
+    client = MongoClient(settings.MONGO_CONNECTION_STRING)
+    fs = gridfs.GridFS(client.get_database("chat_with_pdf_db"), collection="vector_indexes")
+    files = list(fs.find())
+    if not dry_run:
+        for grid_out in files:
+            fs.delete(grid_out._id)
+    return len(files)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert stored chunk embeddings to a compact storage format.")
+    parser.add_argument("--format", choices=STORAGE_FORMATS, default=settings.EMBEDDING_STORAGE_FORMAT)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing.")
+    parser.add_argument("--drop-indexes", action="store_true", help="Also delete persisted vector indexes so they are rebuilt.")
+    args = parser.parse_args()
+
+    result = migrate(args.format, args.batch_size, args.dry_run)
+    print(
+        f"Converted {result['converted']} chunks; embedding payload "
+        f"{result['payload_bytes_before'] / 1e6:.1f} MB -> {result['payload_bytes_after'] / 1e6:.1f} MB"
+    )
+    if args.drop_indexes:
+        print(f"Deleted {drop_vector_indexes(args.dry_run)} persisted vector indexes")
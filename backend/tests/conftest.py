@@ -0,0 +1,84 @@
+"""
+Shared setup for the backend tests. The app settings are filled with placeholders and,
+when mongomock is installed (`pip install mongomock`), pymongo's clients are pointed at
+one in-memory server before any app module creates them, as the end-to-end benchmark
+does. Tests that need MongoDB skip themselves without mongomock.
+
+Run from the backend directory:
+    python -m pytest -q
+"""
+import os
+
+# The app settings require these; none of the services is contacted
+os.environ.setdefault("MONGO_CONNECTION_STRING", "mongodb://localhost:27017")
+os.environ.setdefault("SUPABASE_URL", "https://tests.supabase.co")
+for _name in ("GOOGLE_API_KEY", "SUPABASE_KEY", "SUPABASE_JWT_SECRET", "SUPABASE_ANON_KEY"):
+    os.environ.setdefault(_name, "tests")
+os.environ.setdefault("WARMUP_ON_STARTUP", "false")
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+
+import pytest
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+else:
+    from benchmarks.end_to_end import use_mongomock
+
+    use_mongomock()
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """The shared vector store over an emptied in-memory database, with hash embeddings."""
+    if mongomock is None:
+        pytest.skip("mongomock is not installed")
+    from benchmarks.end_to_end import HashEmbeddings
+    from app.services.vector_index import IndexCache
+    from app.services.vector_store import vector_store
+
+    vector_store.client.drop_database(vector_store.db.name)
+    monkeypatch.setattr(vector_store, "_embedding_model", HashEmbeddings())
+    # Indexes cached by an earlier test would outlive the dropped database
+    monkeypatch.setattr(vector_store, "index_cache", IndexCache(max_bytes=vector_store.index_cache.max_bytes))
+    monkeypatch.setattr(vector_store, "lexical_cache", IndexCache(max_bytes=vector_store.lexical_cache.max_bytes))
+    return vector_store
+
+
+@pytest.fixture
+def pipeline(store):
+    """An ingestion pipeline over the `store` database; tests run its jobs in their own thread."""
+    from app.services.ingestion import IngestionPipeline
+
+    pipeline = IngestionPipeline(max_workers=1)
+    pipeline.jobs.ensure_indexes()
+    yield pipeline
+    pipeline.shutdown()
+
+
+@pytest.fixture
+def ingest(pipeline, tmp_path):
+    """
+    Returns a function that writes a PDF with one page per text and runs a create job
+    for it (or, with `document_id`, an update job) in the calling thread, returning the
+    finished job record.
+    """
+    import uuid
+    import pymupdf
+
+    def ingest(pages: list[str], user_id: str = "alice", document_id: str = None, content_hash: str = None) -> dict:
+        file_path = str(tmp_path / f"{uuid.uuid4()}.pdf")
+        with pymupdf.open() as pdf:
+            for text in pages:
+                pdf.new_page().insert_text((72, 72), text)
+            pdf.save(file_path)
+        job = pipeline.jobs.create(
+            user_id=user_id, document_id=document_id or str(uuid.uuid4()), filename="manual.pdf",
+            content_hash=content_hash, operation="update" if document_id else "create", file_path=file_path,
+        )
+        pipeline._ingest(job, file_path)
+        return pipeline.jobs.get(job["job_id"])
+
+    return ingest
@@ -0,0 +1,67 @@
+import numpy as np
+from prometheus_client import REGISTRY
+
+from app.services.answer_cache import AnswerCache
+
+QUESTION = np.array([1.0, 0.0, 0.0], dtype=np.float32)
+CLOSE = np.array([0.9, np.sqrt(1 - 0.81), 0.0], dtype=np.float32)
+
+
+def _expire(cache: AnswerCache, document_id: str, question: str):
+    cache._entries[(document_id, question)]["expires_at"] = 0.0
+    # As if the entry had been put that long ago
+    cache._matrices.pop(document_id, None)
+
+
+def test_exact_question_is_served_from_the_cache():
+    cache = AnswerCache(max_entries=10, ttl_seconds=60)
+    cache.put("doc-a", "What is the torque?", "120 Nm")
+
+    assert cache.get("doc-a", "  what is the TORQUE ")["answer"] == "120 Nm"
+    assert cache.get("doc-b", "What is the torque?") is None
+
+
+def test_expired_best_match_does_not_hide_a_live_one():
+    cache = AnswerCache(max_entries=10, ttl_seconds=60, semantic_threshold=0.8)
+    cache.put("doc-a", "exact", "stale answer", question_embedding=QUESTION)
+    cache.put("doc-a", "close", "live answer", question_embedding=CLOSE)
+    _expire(cache, "doc-a", "exact")
+
+    assert cache.get("doc-a", "new wording", question_embedding=QUESTION)["answer"] == "live answer"
+    # The expired entry was evicted during the scan
+    assert ("doc-a", "exact") not in cache._entries
+
+
+def test_semantic_match_needs_a_live_entry_above_the_threshold():
+    cache = AnswerCache(max_entries=10, ttl_seconds=60, semantic_threshold=0.95)
+    cache.put("doc-a", "close", "answer", question_embedding=CLOSE)
+
+    assert cache.get("doc-a", "new wording", question_embedding=QUESTION) is None
+    _expire(cache, "doc-a", "close")
+    assert cache.get("doc-a", "close again", question_embedding=CLOSE) is None
+    assert not cache._entries
+
+
+def test_invalidate_drops_the_documents_semantic_entries():
+    cache = AnswerCache(max_entries=10, ttl_seconds=60, semantic_threshold=0.8)
+    cache.put("doc-a", "exact", "answer", question_embedding=QUESTION)
+    assert cache.get("doc-a", "new wording", question_embedding=QUESTION) is not None
+
+    cache.invalidate("doc-a")
+
+    assert cache.get("doc-a", "new wording", question_embedding=QUESTION) is None
+
+
+def test_lookups_are_counted_by_result():
+    def count(result: str) -> float:
+        return REGISTRY.get_sample_value("chat_with_pdf_cache_lookups_total", {"cache": "answer", "result": result}) or 0.0
+
+    cache = AnswerCache(max_entries=10, ttl_seconds=60, semantic_threshold=0.8)
+    cache.put("doc-a", "exact", "answer", question_embedding=QUESTION)
+    before = {result: count(result) for result in ("exact_hit", "semantic_hit", "miss")}
+
+    cache.get("doc-a", "exact", question_embedding=QUESTION)
+    cache.get("doc-a", "new wording", question_embedding=CLOSE)
+    cache.get("doc-b", "exact", question_embedding=QUESTION)
+
+    assert {result: count(result) - before[result] for result in before} == {"exact_hit": 1, "semantic_hit": 1, "miss": 1}
@@ -0,0 +1,102 @@
+import json
+
+import pytest
+
+PAGES = [f"Section {i}: the pump valve XK-{i}0 is serviced every {i + 1}00 hours." for i in range(3)]
+
+
+@pytest.fixture
+def client(store, monkeypatch):
+    """An API client for user "alice" with a fake LLM and the answer cache (both tiers) on."""
+    from fastapi.testclient import TestClient
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from app.api.v1 import chat
+    from app.core.config import settings
+    from app.core.security import get_current_user
+    from app.main import app
+    from app.services import rag_pipeline
+    from app.services.answer_cache import AnswerCache
+
+    monkeypatch.setattr(rag_pipeline, "get_chat_model", lambda *args, **kwargs: FakeListChatModel(responses=["Every 100 hours."]))
+    monkeypatch.setattr(settings, "ANSWER_CACHE_ENABLED", True)
+    monkeypatch.setattr(chat, "answer_cache", AnswerCache(max_entries=100, ttl_seconds=60, semantic_threshold=0.95))
+    chat.get_rag_pipeline.cache_clear()
+    app.dependency_overrides[get_current_user] = lambda: {"sub": "alice"}
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_current_user)
+    chat.get_rag_pipeline.cache_clear()
+
+
+@pytest.fixture
+def embedded_queries(store, monkeypatch):
+    """The questions embedded through the vector store, in order."""
+    queries = []
+    aembed_query = store.aembed_query
+
+    async def counting_aembed_query(query):
+        queries.append(query)
+        return await aembed_query(query)
+
+    monkeypatch.setattr(store, "aembed_query", counting_aembed_query)
+    return queries
+
+
+def _events(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+def test_uncached_chat_embeds_the_question_once(client, ingest, embedded_queries):
+    document_id = ingest(PAGES)["document_id"]
+
+    response = client.post("/api/v1/chat", json={"question": "How often is XK-10 serviced?", "document_id": document_id})
+
+    assert response.status_code == 200
+    assert response.json()["answer"] == "Every 100 hours."
+    assert embedded_queries == ["How often is XK-10 serviced?"]
+
+
+def test_uncached_stream_embeds_the_question_once(client, ingest, embedded_queries):
+    document_id = ingest(PAGES)["document_id"]
+
+    response = client.post("/api/v1/chat/stream", json={"question": "How often is XK-10 serviced?", "document_id": document_id})
+
+    events = _events(response.text)
+    assert [event for event, _ in events][0] == "sources"
+    assert events[-1] == ("done", {"document_id": document_id, "document_ids": None, "cached": False})
+    assert "".join(data["text"] for event, data in events if event == "token") == "Every 100 hours."
+    assert embedded_queries == ["How often is XK-10 serviced?"]
+
+
+def test_repeated_question_is_answered_from_the_cache(client, ingest):
+    document_id = ingest(PAGES)["document_id"]
+    question = {"question": "How often is XK-10 serviced?", "document_id": document_id}
+
+    first = client.post("/api/v1/chat", json=question).json()
+    again = client.post("/api/v1/chat", json={**question, "question": "how often is XK-10 serviced"}).json()
+    streamed = _events(client.post("/api/v1/chat/stream", json=question).text)
+
+    assert (first["cached"], again["cached"]) == (False, True)
+    assert again["answer"] == first["answer"]
+    assert streamed[-1][1]["cached"] is True
+
+
+def test_stream_ends_with_an_error_event_when_the_llm_fails(client, ingest, monkeypatch):
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from app.services import rag_pipeline
+
+    document_id = ingest(PAGES)["document_id"]
+    monkeypatch.setattr(
+        rag_pipeline, "get_chat_model",
+        lambda *args, **kwargs: FakeListChatModel(responses=["Every 100 hours."], error_on_chunk_number=3),
+    )
+
+    response = client.post("/api/v1/chat/stream", json={"question": "How often is XK-10 serviced?", "document_id": document_id})
+
+    events = _events(response.text)
+    assert [event for event, _ in events] == ["sources", "token", "token", "token", "error"]
+    assert "".join(data["text"] for event, data in events if event == "token") == "Eve"
+    assert "detail" in events[-1][1]
@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services.compaction import DocumentCompactor
+
+USER_ID = "alice"
+VERSION_1 = [f"Section {i}: the pump valve XK-{i}0 is serviced every {i + 1}00 hours." for i in range(4)]
+# Pages 1 and 2 are rewritten, so their chunks are tombstoned
+VERSION_2 = VERSION_1[:1] + [f"Section {i}: the turbo encabulator ZZ-{i}9 needs no service." for i in (1, 2)] + VERSION_1[3:]
+
+
+@pytest.fixture
+def compactor(store):
+    # A small batch size so purging takes several rounds
+    return DocumentCompactor(store, poll_seconds=1, interval_seconds=60, grace_seconds=60, batch_size=2)
+
+
+def _age_tombstones(store, seconds: float):
+    for chunk in store.collection.find({"deleted_at": {"$ne": None}}, {"deleted_at": 1}):
+        store.collection.update_one(
+            {"_id": chunk["_id"]}, {"$set": {"deleted_at": chunk["deleted_at"] - timedelta(seconds=seconds)}}
+        )
+
+
+def _counts(store, document_id: str) -> tuple[int, int]:
+    live = store.collection.count_documents({"metadata.document_id": document_id, "deleted_at": None})
+    tombstoned = store.collection.count_documents({"metadata.document_id": document_id, "deleted_at": {"$ne": None}})
+    return live, tombstoned
+
+
+def test_tombstones_are_purged_once_their_grace_period_has_passed(store, ingest, compactor):
+    updated_id = ingest(VERSION_1)["document_id"]
+    ingest(VERSION_2, document_id=updated_id)
+    deleted_id = ingest(VERSION_1)["document_id"]
+    asyncio.run(store.adelete_document(USER_ID, deleted_id))
+
+    assert compactor.compact() == 0
+    assert _counts(store, updated_id) == (4, 2)
+
+    _age_tombstones(store, 120)
+    assert compactor.compact() == 2 + 4
+
+    assert _counts(store, updated_id) == (4, 0)
+    assert _counts(store, deleted_id) == (0, 0)
+    assert compactor.purged == 6
+    # Purging is idempotent
+    assert compactor.compact() == 0
+
+
+def test_purge_keeps_tombstones_newer_than_the_cutoff(store, ingest):
+    document_id = ingest(VERSION_1)["document_id"]
+    ingest(VERSION_2, document_id=document_id)
+    _age_tombstones(store, 120)
+    ingest(VERSION_1, document_id=document_id)
+
+    purged = store.purge_tombstones(datetime.now(timezone.utc) - timedelta(seconds=60), batch_size=1)
+
+    assert purged == 2
+    # Only the chunks retired by the second update are left, still tombstoned
+    assert _counts(store, document_id) == (4, 2)
@@ -0,0 +1,31 @@
+import pytest
+from langchain.docstore.document import Document
+
+from app.services.context_packer import ContextPacker
+
+PAGE = " ".join(f"word{i:03d}" for i in range(60))
+
+
+def _chunk(start: int, end: int, with_offset: bool = True, page: int = 0) -> Document:
+    metadata = {"document_id": "doc-a", "page": page}
+    if with_offset:
+        metadata["start_index"] = start
+    return Document(page_content=PAGE[start:end], metadata=metadata)
+
+
+@pytest.mark.parametrize("with_offset", [True, False], ids=["offsets", "overlap"])
+def test_chunk_bridging_two_others_merges_all_three(with_offset):
+    # The middle chunk ranks last, so it is seen after both of its neighbours
+    docs = [_chunk(0, 200, with_offset), _chunk(300, 479, with_offset), _chunk(150, 350, with_offset)]
+
+    packed = ContextPacker(token_budget=10000).pack(docs)
+
+    assert [doc.page_content for doc in packed] == [PAGE[:479]]
+
+
+def test_chunks_of_other_pages_or_apart_stay_separate():
+    docs = [_chunk(0, 100), _chunk(300, 400), _chunk(50, 150, page=1)]
+
+    packed = ContextPacker(token_budget=10000, duplicate_threshold=1.1).pack(docs)
+
+    assert sorted(doc.page_content for doc in packed) == sorted([PAGE[0:100], PAGE[300:400], PAGE[50:150]])
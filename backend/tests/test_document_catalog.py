@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from app.services.document_catalog import DocumentCatalog
+from benchmarks.mongo_load import AsyncMongomockDatabase
+
+
+@pytest.fixture
+def catalog():
+    client = mongomock.MongoClient()
+    client.drop_database("catalog_tests")
+    db = client.get_database("catalog_tests")
+    catalog = DocumentCatalog(db, AsyncMongomockDatabase(db))
+    catalog.ensure_indexes()
+    return catalog
+
+
+def test_documents_are_only_visible_to_their_owner(catalog):
+    catalog.register("alice", "doc-a", "a.pdf", 3)
+    catalog.register("bob", "doc-b", "b.pdf", 5)
+
+    assert catalog.get("alice", "doc-a")["chunk_count"] == 3
+    assert catalog.get("bob", "doc-a") is None
+    assert [row["document_id"] for row in catalog.list_for_user("alice")] == ["doc-a"]
+    assert asyncio.run(catalog.aget("alice", "doc-b")) is None
+
+
+def test_owned_ids_drops_documents_of_other_users(catalog):
+    catalog.register("alice", "doc-1", "1.pdf", 1)
+    catalog.register("alice", "doc-2", "2.pdf", 1)
+    catalog.register("bob", "doc-3", "3.pdf", 1)
+
+    assert sorted(asyncio.run(catalog.aowned_ids("alice"))) == ["doc-1", "doc-2"]
+    assert asyncio.run(catalog.aowned_ids("alice", ["doc-1", "doc-3", "missing"])) == ["doc-1"]
+    assert asyncio.run(catalog.aowned_ids("bob", ["doc-1", "doc-2"])) == []
+
+
+def test_remove_only_affects_the_owners_record(catalog):
+    catalog.register("alice", "doc-a", "a.pdf", 3)
+
+    assert asyncio.run(catalog.aremove("bob", "doc-a")) is False
+    assert catalog.get("alice", "doc-a") is not None
+    assert asyncio.run(catalog.aremove("alice", "doc-a")) is True
+    assert catalog.get("alice", "doc-a") is None
+
+
+def test_register_refreshes_without_changing_creation_time(catalog):
+    catalog.register("alice", "doc-a", "a.pdf", 3, content_hash="h1")
+    created_at = catalog.get("alice", "doc-a")["created_at"]
+
+    assert catalog.register("alice", "doc-a", "a-v2.pdf", 4, content_hash="h2", upsert=False) is True
+
+    record = catalog.get("alice", "doc-a")
+    assert (record["filename"], record["chunk_count"], record["content_hash"]) == ("a-v2.pdf", 4, "h2")
+    assert record["created_at"] == created_at
+
+
+def test_register_without_upsert_does_not_recreate_a_removed_document(catalog):
+    assert catalog.register("alice", "doc-a", "a.pdf", 3, upsert=False) is False
+    assert catalog.get("alice", "doc-a") is None
+
+
+def test_find_by_hash_can_be_restricted_to_one_user(catalog):
+    catalog.register("alice", "doc-a", "a.pdf", 3, content_hash="same")
+
+    assert catalog.find_by_hash("same")["document_id"] == "doc-a"
+    assert catalog.find_by_hash("same", user_id="bob") is None
+    assert asyncio.run(catalog.afind_by_hash("same", user_id="alice"))["user_id"] == "alice"
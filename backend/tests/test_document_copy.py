@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from app.services.ingestion import DuplicateUploadError
+
+PAGES = [f"Section {i}: the pump valve XK-{i}0 is serviced every {i + 1}00 hours." for i in range(4)]
+CONTENT_HASH = "same-file"
+
+
+def _texts(store, document_id: str) -> list[str]:
+    chunks = store.collection.find({"metadata.document_id": document_id, "deleted_at": None}, {"text": 1})
+    return sorted(chunk["text"] for chunk in chunks)
+
+
+@pytest.fixture
+def ingest_calls(pipeline, monkeypatch):
+    """Counts the jobs that went through the full parse-and-embed path."""
+    calls = []
+    ingest_pdf = pipeline._ingest_pdf
+
+    def counting_ingest_pdf(job, file_path):
+        calls.append(job["job_id"])
+        return ingest_pdf(job, file_path)
+
+    monkeypatch.setattr(pipeline, "_ingest_pdf", counting_ingest_pdf)
+    return calls
+
+
+def test_identical_file_is_copied_from_another_users_document(store, ingest, ingest_calls):
+    source = ingest(PAGES, user_id="alice", content_hash=CONTENT_HASH)
+
+    copy = ingest(PAGES, user_id="bob", content_hash=CONTENT_HASH)
+
+    assert copy["status"] == "completed", copy["error"]
+    assert ingest_calls == [source["job_id"]]
+    assert copy["reused_chunks"] == copy["chunk_count"] == source["chunk_count"]
+    assert _texts(store, copy["document_id"]) == _texts(store, source["document_id"])
+    assert store.catalog.get("bob", copy["document_id"])["chunk_count"] == copy["chunk_count"]
+
+
+def _change_source_on_first_insert(store, monkeypatch, change):
+    """Runs `change` once, right after the copy has inserted its first batch."""
+    insert_chunks = store.insert_chunks
+    done = []
+
+    def changing_insert_chunks(documents, embeddings, user_id, document_id):
+        ids = insert_chunks(documents, embeddings, user_id=user_id, document_id=document_id)
+        if user_id == "bob" and not done:
+            done.append(True)
+            change()
+        return ids
+
+    monkeypatch.setattr(store, "insert_chunks", changing_insert_chunks)
+
+
+@pytest.mark.parametrize("change", ["tombstone", "delete"])
+def test_copy_falls_back_to_ingesting_when_the_source_changes_midway(store, ingest, ingest_calls, monkeypatch, change):
+    from app.core.config import settings
+
+    source = ingest(PAGES, user_id="alice", content_hash=CONTENT_HASH)
+    source_id = source["document_id"]
+    monkeypatch.setattr(settings, "EMBEDDING_BATCH_SIZE", 1)
+
+    def change_source():
+        if change == "tombstone":
+            # What an update does to the chunks of the previous version
+            store.tombstone_chunks(store.live_chunk_ids("alice", source_id)[-1:])
+        else:
+            asyncio.run(store.adelete_document("alice", source_id))
+
+    _change_source_on_first_insert(store, monkeypatch, change_source)
+    copy = ingest(PAGES, user_id="bob", content_hash=CONTENT_HASH)
+
+    assert copy["status"] == "completed", copy["error"]
+    assert ingest_calls[-1] == copy["job_id"]
+    # The partial copy is gone; the document holds exactly one full ingest of the file
+    assert copy["chunk_count"] == source["chunk_count"]
+    assert len(_texts(store, copy["document_id"])) == copy["chunk_count"]
+
+
+def test_copy_skips_a_source_with_an_update_running(store, ingest, ingest_calls, pipeline):
+    source = ingest(PAGES, user_id="alice", content_hash=CONTENT_HASH)
+    pipeline.jobs.create(user_id="alice", document_id=source["document_id"], filename="manual.pdf", operation="update")
+
+    copy = ingest(PAGES, user_id="bob", content_hash=CONTENT_HASH)
+
+    assert copy["status"] == "completed", copy["error"]
+    assert ingest_calls[-1] == copy["job_id"]
+
+
+def test_identical_uploads_in_flight_are_ingested_once(pipeline):
+    def queue_upload(user_id="alice", document_id="doc-a"):
+        return asyncio.run(pipeline.jobs.acreate(
+            user_id=user_id, document_id=document_id, filename="manual.pdf", content_hash=CONTENT_HASH,
+        ))
+
+    first = queue_upload()
+    with pytest.raises(DuplicateUploadError) as raised:
+        queue_upload(document_id="doc-b")
+    assert raised.value.job["job_id"] == first["job_id"]
+    # Other users, and files without a hash, are not held back
+    assert queue_upload(user_id="bob", document_id="doc-c")["status"] == "queued"
+    assert asyncio.run(pipeline.jobs.acreate(user_id="alice", document_id="doc-d", filename="manual.pdf"))
+
+    pipeline.jobs.update(first["job_id"], status="completed")
+    assert queue_upload(document_id="doc-e")["status"] == "queued"
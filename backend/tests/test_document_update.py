@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+
+from app.services.ingestion import DocumentBusyError
+
+USER_ID = "alice"
+VERSION_1 = [f"Section {i}: the pump valve XK-{i}0 is serviced every {i + 1}00 hours." for i in range(4)]
+# Page 2 is rewritten, the other pages are unchanged
+VERSION_2 = VERSION_1[:2] + ["Section 2: the turbo encabulator ZZ-99 needs no service."] + VERSION_1[3:]
+
+
+def _live(store, document_id: str) -> dict:
+    """Maps the ids of a document's live chunks to their text."""
+    chunks = store.collection.find({"metadata.document_id": document_id, "deleted_at": None}, {"text": 1})
+    return {str(chunk["_id"]): chunk["text"] for chunk in chunks}
+
+
+def _assert_indexes_cover(store, document_id: str, chunk_ids):
+    assert sorted(store.index_store.load(document_id).ids.tolist()) == sorted(chunk_ids)
+    assert sorted(store.lexical_store.load(document_id).ids.tolist()) == sorted(chunk_ids)
+
+
+def test_update_keeps_unchanged_chunks_and_replaces_the_rest(store, ingest):
+    created = ingest(VERSION_1)
+    document_id = created["document_id"]
+    before = _live(store, document_id)
+
+    updated = ingest(VERSION_2, document_id=document_id)
+
+    after = _live(store, document_id)
+    kept = {chunk_id for chunk_id, text in before.items() if "XK-20" not in text}
+    removed = set(before) - kept
+    assert updated["status"] == "completed", updated["error"]
+    assert kept <= set(after)
+    assert not removed & set(after)
+    assert [text for text in after.values() if "ZZ-99" in text]
+    assert updated["removed_chunks"] == len(removed)
+    assert updated["reused_chunks"] == len(kept)
+    assert updated["chunk_count"] == len(after)
+    # Retired chunks are tombstoned, not deleted, until the compactor purges them
+    assert store.collection.count_documents({"metadata.document_id": document_id}) == len(after) + len(removed)
+    assert store.catalog.get(USER_ID, document_id)["chunk_count"] == len(after)
+    _assert_indexes_cover(store, document_id, after)
+
+
+def test_same_version_again_changes_nothing(store, ingest):
+    document_id = ingest(VERSION_1)["document_id"]
+    before = _live(store, document_id)
+
+    updated = ingest(VERSION_1, document_id=document_id)
+
+    assert updated["status"] == "completed", updated["error"]
+    assert (updated["reused_chunks"], updated["removed_chunks"]) == (len(before), 0)
+    assert _live(store, document_id) == before
+
+
+@pytest.mark.parametrize("failing_step", ["rebuild_index", "tombstone_chunks", "catalog.register"])
+def test_failed_update_rolls_back_to_the_previous_version(store, ingest, monkeypatch, failing_step):
+    document_id = ingest(VERSION_1)["document_id"]
+    before = _live(store, document_id)
+    record = store.catalog.get(USER_ID, document_id)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError(f"{failing_step} failed")
+
+    with monkeypatch.context() as patch:
+        owner, _, name = failing_step.rpartition(".")
+        patch.setattr(store.catalog if owner else store, name, fail)
+        failed = ingest(VERSION_2, document_id=document_id)
+
+    assert failed["status"] == "failed"
+    assert failing_step in failed["error"]
+    # The new chunks are gone and the retired ones are live again
+    assert _live(store, document_id) == before
+    assert store.collection.count_documents({"metadata.document_id": document_id}) == len(before)
+    assert store.catalog.get(USER_ID, document_id) == record
+    # Indexes that may have been replaced are rebuilt from the live chunks on next use
+    assert sorted(store._get_index(USER_ID, document_id).ids.tolist()) == sorted(before)
+    assert sorted(store._get_lexical_index(USER_ID, document_id).ids.tolist()) == sorted(before)
+
+    retried = ingest(VERSION_2, document_id=document_id)
+
+    assert retried["status"] == "completed", retried["error"]
+    assert [text for text in _live(store, document_id).values() if "ZZ-99" in text]
+
+
+def test_update_of_a_deleted_document_does_not_bring_it_back(store, ingest, monkeypatch):
+    document_id = ingest(VERSION_1)["document_id"]
+    register = store.catalog.register
+
+    def delete_then_register(*args, **kwargs):
+        # The document is deleted while the update job is running
+        store.catalog.collection.delete_one({"user_id": USER_ID, "document_id": document_id})
+        return register(*args, **kwargs)
+
+    monkeypatch.setattr(store.catalog, "register", delete_then_register)
+    failed = ingest(VERSION_2, document_id=document_id)
+
+    assert failed["status"] == "failed"
+    assert store.catalog.get(USER_ID, document_id) is None
+    assert not [text for text in _live(store, document_id).values() if "ZZ-99" in text]
+
+
+def test_document_takes_one_job_at_a_time(pipeline):
+    def queue_update():
+        return asyncio.run(pipeline.jobs.acreate(
+            user_id=USER_ID, document_id="doc-a", filename="manual.pdf", operation="update",
+        ))
+
+    first = queue_update()
+    with pytest.raises(DocumentBusyError):
+        queue_update()
+
+    pipeline.jobs.update(first["job_id"], status="failed", error="test")
+    assert queue_update()["status"] == "queued"
+
+
+def _positions(store, document_id: str) -> dict:
+    chunks = store.collection.find({"metadata.document_id": document_id, "deleted_at": None}, {"metadata": 1})
+    return {
+        str(chunk["_id"]): {field: chunk["metadata"].get(field) for field in ("page", "total_pages", "start_index")}
+        for chunk in chunks
+    }
+
+
+def test_update_moves_kept_chunks_to_their_new_pages(store, ingest):
+    document_id = ingest(VERSION_1)["document_id"]
+    before = _positions(store, document_id)
+
+    updated = ingest(["A new cover page."] + VERSION_1, document_id=document_id)
+
+    assert updated["status"] == "completed", updated["error"]
+    after = _positions(store, document_id)
+    for chunk_id, position in before.items():
+        assert after[chunk_id]["page"] == position["page"] + 1
+        assert after[chunk_id]["total_pages"] == len(VERSION_1) + 1
+
+
+@pytest.mark.parametrize("failing_step", ["rebuild_index", "catalog.register"])
+def test_failed_update_puts_moved_chunks_back(store, ingest, monkeypatch, failing_step):
+    document_id = ingest(VERSION_1)["document_id"]
+    before = _positions(store, document_id)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError(f"{failing_step} failed")
+
+    owner, _, name = failing_step.rpartition(".")
+    monkeypatch.setattr(store.catalog if owner else store, name, fail)
+    failed = ingest(["A new cover page."] + VERSION_1, document_id=document_id)
+
+    assert failed["status"] == "failed"
+    assert _positions(store, document_id) == before
@@ -0,0 +1,51 @@
+import asyncio
+
+from app.services.embedding_batcher import EmbeddingBatcher
+
+
+class RecordingEmbeddings:
+    """Records the size of every forward pass; fails for texts containing "fail"."""
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(len(texts))
+        if any("fail" in text for text in texts):
+            raise RuntimeError("model crashed")
+        return [[float(len(text))] for text in texts]
+
+
+def test_concurrent_queries_share_forward_passes():
+    model = RecordingEmbeddings()
+    batcher = EmbeddingBatcher(model, max_batch_size=4, max_wait_ms=50)
+    texts = [f"question {'?' * i}" for i in range(10)]
+
+    async def main():
+        try:
+            return await asyncio.gather(*(batcher.embed_query(text) for text in texts))
+        finally:
+            await batcher.close()
+
+    vectors = asyncio.run(main())
+
+    assert vectors == [[float(len(text))] for text in texts]
+    assert model.batches == [4, 4, 2]
+
+
+def test_a_failed_batch_fails_only_its_callers():
+    model = RecordingEmbeddings()
+    batcher = EmbeddingBatcher(model, max_batch_size=2, max_wait_ms=50)
+
+    async def main():
+        try:
+            failed = await asyncio.gather(batcher.embed_query("fail"), batcher.embed_query("a"), return_exceptions=True)
+            return failed, await batcher.embed_query("after")
+        finally:
+            await batcher.close()
+
+    failed, after = asyncio.run(main())
+
+    assert [type(result) for result in failed] == [RuntimeError, RuntimeError]
+    # The background task survives the failure
+    assert after == [5.0]
+    assert model.batches == [2, 1]
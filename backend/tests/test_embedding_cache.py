@@ -0,0 +1,147 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.services.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings:
+    """A deterministic stand-in model that records the texts it embeds."""
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+@pytest.fixture
+def model():
+    return CountingEmbeddings()
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "embeddings.sqlite3")
+
+
+def _cache(model, path, **kwargs) -> CachedEmbeddings:
+    return CachedEmbeddings(model, model_name="test-model", path=path, **kwargs)
+
+
+def _lookups() -> dict:
+    return {
+        result: REGISTRY.get_sample_value("chat_with_pdf_cache_lookups_total", {"cache": "embedding", "result": result}) or 0.0
+        for result in ("memory_hit", "disk_hit", "miss")
+    }
+
+
+def _counted(before: dict) -> dict:
+    return {result: count - before[result] for result, count in _lookups().items()}
+
+
+def _disk_rows(path) -> int:
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+def test_lookups_go_memory_then_disk_then_model(model, path):
+    cache = _cache(model, path)
+    before = _lookups()
+
+    first = cache.embed_documents(["pump valve", "turbo encabulator"])
+    assert cache.embed_documents(["pump valve"]) == first[:1]
+    # A new process starts with an empty memory tier but the same file
+    restarted = _cache(model, path)
+    assert restarted.embed_documents(["turbo encabulator", "pump valve", "new chunk"]) == first[::-1] + [[9.0, 1.0]]
+
+    assert model.calls == ["pump valve", "turbo encabulator", "new chunk"]
+    assert _counted(before) == {"memory_hit": 1, "disk_hit": 2, "miss": 3}
+
+
+def test_keys_ignore_whitespace_but_not_the_call_kind(model, path):
+    cache = _cache(model, path)
+
+    cache.embed_documents(["pump  valve\n"])
+    cache.embed_documents(["pump valve", " pump valve "])
+    cache.embed_query("pump valve")
+
+    assert model.calls == ["pump  valve\n", "pump valve"]
+
+
+def test_repeats_within_a_batch_are_embedded_once(model, path):
+    cache = _cache(model, path)
+
+    vectors = cache.embed_documents(["boilerplate footer", "chunk", "boilerplate footer"])
+
+    assert vectors[0] == vectors[2]
+    assert model.calls == ["boilerplate footer", "chunk"]
+
+
+def test_tiers_keep_their_most_recently_used_entries(model, path):
+    cache = _cache(model, path, memory_items=2, max_rows=3)
+    for text in ["one", "two", "three"]:
+        cache.embed_documents([text])
+        time.sleep(0.01)
+    # Reading "one" from disk makes it the most recently used entry there
+    assert _cache(model, path).embed_documents(["one"]) == [[3.0, 1.0]]
+    for text in ["four", "five"]:
+        time.sleep(0.01)
+        cache.embed_documents([text])
+
+    assert list(cache._memory) == [cache._key("four", "document"), cache._key("five", "document")]
+    assert _disk_rows(path) == 3
+    model.calls.clear()
+    _cache(model, path).embed_documents(["one", "two", "three", "four", "five"])
+    assert model.calls == ["two", "three"]
+
+
+def test_threads_use_the_disk_tier_concurrently(model, path):
+    _cache(model, path).embed_documents([f"chunk {i}" for i in range(50)])
+    # A fresh cache has an empty memory tier, so every lookup below reads the file
+    cache = _cache(model, path, memory_items=1)
+    results, errors = {}, []
+
+    def lookup(thread: int):
+        try:
+            results[thread] = cache.embed_documents([f"chunk {i}" for i in range(50)])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=lookup, args=(thread,)) for thread in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert len(model.calls) == 50
+    assert all(vectors == results[0] for vectors in results.values())
+
+
+def test_memory_hits_do_not_wait_for_a_busy_disk(model, path):
+    cache = _cache(model, path, busy_timeout=1.0)
+    cache.embed_query("warm question")
+    # Another worker process holds the file's write lock
+    other = sqlite3.connect(path)
+    other.execute("BEGIN IMMEDIATE")
+    writer = threading.Thread(target=cache.embed_documents, args=(["a new chunk"],))
+    writer.start()
+    time.sleep(0.1)
+
+    started = time.perf_counter()
+    assert cache.embed_query("warm question") == [13.0, 1.0]
+    assert time.perf_counter() - started < 0.5
+
+    writer.join()
+    other.rollback()
+    other.close()
+    # The write was skipped after the busy timeout, but the entry is still served from memory
+    assert cache.embed_documents(["a new chunk"]) == [[11.0, 1.0]]
+    assert model.calls == ["warm question", "a new chunk"]
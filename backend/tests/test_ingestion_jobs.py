@@ -0,0 +1,48 @@
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import settings
+
+
+def _age(pipeline, job_id: str, seconds: float):
+    pipeline.jobs.collection.update_one(
+        {"job_id": job_id}, {"$set": {"updated_at": datetime.now(timezone.utc) - timedelta(seconds=seconds)}}
+    )
+
+
+def test_stages_advance_in_pipeline_order(pipeline):
+    job = pipeline.jobs.create(user_id="alice", document_id="doc-a", filename="a.pdf")
+
+    pipeline.jobs.update_progress(job["job_id"], {"parse": 1.0, "split": 0.5, "embed": 0.25, "store": 0.25})
+
+    stages = pipeline.jobs.get(job["job_id"])["stages"]
+    assert [stages[stage]["status"] for stage in ("parse", "split", "embed", "store")] == [
+        "completed", "running", "pending", "pending",
+    ]
+    assert stages["embed"]["progress"] == 0.25
+
+
+def test_stale_jobs_are_failed_and_their_files_removed(pipeline, tmp_path):
+    orphaned_file = tmp_path / "orphaned.pdf"
+    orphaned_file.write_bytes(b"%PDF")
+    orphaned = pipeline.jobs.create(user_id="alice", document_id="doc-a", filename="a.pdf", file_path=str(orphaned_file))
+    held = pipeline.jobs.create(user_id="alice", document_id="doc-b", filename="b.pdf")
+    for job in (orphaned, held):
+        _age(pipeline, job["job_id"], settings.JOB_STALE_SECONDS + 60)
+    # This process still holds the second job, so its heartbeat keeps it alive
+    pipeline._in_flight[held["job_id"]] = (Future(), None)
+
+    assert pipeline.check_jobs() == 1
+
+    assert pipeline.jobs.get(orphaned["job_id"])["status"] == "failed"
+    assert pipeline.jobs.get(held["job_id"])["status"] == "queued"
+    assert not orphaned_file.exists()
+    # The failed job no longer holds its document
+    assert pipeline.jobs.create(user_id="alice", document_id="doc-a", filename="a.pdf")["status"] == "queued"
+
+
+def test_recent_jobs_are_not_stale(pipeline):
+    job = pipeline.jobs.create(user_id="alice", document_id="doc-a", filename="a.pdf")
+
+    assert pipeline.jobs.fail_stale(settings.JOB_STALE_SECONDS) == []
+    assert pipeline.jobs.get(job["job_id"])["status"] == "queued"
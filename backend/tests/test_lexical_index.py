@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from app.services.lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+TEXTS = [
+    "The impeller of unit Orion-1 must be tightened to 120 Nm.",
+    "Replace the shaft seal XK-0042/7 every 500 operating hours.",
+    "Bearing housing inspection: check the seal clearance and the impeller.",
+    "",
+    "The coupling and the gear train share one lubrication circuit.",
+    "Part XK-0042/7 fits the Vega and Lyra units; torque 45 Nm.",
+]
+QUERIES = ["impeller torque", "XK-0042/7", "seal", "lubrication gear", "Nm", "unknown words only"]
+
+
+def _assert_same_index(actual: BM25Index, expected: BM25Index):
+    assert actual.ids.tolist() == expected.ids.tolist()
+    assert actual.terms == expected.terms
+    for name in ("offsets", "rows", "tfs", "doc_lengths"):
+        assert np.array_equal(getattr(actual, name), getattr(expected, name)), name
+    assert actual.avg_doc_length == expected.avg_doc_length
+
+
+@pytest.mark.parametrize("split", [0, 1, 3, len(TEXTS)])
+def test_merge_equals_full_build(split):
+    ids = [f"chunk-{i}" for i in range(len(TEXTS))]
+    full = BM25Index.build(ids, TEXTS)
+
+    merged = BM25Index.build(ids[:split], TEXTS[:split]).merge(BM25Index.build(ids[split:], TEXTS[split:]))
+
+    _assert_same_index(merged, full)
+    for query in QUERIES:
+        merged_ids, merged_scores = merged.search(query, 4)
+        full_ids, full_scores = full.search(query, 4)
+        assert merged_ids.tolist() == full_ids.tolist()
+        assert np.allclose(merged_scores, full_scores)
+
+
+def test_round_trip_keeps_index_and_results():
+    index = BM25Index.build([f"chunk-{i}" for i in range(len(TEXTS))], TEXTS, k1=1.5, b=0.6)
+
+    restored = BM25Index.from_bytes(index.to_bytes())
+
+    _assert_same_index(restored, index)
+    assert (restored.k1, restored.b) == (1.5, 0.6)
+    for query in QUERIES:
+        assert restored.search(query, 3)[0].tolist() == index.search(query, 3)[0].tolist()
+
+
+def test_search_leaves_out_chunks_without_query_terms():
+    index = BM25Index.build(["a", "b"], ["pump valve", "gear train"])
+
+    ids, scores = index.search("valve", 5)
+
+    assert ids.tolist() == ["a"]
+    assert scores[0] > 0
+
+
+def test_tokenize_keeps_compound_codes_and_their_parts():
+    assert tokenize("Part XK-0042/7 of the pump") == ["part", "xk-0042/7", "xk", "0042", "7", "pump"]
+
+
+def test_reciprocal_rank_fusion_favours_ids_ranked_by_both_lists():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]])
+
+    assert [chunk_id for chunk_id, _ in fused] == ["b", "a", "d", "c"]
@@ -0,0 +1,43 @@
+import pymupdf
+import pytest
+
+from app.services.pdf_loader import ENGINES, PDFLoader
+
+PAGES = [f"Page {i}: the pump valve XK-{i}0 is serviced every {i + 1}00 hours." for i in range(5)]
+
+
+@pytest.fixture(scope="module")
+def pdf_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp("pdfs") / "manual.pdf"
+    with pymupdf.open() as pdf:
+        for text in PAGES:
+            pdf.new_page().insert_text((72, 72), text)
+        pdf.save(path)
+    return str(path)
+
+
+def _pages(pdf_path: str, engine: str, workers: int):
+    loader = PDFLoader(engine=engine, workers=workers, shard_pages=2)
+    try:
+        return list(loader.iter_pages(pdf_path))
+    finally:
+        loader.shutdown()
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_sequential_and_parallel_parsing_give_the_same_pages(pdf_path, engine):
+    sequential = _pages(pdf_path, engine, workers=1)
+    parallel = _pages(pdf_path, engine, workers=2)
+
+    assert [page.page_content for page in parallel] == [page.page_content for page in sequential]
+    assert [page.metadata for page in parallel] == [page.metadata for page in sequential]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_pages_carry_the_same_metadata_on_every_engine(pdf_path, engine):
+    pages = _pages(pdf_path, engine, workers=1)
+
+    assert [page.metadata for page in pages] == [
+        {"source": pdf_path, "page": i, "total_pages": len(PAGES)} for i in range(len(PAGES))
+    ]
+    assert all(f"XK-{i}0" in page.page_content for i, page in enumerate(pages))
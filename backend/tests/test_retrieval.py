@@ -0,0 +1,49 @@
+import pytest
+
+from app.core.config import settings
+
+USER_ID = "alice"
+PAGES = [f"Section {i}: the pump valve XK-{i}0 is serviced every {i + 1}00 hours." for i in range(8)]
+PAGES[5] = "Section 5: the turbo encabulator needs no service."
+
+
+def _chunk_text(store, document_id: str, word: str) -> str:
+    chunk = store.collection.find_one({"metadata.document_id": document_id, "text": {"$regex": word}}, {"text": 1})
+    return chunk["text"]
+
+
+def test_hybrid_ranking_fuses_vector_and_keyword_ranks(store, ingest):
+    document_id = ingest(PAGES)["document_id"]
+    # The embedding points at section 2; only section 5 has the keyword
+    query_embedding = store.embedding_model.embed_query(_chunk_text(store, document_id, "XK-20"))
+
+    by_vector = store.similarity_search_by_vector(query_embedding, USER_ID, document_id, k=len(PAGES))
+    fused = store.hybrid_search("encabulator", query_embedding, USER_ID, document_id, k=len(PAGES))
+
+    assert "XK-20" in by_vector[0].page_content
+    # Ranked first by keywords and also among the vector candidates, so it beats the
+    # chunk that only the vector ranking puts first
+    assert "encabulator" in fused[0].page_content
+    assert "XK-20" in fused[1].page_content
+    vector_rank = next(rank for rank, doc in enumerate(by_vector, start=1) if "encabulator" in doc.page_content)
+    assert fused[0].metadata["rrf_score"] == pytest.approx(1 / (settings.RRF_K + 1) + 1 / (settings.RRF_K + vector_rank))
+    assert fused[1].metadata["rrf_score"] == pytest.approx(1 / (settings.RRF_K + 1))
+    scores = [doc.metadata["rrf_score"] for doc in fused]
+    assert scores == sorted(scores, reverse=True)
+
+
+@pytest.mark.parametrize("quantization", ["int8", "binary"])
+def test_quantized_search_matches_exact_search_after_rescoring(store, ingest, monkeypatch, quantization):
+    exact_id = ingest(PAGES)["document_id"]
+    monkeypatch.setattr(settings, "VECTOR_INDEX_QUANTIZATION", quantization)
+    quantized_id = ingest(PAGES)["document_id"]
+    query_embedding = store.embedding_model.embed_query("How often is the XK-30 pump valve serviced?")
+
+    exact = store.similarity_search_by_vector(query_embedding, USER_ID, exact_id, k=3)
+    quantized = store.similarity_search_by_vector(query_embedding, USER_ID, quantized_id, k=3)
+
+    assert store.index_store.load(quantized_id).kind == quantization
+    assert [doc.page_content for doc in quantized] == [doc.page_content for doc in exact]
+    assert [doc.metadata["similarity_score"] for doc in quantized] == pytest.approx(
+        [doc.metadata["similarity_score"] for doc in exact]
+    )
@@ -0,0 +1,59 @@
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def app(store, monkeypatch):
+    """The API with warm-up off and a fresh warm-up state."""
+    from app import main
+    from app.core.config import settings
+    from app.services.warmup import WarmupState
+
+    monkeypatch.setattr(settings, "WARMUP_ON_STARTUP", False)
+    monkeypatch.setattr(main, "warmup_state", WarmupState())
+    return main
+
+
+def test_startup_serves_health_checks_while_indexes_are_created(app, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    release = threading.Event()
+    ensure_indexes = app.vector_store.ensure_indexes
+
+    def slow_ensure_indexes():
+        assert release.wait(10)
+        ensure_indexes()
+
+    monkeypatch.setattr(app.vector_store, "ensure_indexes", slow_ensure_indexes)
+
+    with TestClient(app.app) as client:
+        assert client.get("/healthz").status_code == 200
+        response = client.get("/readyz")
+        assert response.status_code == 503
+        assert response.json()["warmup"]["status"] == "running"
+
+        release.set()
+        deadline = time.monotonic() + 10
+        while app.warmup_state.status == "running" and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert client.get("/readyz").json()["warmup"]["status"] == "ready"
+        assert "mongo_indexes" in app.warmup_state.timings
+
+
+def test_failed_index_creation_keeps_the_process_not_ready(app, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    def failing_ensure_indexes():
+        raise RuntimeError("not primary")
+
+    monkeypatch.setattr(app.vector_store, "ensure_indexes", failing_ensure_indexes)
+
+    with TestClient(app.app) as client:
+        deadline = time.monotonic() + 10
+        while app.warmup_state.status == "running" and time.monotonic() < deadline:
+            time.sleep(0.01)
+        response = client.get("/readyz")
+        assert response.status_code == 503
+        assert response.json()["warmup"]["error"] == "mongo_indexes: not primary"
@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+from langchain.docstore.document import Document
+from langchain_core.runnables import RunnableLambda
+
+from app.services import summarizer
+from app.services.summarizer import Summarizer, gather_or_cancel
+
+PAGES = [f"Section {i}: the pump valve XK-{i}0 is serviced every {i + 1}00 hours." for i in range(4)]
+
+
+def _summarizer(llm_call) -> Summarizer:
+    """A summarizer whose LLM is `llm_call(prompt_text) -> str` (async), without a chunk cache."""
+    async def call(prompt):
+        return await llm_call(prompt.to_string())
+
+    return Summarizer(RunnableLambda(call), max_concurrency=8, requests_per_minute=6000, reduce_token_budget=1000)
+
+
+def test_gather_or_cancel_cancels_the_rest_on_the_first_failure():
+    cancelled = []
+
+    async def slow(i):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(i)
+            raise
+
+    async def fail():
+        await asyncio.sleep(0)
+        raise RuntimeError("map call failed")
+
+    async def run():
+        with pytest.raises(RuntimeError, match="map call failed"):
+            await asyncio.wait_for(gather_or_cancel(slow(0), fail(), slow(1)), timeout=5)
+        # Checked inside the loop, since asyncio.run cancels leftover tasks on exit anyway
+        assert sorted(cancelled) == [0, 1]
+
+    asyncio.run(run())
+
+
+def test_failed_map_call_stops_the_other_calls():
+    calls, cancelled = [], []
+
+    async def llm(prompt: str) -> str:
+        calls.append(prompt)
+        if "XK-20" in prompt:
+            raise RuntimeError("quota exceeded")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(prompt)
+            raise
+        return "summary"
+
+    async def run():
+        documents = [Document(page_content=text) for text in PAGES]
+        with pytest.raises(RuntimeError, match="quota exceeded"):
+            await asyncio.wait_for(_summarizer(llm).summarize(documents), timeout=5)
+        assert len(cancelled) == len(calls) - 1
+
+    asyncio.run(run())
+
+
+def test_summaries_are_combined_in_document_order():
+    async def llm(prompt: str) -> str:
+        if prompt.startswith("Write a concise summary"):
+            return prompt.split("Section ")[1].split(":")[0]
+        return "+".join(line for line in prompt.split("\n\n")[1:-2])
+
+    result = asyncio.run(_summarizer(llm).summarize([Document(page_content=text) for text in PAGES]))
+
+    assert result == {"summary": "0+1+2+3", "cached_chunks": 0}
+
+
+@pytest.fixture
+def summarize_with(store, monkeypatch):
+    """Runs a stored document's background summary with the given fake LLM and returns its record."""
+    def run(user_id: str, document_id: str, llm_call) -> dict:
+        monkeypatch.setattr(summarizer, "get_summarizer", lambda: _summarizer(llm_call))
+
+        async def start_and_wait():
+            await summarizer.start_document_summary(user_id, document_id)
+            await summarizer._running[document_id]
+            return await summarizer.summary_store.get(document_id)
+
+        return asyncio.run(start_and_wait())
+
+    return run
+
+
+def test_background_summary_completes(ingest, summarize_with):
+    document_id = ingest(PAGES)["document_id"]
+
+    async def llm(prompt: str) -> str:
+        return "short"
+
+    record = summarize_with("alice", document_id, llm)
+
+    assert (record["status"], record["progress"], record["summary"]) == ("completed", 1.0, "short")
+    assert record["chunk_count"] > 0
+
+
+def test_summary_of_a_document_changed_mid_run_is_reported_stale(ingest, summarize_with):
+    document_id = ingest(PAGES)["document_id"]
+
+    async def llm(prompt: str) -> str:
+        # The document's chunks change while it is being summarized
+        summarizer.summary_store.delete(document_id)
+        return "summary of the old version"
+
+    record = summarize_with("alice", document_id, llm)
+
+    assert record["status"] == "failed"
+    assert "changed" in record["error"]
+    assert record["summary"] is None
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from app.services.vector_index import BinaryIndex, FlatIndex, Int8Index, IVFIndex, VectorIndex, build_index
+
+
+def _vectors(rows: int, dims: int = 32, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((rows, dims)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("build", [
+    lambda ids, vectors: FlatIndex(ids, vectors),
+    lambda ids, vectors: IVFIndex.build(ids, vectors, nlist=8, nprobe=3),
+    Int8Index.build,
+    BinaryIndex.build,
+], ids=["flat", "ivf", "int8", "binary"])
+def test_round_trip_keeps_kind_arrays_and_results(build):
+    vectors = _vectors(200)
+    ids = [f"chunk-{i}" for i in range(len(vectors))]
+    index = build(ids, vectors)
+
+    restored = VectorIndex.from_bytes(index.to_bytes())
+
+    assert type(restored) is type(index)
+    assert restored.nbytes == index.nbytes
+    for name, array in index._arrays().items():
+        assert np.array_equal(getattr(restored, name), array), name
+    for query in _vectors(5, seed=1):
+        expected_ids, expected_scores = index.search(query, 10)
+        restored_ids, restored_scores = restored.search(query, 10)
+        assert restored_ids.tolist() == expected_ids.tolist()
+        assert np.allclose(restored_scores, expected_scores)
+
+
+def test_round_trip_of_empty_index():
+    index = FlatIndex([], np.empty((0, 32), dtype=np.float32))
+
+    restored = VectorIndex.from_bytes(index.to_bytes())
+
+    assert len(restored) == 0
+    assert restored.search(_vectors(1)[0], 5)[0].tolist() == []
+
+
+def test_unknown_kind_is_rejected():
+    index = FlatIndex(["a"], _vectors(1))
+    index.kind = "hnsw"
+
+    with pytest.raises(ValueError, match="hnsw"):
+        VectorIndex.from_bytes(index.to_bytes())
+
+
+def test_build_index_rejects_unknown_quantization():
+    with pytest.raises(ValueError):
+        build_index(["a"], _vectors(1), quantization="pq")
+
+
+def test_extend_index_keeps_a_cached_empty_index_over_a_stale_stored_one(store):
+    from app.services.lexical_index import BM25Index
+
+    store.index_store.save("doc-a", FlatIndex(["stale"], _vectors(1)))
+    store.lexical_store.save("doc-a", BM25Index.build(["stale"], ["retired text"]))
+    store.index_cache.put("doc-a", FlatIndex([], np.empty((0, 32), dtype=np.float32)))
+    store.lexical_cache.put("doc-a", BM25Index.build([], []))
+
+    store.extend_index("doc-a", ids=["chunk-0", "chunk-1"], vectors=_vectors(2), texts=["pump valve", "turbo encabulator"])
+
+    assert store.index_store.load("doc-a").ids.tolist() == ["chunk-0", "chunk-1"]
+    assert sorted(store.lexical_store.load("doc-a").ids.tolist()) == ["chunk-0", "chunk-1"]
@@ -7,7 +7,9 @@ export function initializeApi(sessionProvider) {
     // Return the public API methods that the rest of the app can use.
     return {
         uploadPDF,
-        postChatMessage
+        getJobStatus,
+        postChatMessage,
+        streamChatMessage
     };
 }
 
@@ -69,6 +71,21 @@ async function uploadPDF(file) {
     return result;
 }
 
+async function getJobStatus(jobId) {
+    const token = await getAuthToken();
+    if (!token) {
+        throw new Error('Authentication error: You must be logged in to check upload status.');
+    }
+
+    const response = await fetch(`${API_BASE_URL}/api/v1/jobs/${encodeURIComponent(jobId)}`, {
+        headers: {
+            'Authorization': `Bearer ${token}`,
+        },
+    });
+
+    return handleResponse(response);
+}
+
 async function postChatMessage(documentId, question) {
     console.log('postChatMessage called with:', { documentId, question });
     console.log('documentId type:', typeof documentId, 'value:', documentId);
@@ -97,3 +114,61 @@ async function postChatMessage(documentId, question) {
 
     return handleResponse(response);
 }
+
+// Streams an answer from /chat/stream (server-sent events).
+// `handlers.onSources(sources)` is called once with the retrieved chunks' metadata,
+// then `handlers.onToken(text)` for every piece of the answer as it arrives.
+async function streamChatMessage(documentId, question, handlers = {}) {
+    const token = await getAuthToken();
+    if (!token) {
+        throw new Error('Authentication error: You must be logged in to chat.');
+    }
+
+    const response = await fetch(`${API_BASE_URL}/api/v1/chat/stream`, {
+        method: 'POST',
+        headers: {
+            'Authorization': `Bearer ${token}`,
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream',
+        },
+        body: JSON.stringify({ document_id: documentId, question: question }),
+    });
+    if (!response.ok) {
+        // Reuse the JSON error handling for non-streamed failures (auth, validation)
+        await handleResponse(response);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let eventName = 'message';
+            let data = '';
+            for (const line of rawEvent.split('\n')) {
+                if (line.startsWith('event: ')) eventName = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            }
+            const payload = data ? JSON.parse(data) : null;
+
+            if (eventName === 'sources' && handlers.onSources) {
+                handlers.onSources(payload);
+            } else if (eventName === 'token' && handlers.onToken) {
+                handlers.onToken(payload.text);
+            } else if (eventName === 'error') {
+                throw new Error(payload.detail);
+            } else if (eventName === 'done') {
+                return payload;
+            }
+        }
+    }
+}
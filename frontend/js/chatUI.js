@@ -154,9 +154,18 @@ function initializeChat(elements, api) {
  try {
  console.log('Sending chat message with documentId:', currentDocumentId, 'type:', typeof currentDocumentId);
  console.log('Question:', question);
- const response = await api.postChatMessage(String(currentDocumentId), String(question));
- console.log('Received response:', response);
- thinkingMessage.querySelector('p').textContent = response.answer;
+ // Render the answer incrementally as tokens stream in
+ const answerParagraph = thinkingMessage.querySelector('p');
+ let answer = '';
+ await api.streamChatMessage(String(currentDocumentId), String(question), {
+ onSources: (sources) => console.log('Retrieved sources:', sources),
+ onToken: (text) => {
+ if (!answer) thinkingMessage.classList.remove('thinking-message');
+ answer += text;
+ answerParagraph.textContent = answer;
+ elements.chatWindow.scrollTop = elements.chatWindow.scrollHeight;
+ },
+ });
  thinkingMessage.classList.remove('thinking-message');
  } catch (error) {
  console.error('Chat error:', error);
@@ -1,3 +1,8 @@
+const JOB_POLL_INTERVAL_MS = 1000;
+// Give up waiting after this long; the job keeps running and the document shows up once it is done
+const JOB_TIMEOUT_MS = 30 * 60 * 1000;
+const STAGE_LABELS = { parse: 'Parsing', split: 'Splitting', embed: 'Embedding', store: 'Storing' };
+
 // This module no longer searches for elements, preventing race conditions.
 // It receives all necessary elements and functions from chatUI.js.
 export function initializeUploader(elements, api, onUploadSuccess) {
@@ -38,6 +43,11 @@ async function handleUpload(elements, api, onUploadSuccess) {
         // Ensure document_id is a string
         const documentId = String(result.document_id);
         console.log('Processed documentId:', documentId, 'type:', typeof documentId);
+
+        // The backend processes the PDF in the background; wait for the job to finish
+        if (result.job_id) {
+            await waitForJob(elements, api, result.job_id, file.name);
+        }
         
         elements.uploadStatus.textContent = 'File processed successfully! You can now ask questions.';
         elements.uploadStatus.className = 'status-message success';
@@ -57,3 +67,30 @@ async function handleUpload(elements, api, onUploadSuccess) {
     }
 }
 
+
+// Polls the ingestion job until it completes, showing the current stage's progress.
+async function waitForJob(elements, api, jobId, fileName) {
+    const deadline = Date.now() + JOB_TIMEOUT_MS;
+    while (true) {
+        if (Date.now() > deadline) {
+            throw new Error('Processing is taking longer than expected. Check your documents again later.');
+        }
+        const job = await api.getJobStatus(jobId);
+        if (job.status === 'completed') {
+            return job;
+        }
+        if (job.status === 'failed') {
+            throw new Error(job.error || 'Processing failed.');
+        }
+
+        const running = Object.entries(job.stages).find(([, stage]) => stage.status === 'running');
+        if (running) {
+            const [name, stage] = running;
+            const label = STAGE_LABELS[name] || name;
+            elements.uploadStatus.textContent = `${label} ${fileName}... ${Math.round(stage.progress * 100)}%`;
+        } else {
+            elements.uploadStatus.textContent = `Queued: ${fileName}...`;
+        }
+        await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    }
+}